@@ -0,0 +1,35 @@
+from pydantic import BaseModel, Field
+from typing import Any, Dict, Optional
+from api.data_models.response_models import MappingCategory
+
+class MappingConfirmation(BaseModel):
+    """A column mapping confirmed by a user, used to learn header synonyms."""
+    category: MappingCategory = Field(..., description="The category the mapping belongs to.")
+    mapping: Dict[str, Optional[str]] = Field(..., description="Field name of the data model to the confirmed csv column header.")
+
+    class Config:
+        schema_extra = {
+            "category": "Investment",
+            "mapping": {
+                "companyName": "col7",
+                "currency": "Whg."
+            }
+        }
+
+class SchemaRegistration(BaseModel):
+    """A data model to register at runtime, given as JSON Schema or as an example object."""
+    name: str = Field(..., pattern=r"^[A-Za-z][A-Za-z0-9_]*$", description="Name of the data model, also shown to the LLM.")
+    jsonSchema: Optional[Dict[str, Any]] = Field(None, description="JSON Schema of the data model. Nested objects, arrays, enums and $defs references are supported.")
+    example: Optional[Dict[str, Any]] = Field(None, description="Example object to infer the data model from, if no jsonSchema is given. All fields are optional.")
+
+    class Config:
+        schema_extra = {
+            "name": "DistributionNotice",
+            "example": {
+                "fundName": "Cherry Fund IV GmbH & Co. KG",
+                "investor": "Valentina Pape",
+                "date": "2024-03-01T00:00:00",
+                "amount": 12500.0,
+                "currency": "EUR"
+            }
+        }
@@ -1,7 +1,7 @@
 # Define Pydantic class for data validation
-from pydantic import BaseModel, Field, validator, ValidationError
+from pydantic import BaseModel, Field, validator, model_validator, ValidationError, TypeAdapter
 from typing_extensions import Annotated
-from typing import List, Optional, Any
+from typing import List, Optional, Any, Union, Dict
 from enum import Enum
 
 import datetime
@@ -11,6 +11,7 @@ class ModelCategory(Enum):
     CapitalCall = "CapitalCall"
     GeneralInformation = "GeneralInformation"
     OperationalKPIs = "OperationalKPIs"
+    CLA = "ConvertibleLoanAgreement"
     Other = "Other"
 
 class MappingCategory(Enum):
@@ -130,6 +131,8 @@ class OperationalKPIs(DocumentData):
 class CapitalCall(DocumentData):
     """Data model for a single investor's share of a capital call."""
     name: Optional[str] = Field(..., description="Name of investor")
+    fundName: Optional[str] = Field(None, description="Name of the fund issuing the capital call")
+    capitalCallNumber: Optional[int] = Field(None, description="Sequential number of the capital call within the fund")
     date: Optional[datetime.datetime] = Field(None, description="Date of issuance of capital call")
     deadline: Optional[datetime.datetime] = Field(None, description="Date of deadline for capital call")
     commitment: Optional[float] = Field(None, description="Investor's share of total commitment")
@@ -152,7 +155,77 @@ class ConvertibleLoanAgreement(DocumentData):
     interestRate: float = Field(...,description="Interest rate of the loan")
     valuationCap: float = Field(...,description="Maximum post-money valuation for which the loan converts to shares")
     valuationDiscount: float = Field(...,description="Discount on the post-money valuation for which the loan converts to shares")
-    
+
+category_to_data_model = {
+    ModelCategory.CapitalCall: CapitalCall,
+    ModelCategory.CLA: ConvertibleLoanAgreement,
+    ModelCategory.GeneralInformation: GeneralCompanyInfo,
+    ModelCategory.OperationalKPIs: OperationalKPIs
+}
+
+class DocumentExtraction(BaseModel):
+    """Classification and extraction of a document in a single pass."""
+    documentMetadata: DocumentMetadata = Field(..., description="Metadata of the document.")
+    data: Optional[Union[CapitalCall, OperationalKPIs, ConvertibleLoanAgreement, GeneralCompanyInfo]] = Field(None, description="Extracted data matching the category in documentMetadata. Null if the category is Other.")
+
+    @model_validator(mode="before")
+    @classmethod
+    def data_matches_category(cls, values):
+        # GeneralCompanyInfo reuses `type` for InvestmentType, so the union is resolved on the metadata category
+        if not isinstance(values, dict) or not isinstance(values.get("data"), dict):
+            return values
+        metadata = values.get("documentMetadata")
+        category = metadata.category if isinstance(metadata, DocumentMetadata) else ModelCategory((metadata or {}).get("category"))
+        data_model = category_to_data_model.get(category)
+        values = dict(values)
+        try:
+            values["data"] = data_model.model_validate(values["data"]) if data_model else None
+        except ValidationError as e:
+            # re-raised under "data", so the errors point at the failing values of the raw output
+            raise ValidationError.from_exception_data(cls.__name__, [
+                {key: value for key, value in {**error, "loc": ("data", *error["loc"])}.items() if key in ("type", "loc", "input", "ctx")}
+                for error in e.errors(include_url=False)
+            ])
+        return values
+
+
+_list_adapters = {}
+
+def _list_adapter(data_model) -> TypeAdapter:
+    adapter = _list_adapters.get(data_model)
+    if adapter is None:
+        adapter = _list_adapters[data_model] = TypeAdapter(List[data_model])
+    return adapter
+
+class BulkValidationResult(BaseModel):
+    """Result of validating many records at once."""
+    models: List[Optional[Any]] = Field(..., description="Validated model per input row, None where the row failed.")
+    errors: Dict[int, List[Dict[str, Any]]] = Field(..., description="Validation errors by input row index.")
+
+def validate_many(data_model, records: Union[List[Dict[str, Any]], Dict[str, List[Any]]]) -> BulkValidationResult:
+    """Validates a list of records, or a columnar batch of field name to values, in a single pass
+    through a cached TypeAdapter(List[data_model]) instead of one model construction per record.
+    Raises ValueError if the columns of a columnar batch differ in length."""
+    if isinstance(records, dict):
+        lengths = {name: len(values) for name, values in records.items()}
+        if len(set(lengths.values())) > 1:
+            raise ValueError(f"Columns must have the same length, got {lengths}")
+        names = list(records)
+        records = [dict(zip(names, values)) for values in zip(*records.values())]
+    adapter = _list_adapter(data_model)
+    try:
+        return BulkValidationResult(models=adapter.validate_python(records), errors={})
+    except ValidationError as e:
+        errors = {}
+        for error in e.errors(include_url=False, include_context=False):
+            errors.setdefault(error["loc"][0], []).append({"loc": error["loc"][1:], "msg": error["msg"], "type": error["type"]})
+
+    # every remaining row is valid on its own, so they are validated again in one pass
+    valid_indices = [index for index in range(len(records)) if index not in errors]
+    models = [None] * len(records)
+    for index, model in zip(valid_indices, adapter.validate_python([records[index] for index in valid_indices])):
+        models[index] = model
+    return BulkValidationResult(models=models, errors=errors)
 
 class FileMetadata(BaseModel):
     """Data model for a file metadata."""
@@ -173,6 +246,7 @@ class ExtractResponse(BaseModel):
     fileMetadata: FileMetadata
     documentMetadata: DocumentMetadata
     data: Any
+    repairedFields: Optional[List[str]] = Field(None, description="Fields that failed validation and were repaired, as <Model>.<field>.")
 
     class Config:
         schema_extra = {
@@ -218,6 +292,18 @@ class InvestmentColumns(BaseModel):
     businessModel: Optional[str] = Field(None, description="Name of a column header for a business model of company or alternative asset being invested into.")
     website: Optional[str] = Field(None, description="Name of a column header for a website of company or alternative asset being invested into.")
 
+mapping_category_to_data_model = {
+    MappingCategory.Investment: InvestmentColumns
+}
+
+class ColumnProfile(BaseModel):
+    """Profile of a csv column, computed over the whole file."""
+    name: str = Field(..., description="Column header as found in the file.")
+    inferredType: str = Field(..., description="One of integer, number, boolean, date, string or empty.")
+    nullRate: float = Field(..., description="Share of rows with an empty or null value.")
+    distinctEstimate: int = Field(..., description="Estimated number of distinct non-null values.")
+    sample: List[str] = Field(..., description="Small random sample of non-null values.")
+
 class MappingResponse(BaseModel):
     """Data model for a mapping response."""
     fileMetadata: FileMetadata
@@ -231,4 +317,67 @@ class MappingResponse(BaseModel):
                 "size": 240428
             },
             "data": {}
-        }
\ No newline at end of file
+        }
+
+class JobStatus(Enum):
+    """Enum for the status of a background job."""
+    Queued = "Queued"
+    Running = "Running"
+    Succeeded = "Succeeded"
+    Failed = "Failed"
+
+class JobResponse(BaseModel):
+    """Data model for the status and result of a background job."""
+    jobId: str
+    status: JobStatus
+    createdAt: float = Field(..., description="Unix timestamp of job submission.")
+    finishedAt: Optional[float] = Field(None, description="Unix timestamp of job completion.")
+    result: Optional[Any] = Field(None, description="Result of the job once it succeeded.")
+    error: Optional[str] = Field(None, description="Error message if the job failed.")
+
+    class Config:
+        schema_extra = {
+            "jobId": "3f2b6c1e9a8d4f7b8c0e1d2a3b4c5d6e",
+            "status": "Queued",
+            "createdAt": 1712000000.0,
+            "finishedAt": None,
+            "result": None,
+            "error": None
+        }
+
+
+class Discrepancy(BaseModel):
+    """A failed reconciliation check."""
+    check: str = Field(..., description="Name of the failed check.")
+    investor: Optional[str] = Field(None, description="Investor the discrepancy belongs to. None for fund-level checks.")
+    expected: Optional[Any] = None
+    actual: Optional[Any] = None
+
+class ReconciliationReport(BaseModel):
+    """Reconciliation of all extracted capital calls of one fund and call number."""
+    fundName: Optional[str]
+    capitalCallNumber: Optional[int]
+    investors: int = Field(..., description="Number of capital calls in this group.")
+    totalCapitalCalled: float = Field(..., description="Sum of totalCapitalCalled across investors.")
+    equityShare: Optional[float] = Field(None, description="Sum of equityShare across investors.")
+    discrepancies: List[Discrepancy]
+
+class SchemaResponse(BaseModel):
+    """A data model registered at runtime."""
+    name: str = Field(..., description="Name to pass as schema to /extract/ and /map-columns/.")
+    schemaHash: str = Field(..., description="Hash of name and schema that compiled models are cached by.")
+    jsonSchema: Dict[str, Any] = Field(..., description="JSON Schema of the data model.")
+
+class StoredExtraction(BaseModel):
+    """An extraction result from the extraction store."""
+    id: int
+    fileHash: Optional[str] = Field(None, description="sha256 of the extracted file.")
+    category: ModelCategory
+    documentDate: Optional[str] = Field(None, description="Date of the extracted data (e.g. of a capital call), as ISO 8601.")
+    createdAt: float = Field(..., description="Unix timestamp of the extraction.")
+    extraction: ExtractResponse
+
+class ExtractionPage(BaseModel):
+    """A page of stored extractions."""
+    items: List[StoredExtraction]
+    nextCursor: Optional[str] = Field(None, description="Pass as cursor to get the next page. None on the last page.")
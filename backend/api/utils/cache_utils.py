@@ -0,0 +1,177 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import functools
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Iterator, Optional
+import logging
+
+logging.basicConfig(level=logging.INFO)
+
+def hash_file(file_location: str, chunk_size: int = 1024 * 1024) -> str:
+    """returns the sha256 hex digest of a file, read in chunks"""
+    sha256 = hashlib.sha256()
+    with open(file_location, "rb") as file:
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+@functools.lru_cache(maxsize=512)
+def _schema_json(output_cls) -> str:
+    # generating the JSON schema is far slower than hashing it, and classes never change
+    return json.dumps(output_cls.model_json_schema(), sort_keys=True)
+
+def model_digest(output_cls) -> str:
+    """identifies a model by name and JSON schema"""
+    return f"{output_cls.__name__}:{hashlib.sha256(_schema_json(output_cls).encode('utf-8')).hexdigest()}"
+
+def llm_cache_key(document_text: str, output_cls, prompt_template: str) -> str:
+    """returns a key over the document text, the output model's JSON schema and the prompt template,
+    so a schema change invalidates all results cached for the old schema"""
+    sha256 = hashlib.sha256()
+    for part in (document_text, _schema_json(output_cls), prompt_template):
+        sha256.update(part.encode("utf-8"))
+        sha256.update(b"\x00")
+    return f"{output_cls.__name__}:{sha256.hexdigest()}"
+
+class MemoryCache:
+    """In-process key/value cache with a TTL and count-bounded LRU eviction."""
+
+    def __init__(self, max_entries: int, ttl_seconds: int):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, created_at = entry
+            if self.ttl_seconds and time.time() - created_at > self.ttl_seconds:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any):
+        with self._lock:
+            self._entries[key] = (value, time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+class DiskCache:
+    """SQLite-backed key/value cache with a TTL and size-bounded LRU eviction."""
+
+    def __init__(self, path: str, max_bytes: int, ttl_seconds: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._create_lock = threading.Lock()
+        self._created = False
+
+    def _create(self):
+        # on first use rather than on import, so importing the app never touches the disk
+        with self._create_lock:
+            if self._created:
+                return
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=30)
+            try:
+                with connection:
+                    connection.execute(
+                        "CREATE TABLE IF NOT EXISTS cache ("
+                        "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+                        "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+                    )
+                    connection.execute("CREATE INDEX IF NOT EXISTS cache_accessed_at ON cache (accessed_at)")
+            finally:
+                connection.close()
+            self._created = True
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        if not self._created:
+            self._create()
+        connection = sqlite3.connect(self.path, timeout=30)
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        with self._lock, self._connect() as connection:
+            row = connection.execute("SELECT value, created_at FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            value, created_at = row
+            if self.ttl_seconds and now - created_at > self.ttl_seconds:
+                connection.execute("DELETE FROM cache WHERE key = ?", (key,))
+                return None
+            connection.execute("UPDATE cache SET accessed_at = ? WHERE key = ?", (now, key))
+        return json.loads(value)
+
+    def set(self, key: str, value: Any):
+        serialized = json.dumps(value)
+        size = len(serialized.encode("utf-8"))
+        if size > self.max_bytes:
+            logging.info(f"Skipping cache write for {key}, entry exceeds {self.max_bytes} bytes.")
+            return
+        now = time.time()
+        with self._lock, self._connect() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO cache (key, value, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, serialized, size, now, now),
+            )
+            self._evict(connection)
+
+    def _evict(self, connection: sqlite3.Connection):
+        if self.ttl_seconds:
+            connection.execute("DELETE FROM cache WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+        total = connection.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in connection.execute("SELECT key, size FROM cache ORDER BY accessed_at ASC").fetchall():
+            connection.execute("DELETE FROM cache WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def clear(self):
+        with self._lock, self._connect() as connection:
+            connection.execute("DELETE FROM cache")
+
+parse_cache = DiskCache(
+    path=os.getenv("PARSE_CACHE_PATH", "app/cache/parse_cache.sqlite"),
+    max_bytes=int(os.getenv("PARSE_CACHE_MAX_BYTES", 512 * 1024 * 1024)),
+    ttl_seconds=int(os.getenv("PARSE_CACHE_TTL_SECONDS", 7 * 24 * 3600)),
+)
+
+def create_llm_cache():
+    """builds the LLM result cache from LLM_CACHE_BACKEND ("memory" or "disk")"""
+    backend = os.getenv("LLM_CACHE_BACKEND", "memory")
+    ttl_seconds = int(os.getenv("LLM_CACHE_TTL_SECONDS", 7 * 24 * 3600))
+    if backend == "disk":
+        return DiskCache(
+            path=os.getenv("LLM_CACHE_PATH", "app/cache/llm_cache.sqlite"),
+            max_bytes=int(os.getenv("LLM_CACHE_MAX_BYTES", 128 * 1024 * 1024)),
+            ttl_seconds=ttl_seconds,
+        )
+    if backend == "memory":
+        return MemoryCache(max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", 1024)), ttl_seconds=ttl_seconds)
+    raise ValueError(f"Unknown LLM_CACHE_BACKEND: {backend}")
+
+llm_cache = create_llm_cache()
@@ -0,0 +1,74 @@
+import os
+from typing import Any, Callable, Dict, List, Tuple
+from pydantic import BaseModel
+from api.data_models import response_models
+
+chunk_max_chars = int(os.getenv("CHUNK_MAX_CHARS", 24000))
+chunk_overlap_chars = int(os.getenv("CHUNK_OVERLAP_CHARS", 500))
+
+def chunk_documents(documents: List, max_chars: int = None, overlap_chars: int = None) -> List[str]:
+    """splits the text of all parsed documents into windows of at most max_chars,
+    preferring to cut at document (page) and paragraph boundaries"""
+    max_chars = max_chars or chunk_max_chars
+    overlap_chars = chunk_overlap_chars if overlap_chars is None else overlap_chars
+    text = "\n\n".join(document.text for document in documents if document.text)
+    if len(text) <= max_chars:
+        return [text]
+
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(start + max_chars, len(text))
+        if end < len(text):
+            cut = text.rfind("\n\n", start + max_chars // 2, end)
+            if cut != -1:
+                end = cut
+        chunks.append(text[start:end])
+        if end == len(text):
+            break
+        start = max(end - overlap_chars, start + 1)
+    return chunks
+
+def _first(values: List[Any]) -> Any:
+    return values[0]
+
+def _union(values: List[List[Any]]) -> List[Any]:
+    merged = []
+    for value in values:
+        for item in value:
+            if item not in merged:
+                merged.append(item)
+    return merged
+
+def _merge_dicts(values: List[Dict]) -> Dict:
+    return {key: _merge_field(key, [value.get(key) for value in values], {}) for key in dict.fromkeys(k for value in values for k in value)}
+
+# field-specific conflict resolution per output class; fields without a rule take the value
+# from the earliest chunk that has one (lists are unioned, nested objects merged field by field)
+merge_rules: Dict[Tuple[type, str], Callable[[List[Any]], Any]] = {
+    # dates are dumped as ISO 8601 strings, which sort chronologically
+    (response_models.OperationalKPIs, "date"): max,
+    (response_models.CapitalCall, "deadline"): max,
+    (response_models.GeneralCompanyInfo, "founders"): _union,
+    (response_models.GeneralCompanyInfo, "otherOperatingCountries"): _union,
+}
+
+def _merge_field(name: str, values: List[Any], rules: Dict[str, Callable]) -> Any:
+    values = [value for value in values if value is not None]
+    if not values:
+        return None
+    if name in rules:
+        return rules[name](values)
+    if all(isinstance(value, list) for value in values):
+        return _union(values)
+    if all(isinstance(value, dict) for value in values):
+        return _merge_dicts(values)
+    return _first(values)
+
+def merge_data_models(results: List[BaseModel], output_cls) -> BaseModel:
+    """deterministically merges partial per-chunk results, given in chunk order, into one output_cls"""
+    rules = {field: rule for (cls, field), rule in merge_rules.items() if cls is output_cls}
+    dumped = [result.model_dump(mode="json") for result in results]
+    merged = {name: _merge_field(name, [result.get(name) for result in dumped], rules) for name in output_cls.model_fields}
+    # optional fields found in no chunk keep their default, which is not always a valid value (e.g. OperationalKPIs.date)
+    return output_cls.model_validate({name: value for name, value in merged.items() if value is not None or output_cls.model_fields[name].is_required()})
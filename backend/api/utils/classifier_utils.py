@@ -0,0 +1,134 @@
+import os
+import re
+import sys
+import json
+import time
+import random
+import hashlib
+import threading
+from typing import List, Optional, Tuple
+import logging
+import numpy as np
+from api.data_models.response_models import ModelCategory
+
+logging.basicConfig(level=logging.INFO)
+
+classifier_path = os.getenv("CLASSIFIER_PATH", "app/models/document_classifier.npz")
+classifier_confidence_threshold = float(os.getenv("CLASSIFIER_CONFIDENCE_THRESHOLD", 0.8))
+num_features = 2 ** 16
+token_pattern = re.compile(r"[a-zäöüß0-9]+")
+
+def _bucket(feature: str) -> int:
+    return int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=4).digest(), "big") % num_features
+
+def featurize(text: str) -> np.ndarray:
+    """hashed word unigrams and bigrams, log-scaled and L2-normalized"""
+    tokens = token_pattern.findall(text.lower())
+    vector = np.zeros(num_features, dtype=np.float32)
+    for feature in tokens + [f"{first} {second}" for first, second in zip(tokens, tokens[1:])]:
+        vector[_bucket(feature)] += 1
+    np.log1p(vector, out=vector)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+class DocumentClassifier:
+    """Nearest-centroid classifier over hashed n-grams of the parsed markdown."""
+
+    def __init__(self, categories: List[ModelCategory], centroids: np.ndarray):
+        self.categories = categories
+        self.centroids = centroids
+
+    @classmethod
+    def train(cls, texts: List[str], categories: List[ModelCategory]) -> "DocumentClassifier":
+        labels = sorted(set(categories), key=lambda category: category.value)
+        features = np.stack([featurize(text) for text in texts])
+        centroids = []
+        for label in labels:
+            centroid = features[[category == label for category in categories]].mean(axis=0)
+            centroids.append(centroid / (np.linalg.norm(centroid) or 1))
+        return cls(labels, np.stack(centroids))
+
+    def predict(self, text: str) -> Tuple[ModelCategory, float]:
+        """returns the nearest category and a confidence in [0, 1] from a softmax over cosine similarities"""
+        similarities = self.centroids @ featurize(text)
+        scores = np.exp((similarities - similarities.max()) * 20)
+        probabilities = scores / scores.sum()
+        best = int(np.argmax(probabilities))
+        return self.categories[best], float(probabilities[best])
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        np.savez_compressed(path, categories=np.array([category.value for category in self.categories]), centroids=self.centroids)
+
+    @classmethod
+    def load(cls, path: str) -> "DocumentClassifier":
+        with np.load(path) as data:
+            return cls([ModelCategory(value) for value in data["categories"]], data["centroids"])
+
+_classifier = None
+_classifier_loaded = False
+_classifier_lock = threading.Lock()
+
+def get_classifier() -> Optional[DocumentClassifier]:
+    """loads the trained classifier on first use. None if no model has been trained yet."""
+    global _classifier, _classifier_loaded
+    if not _classifier_loaded:
+        with _classifier_lock:
+            if not _classifier_loaded:
+                if os.path.exists(classifier_path):
+                    _classifier = DocumentClassifier.load(classifier_path)
+                    logging.info(f"Loaded document classifier from {classifier_path}...")
+                _classifier_loaded = True
+    return _classifier
+
+def classify_document(text: str) -> Optional[ModelCategory]:
+    """returns the locally predicted category, or None if there is no classifier or it is not confident"""
+    classifier = get_classifier()
+    if classifier is None:
+        return None
+    category, confidence = classifier.predict(text)
+    logging.info(f"Local classifier predicted {category.value} with confidence {confidence:.2f}")
+    return category if confidence >= classifier_confidence_threshold else None
+
+def _load_examples(path: str) -> Tuple[List[str], List[ModelCategory]]:
+    """reads labelled extractions as JSON lines with the parsed markdown in "text" and the category
+    in "category" (or in "documentMetadata.category", as stored from an ExtractResponse)"""
+    texts, categories = [], []
+    with open(path, "r") as file:
+        for line in file:
+            if not line.strip():
+                continue
+            example = json.loads(line)
+            category = example.get("category") or example["documentMetadata"]["category"]
+            texts.append(example["text"])
+            categories.append(ModelCategory(category))
+    return texts, categories
+
+# Offline training and evaluation:
+#   python -m api.utils.classifier_utils labelled_extractions.jsonl [holdout_fraction]
+if __name__ == "__main__":
+    texts, categories = _load_examples(sys.argv[1])
+    holdout_fraction = float(sys.argv[2]) if len(sys.argv) > 2 else 0.2
+    indices = list(range(len(texts)))
+    random.Random(0).shuffle(indices)
+    split = int(len(indices) * (1 - holdout_fraction))
+    train, test = indices[:split], indices[split:]
+
+    classifier = DocumentClassifier.train([texts[i] for i in train], [categories[i] for i in train])
+    if test:
+        correct, confident, confident_correct = 0, 0, 0
+        start = time.perf_counter()
+        for i in test:
+            category, confidence = classifier.predict(texts[i])
+            correct += category == categories[i]
+            if confidence >= classifier_confidence_threshold:
+                confident += 1
+                confident_correct += category == categories[i]
+        latency_ms = (time.perf_counter() - start) / len(test) * 1000
+        print(f"accuracy: {correct / len(test):.3f} on {len(test)} held-out documents")
+        print(f"above threshold {classifier_confidence_threshold}: {confident / len(test):.1%} of documents, accuracy {confident_correct / max(confident, 1):.3f}")
+        print(f"mean latency: {latency_ms:.2f} ms per document")
+
+    classifier = DocumentClassifier.train(texts, categories)
+    classifier.save(classifier_path)
+    print(f"saved classifier trained on {len(texts)} documents to {classifier_path}")
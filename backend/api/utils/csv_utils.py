@@ -0,0 +1,145 @@
+import os
+import re
+import math
+import csv
+import random
+import hashlib
+from typing import List, Tuple
+import logging
+from charset_normalizer import from_bytes
+from api.data_models.response_models import ColumnProfile
+
+logging.basicConfig(level=logging.INFO)
+
+sniff_bytes = int(os.getenv("CSV_SNIFF_BYTES", 64 * 1024))
+reservoir_size = int(os.getenv("CSV_SAMPLE_SIZE", 5))
+null_values = {"", "null", "none", "nan", "n/a", "na", "-"}
+bool_values = {"true", "false", "yes", "no", "ja", "nein"}
+integer_pattern = re.compile(r"^[+-]?\d+$")
+number_pattern = re.compile(r"^[+-]?(\d+|\d{1,3}([,.' ]\d{3})+)([.,]\d+)?%?$")
+date_pattern = re.compile(r"^(\d{4}-\d{2}-\d{2}([ T].*)?|\d{1,2}[./]\d{1,2}[./]\d{2,4})$")
+
+class HyperLogLog:
+    """Fixed-memory distinct-count estimator (2**precision registers)."""
+
+    def __init__(self, precision: int = 10):
+        self.precision = precision
+        self.num_registers = 1 << precision
+        self.registers = bytearray(self.num_registers)
+
+    def add(self, value: str):
+        hashed = int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+        index = hashed >> (64 - self.precision)
+        remainder = hashed & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - remainder.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def count(self) -> int:
+        m = self.num_registers
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -register for register in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            # small-range correction (linear counting)
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+class _ColumnStats:
+    def __init__(self, name: str, rng: random.Random):
+        self.name = name
+        self.rng = rng
+        self.count = 0
+        self.nulls = 0
+        self.types = {"integer": 0, "number": 0, "boolean": 0, "date": 0, "string": 0}
+        self.distinct = HyperLogLog()
+        self.sample: List[str] = []
+        self.seen = 0
+
+    def add(self, value: str):
+        self.count += 1
+        value = value.strip()
+        if value.lower() in null_values:
+            self.nulls += 1
+            return
+        self.types[_infer_type(value)] += 1
+        self.distinct.add(value)
+        # reservoir sampling (algorithm R) over non-null values
+        self.seen += 1
+        if len(self.sample) < reservoir_size:
+            self.sample.append(value)
+        else:
+            index = self.rng.randrange(self.seen)
+            if index < reservoir_size:
+                self.sample[index] = value
+
+    def profile(self) -> ColumnProfile:
+        non_null = self.count - self.nulls
+        if non_null == 0:
+            inferred_type = "empty"
+        elif self.types["integer"] == non_null:
+            inferred_type = "integer"
+        elif self.types["integer"] + self.types["number"] == non_null:
+            inferred_type = "number"
+        elif self.types["boolean"] == non_null:
+            inferred_type = "boolean"
+        elif self.types["date"] == non_null:
+            inferred_type = "date"
+        else:
+            inferred_type = "string"
+        return ColumnProfile(
+            name=self.name,
+            inferredType=inferred_type,
+            nullRate=self.nulls / self.count if self.count else 1.0,
+            distinctEstimate=self.distinct.count(),
+            sample=self.sample,
+        )
+
+def _infer_type(value: str) -> str:
+    if integer_pattern.match(value):
+        return "integer"
+    if number_pattern.match(value):
+        return "number"
+    if value.lower() in bool_values:
+        return "boolean"
+    if date_pattern.match(value):
+        return "date"
+    return "string"
+
+def sniff_csv(file_location: str) -> Tuple[str, csv.Dialect]:
+    """returns the encoding and dialect of a csv file, guessed from its first CSV_SNIFF_BYTES"""
+    with open(file_location, "rb") as file:
+        head = file.read(sniff_bytes)
+    if head.startswith(b"\xef\xbb\xbf"):
+        encoding = "utf-8-sig"
+    else:
+        try:
+            head.decode("utf-8")
+            encoding = "utf-8"
+        except UnicodeDecodeError as e:
+            # a multi-byte character may be cut off at the end of the sample
+            encoding = "utf-8" if e.start >= len(head) - 3 else None
+        if encoding is None:
+            best = from_bytes(head).best()
+            encoding = best.encoding if best else "latin-1"
+    sample = head.decode(encoding, errors="ignore")
+    try:
+        dialect = csv.Sniffer().sniff("\n".join(sample.splitlines()[:20]), delimiters=",;\t|")
+    except csv.Error:
+        dialect = csv.excel
+    return encoding, dialect
+
+def profile_csv(file_location: str) -> List[ColumnProfile]:
+    """streams the whole csv once in constant memory and returns a profile per column"""
+    logging.info(f"Profiling csv {file_location} initiated...")
+    encoding, dialect = sniff_csv(file_location)
+    rng = random.Random(0)
+    with open(file_location, "r", encoding=encoding, errors="replace", newline="") as file:
+        csv_reader = csv.reader(file, dialect)
+        header = next(csv_reader, [])
+        columns = [_ColumnStats(name, rng) for name in header]
+        for row in csv_reader:
+            for column, value in zip(columns, row):
+                column.add(value)
+    logging.info(f"Profiling csv {file_location} successful (encoding {encoding}, delimiter {dialect.delimiter!r})...")
+    return [column.profile() for column in columns]
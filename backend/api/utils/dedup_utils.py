@@ -0,0 +1,257 @@
+import os
+import re
+import json
+import time
+import enum
+import sqlite3
+import hashlib
+import datetime
+import threading
+from difflib import SequenceMatcher
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import logging
+import numpy as np
+from pydantic import BaseModel
+from api.utils.cache_utils import model_digest
+
+logging.basicConfig(level=logging.INFO)
+
+dedup_enabled = os.getenv("DEDUP", "true").lower() == "true"
+# estimated Jaccard similarity of word shingles above which an earlier document is reused
+dedup_similarity_threshold = float(os.getenv("DEDUP_SIMILARITY_THRESHOLD", 0.8))
+# documents with a larger share of changed words are extracted in full
+dedup_max_changed_ratio = float(os.getenv("DEDUP_MAX_CHANGED_RATIO", 0.2))
+# words of unchanged text sent around each changed passage
+dedup_context_words = int(os.getenv("DEDUP_CONTEXT_WORDS", 12))
+# longer documents are always extracted in full
+dedup_max_words = int(os.getenv("DEDUP_MAX_WORDS", 50000))
+# changed blocks of lines up to this many words are compared word by word, larger ones count as changed entirely
+dedup_max_block_words = int(os.getenv("DEDUP_MAX_BLOCK_WORDS", 2000))
+
+shingle_words = 5
+num_permutations = 128
+# 16 bands of 8 rows put the LSH threshold at about (1/16)^(1/8) = 0.71, below the similarity threshold
+num_bands = 16
+rows_per_band = num_permutations // num_bands
+mersenne_prime = np.uint64((1 << 61) - 1)
+_random = np.random.RandomState(0)
+_a = _random.randint(1, 1 << 31, num_permutations).astype(np.uint64)
+_b = _random.randint(0, 1 << 31, num_permutations).astype(np.uint64)
+word_pattern = re.compile(r"\S+")
+token_pattern = re.compile(r"[a-zäöüß0-9]+")
+date_formats = ["%B %d, %Y", "%B %-d, %Y", "%d %B %Y", "%-d %B %Y", "%d.%m.%Y", "%-d.%-m.%Y", "%Y-%m-%d", "%d/%m/%Y", "%m/%d/%Y"]
+
+def minhash(text: str) -> np.ndarray:
+    """MinHash signature over word 5-shingles of the lowercased text"""
+    tokens = token_pattern.findall(text.lower())
+    shingles = {" ".join(tokens[i:i + shingle_words]) for i in range(max(len(tokens) - shingle_words + 1, 1))}
+    hashes = np.array([int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=4).digest(), "big") for shingle in shingles], dtype=np.uint64)
+    # a * x + b stays below 2^63 for 32 bit hashes and 31 bit coefficients, so uint64 never overflows
+    return ((np.outer(hashes, _a) + _b) % mersenne_prime).min(axis=0)
+
+def _band_buckets(signature: np.ndarray) -> List[int]:
+    return [int.from_bytes(hashlib.blake2b(signature[band * rows_per_band:(band + 1) * rows_per_band].tobytes(), digest_size=7).digest(), "big") for band in range(num_bands)]
+
+class NearDuplicateIndex:
+    """MinHash/LSH index over parsed documents and the data extracted from them, persisted in SQLite.
+    Documents are only compared against others extracted with the same data model and LLM backend,
+    so e.g. results of the fake backend are never reused for real requests."""
+
+    def __init__(self, path: str, max_documents: int):
+        self.path = path
+        self.max_documents = max_documents
+        self._lock = threading.Lock()
+        self._create_lock = threading.Lock()
+        self._created = False
+
+    def _create(self):
+        # on first use rather than on import, so importing the app never touches the disk
+        with self._create_lock:
+            if self._created:
+                return
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=30)
+            try:
+                with connection:
+                    connection.execute(
+                        "CREATE TABLE IF NOT EXISTS documents ("
+                        "id INTEGER PRIMARY KEY AUTOINCREMENT, data_model TEXT NOT NULL, text TEXT NOT NULL, "
+                        "data TEXT NOT NULL, signature BLOB NOT NULL, created_at REAL NOT NULL)"
+                    )
+                    connection.execute("CREATE TABLE IF NOT EXISTS bands (band INTEGER NOT NULL, bucket INTEGER NOT NULL, document_id INTEGER NOT NULL)")
+                    connection.execute("CREATE INDEX IF NOT EXISTS bands_bucket ON bands (band, bucket)")
+                    connection.execute("CREATE INDEX IF NOT EXISTS bands_document_id ON bands (document_id)")
+            finally:
+                connection.close()
+            self._created = True
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        if not self._created:
+            self._create()
+        connection = sqlite3.connect(self.path, timeout=30)
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    @staticmethod
+    def _key(data_model, llm_backend: str) -> str:
+        return f"{llm_backend}:{model_digest(data_model)}"
+
+    def find(self, text: str, data_model, llm_backend: str) -> Optional[Tuple[str, Dict[str, Any], float]]:
+        """returns the text, data and estimated similarity of the most similar indexed document,
+        if it is above the similarity threshold"""
+        signature = minhash(text)
+        buckets = _band_buckets(signature)
+        with self._connect() as connection:
+            candidates = connection.execute(
+                f"SELECT DISTINCT d.id, d.signature FROM bands b JOIN documents d ON d.id = b.document_id "
+                f"WHERE ({' OR '.join(['(b.band = ? AND b.bucket = ?)'] * num_bands)}) AND d.data_model = ?",
+                [value for band, bucket in enumerate(buckets) for value in (band, bucket)] + [self._key(data_model, llm_backend)],
+            ).fetchall()
+            best_id, best_similarity = None, dedup_similarity_threshold
+            for document_id, candidate_signature in candidates:
+                similarity = float(np.mean(np.frombuffer(candidate_signature, dtype=np.uint64) == signature))
+                if similarity >= best_similarity:
+                    best_id, best_similarity = document_id, similarity
+            if best_id is None:
+                return None
+            text, data = connection.execute("SELECT text, data FROM documents WHERE id = ?", (best_id,)).fetchone()
+        return text, json.loads(data), best_similarity
+
+    def add(self, text: str, data_model, llm_backend: str, data: BaseModel):
+        signature = minhash(text)
+        # defaults are left out, as e.g. OperationalKPIs.date defaults to None but does not validate None
+        with self._lock, self._connect() as connection:
+            document_id = connection.execute(
+                "INSERT INTO documents (data_model, text, data, signature, created_at) VALUES (?, ?, ?, ?, ?)",
+                (self._key(data_model, llm_backend), text, data.model_dump_json(exclude_defaults=True), signature.tobytes(), time.time()),
+            ).lastrowid
+            connection.executemany("INSERT INTO bands (band, bucket, document_id) VALUES (?, ?, ?)", [(band, bucket, document_id) for band, bucket in enumerate(_band_buckets(signature))])
+            cutoff = document_id - self.max_documents
+            if cutoff > 0:
+                connection.execute("DELETE FROM bands WHERE document_id <= ?", (cutoff,))
+                connection.execute("DELETE FROM documents WHERE id <= ?", (cutoff,))
+
+def _number_renderings(value: float) -> List[str]:
+    renderings = []
+    if float(value).is_integer():
+        renderings += [str(int(value)), f"{int(value):,}", f"{int(value):,}".replace(",", ".")]
+    english = f"{value:,.2f}"
+    german = english.replace(",", "_").replace(".", ",").replace("_", ".")
+    renderings += [english, german, english.replace(",", ""), german.replace(".", "")]
+    if 0 < value <= 1:
+        # shares are stored as fractions but written as percentages
+        percent = value * 100
+        renderings += [f"{percent:g}%", f"{percent:.2f}%", f"{percent:.2f}%".replace(".", ",")]
+    return renderings
+
+def _renderings(value: Any) -> List[str]:
+    """ways a dumped field value may be written in a document"""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return _number_renderings(value)
+    if isinstance(value, str):
+        try:
+            date = datetime.datetime.fromisoformat(value)
+        except ValueError:
+            return [value]
+        renderings = [date.strftime(date_format) for date_format in date_formats]
+        suffix = "th" if 10 <= date.day % 100 <= 20 else {1: "st", 2: "nd", 3: "rd"}.get(date.day % 10, "th")
+        return renderings + [date.strftime(f"%B {date.day}{suffix}, %Y")]
+    return []
+
+def _locate(text: str, value: Any) -> List[Tuple[int, int]]:
+    """character spans where the value is written in text, whitespace and case insensitive"""
+    spans = []
+    for rendering in dict.fromkeys(_renderings(value)):
+        if not rendering.strip():
+            continue
+        pattern = r"\s+".join(re.escape(part) for part in rendering.split())
+        spans += [match.span() for match in re.finditer(rf"(?<![\w.,]){pattern}(?![\d])", text, re.IGNORECASE)]
+    return spans
+
+def _line_ranges(text: str, words: List[re.Match]) -> List[Tuple[int, int]]:
+    """word index ranges of the non-empty lines of text"""
+    ranges, start = [], 0
+    for index in range(1, len(words) + 1):
+        if index == len(words) or "\n" in text[words[index - 1].end():words[index].start()]:
+            ranges.append((start, index))
+            start = index
+    return ranges
+
+def _diff_words(old_text: str, old_words: List[re.Match], new_text: str, new_words: List[re.Match]) -> List[Tuple[str, int, int, int, int]]:
+    """word level opcodes like SequenceMatcher.get_opcodes, found line by line first and word by word only
+    within changed lines. Matching all words at once is roughly quadratic on long documents."""
+    old_lines, new_lines = _line_ranges(old_text, old_words), _line_ranges(new_text, new_words)
+    old_tokens, new_tokens = [word.group() for word in old_words], [word.group() for word in new_words]
+    matcher = SequenceMatcher(None, [" ".join(old_tokens[i1:i2]) for i1, i2 in old_lines], [" ".join(new_tokens[j1:j2]) for j1, j2 in new_lines], autojunk=False)
+    opcodes = []
+    for tag, a1, a2, b1, b2 in matcher.get_opcodes():
+        i1 = old_lines[a1][0] if a1 < len(old_lines) else len(old_words)
+        i2 = old_lines[a2 - 1][1] if a2 > a1 else i1
+        j1 = new_lines[b1][0] if b1 < len(new_lines) else len(new_words)
+        j2 = new_lines[b2 - 1][1] if b2 > b1 else j1
+        if tag != "replace" or max(i2 - i1, j2 - j1) > dedup_max_block_words:
+            opcodes.append((tag, i1, i2, j1, j2))
+            continue
+        block = SequenceMatcher(None, old_tokens[i1:i2], new_tokens[j1:j2], autojunk=False)
+        opcodes += [(word_tag, i1 + x1, i1 + x2, j1 + y1, j1 + y2) for word_tag, x1, x2, y1, y2 in block.get_opcodes()]
+    return opcodes
+
+def plan_reextraction(old_text: str, new_text: str, old_data: BaseModel) -> Optional[Tuple[List[str], Optional[str]]]:
+    """compares a new document with a near-identical, already extracted one. Returns the top-level fields
+    to extract again and the changed passages of the new text to extract them from, or None for the
+    passages if a field must be read from the whole text. Returns None if too much has changed.
+
+    A field is extracted again if its earlier value is written inside a changed passage, or if it cannot
+    be found in the earlier text at all. Empty fields are extracted again from the changed passages, as
+    a changed passage may add their value. Labels (enums, booleans) are reused as is."""
+    old_words = list(word_pattern.finditer(old_text))
+    new_words = list(word_pattern.finditer(new_text))
+    if max(len(old_words), len(new_words)) > dedup_max_words:
+        return None
+    changes = [opcode for opcode in _diff_words(old_text, old_words, new_text, new_words) if opcode[0] != "equal"]
+    changed_words = sum(max(i2 - i1, j2 - j1) for _, i1, i2, j1, j2 in changes)
+    if changed_words > dedup_max_changed_ratio * max(len(new_words), 1):
+        return None
+
+    def old_span(i1: int, i2: int) -> Tuple[int, int]:
+        # insertions are zero-width, at the start of the word they were inserted before
+        start = old_words[i1].start() if i1 < len(old_words) else len(old_text)
+        return start, old_words[i2 - 1].end() if i2 > i1 else start
+
+    changed_spans = [old_span(i1, i2) for _, i1, i2, _, _ in changes]
+    fields, whole_text = [], False
+    dumped = old_data.model_dump(mode="json")
+    for name in type(old_data).model_fields:
+        if dumped[name] is None or dumped[name] in ([], {}):
+            if changes:
+                fields.append(name)
+            continue
+        if isinstance(getattr(old_data, name), (bool, enum.Enum)):
+            continue
+        spans = _locate(old_text, dumped[name])
+        if not spans:
+            fields.append(name)
+            whole_text = True
+        elif any(start <= changed_end and changed_start <= end for start, end in spans for changed_start, changed_end in changed_spans):
+            fields.append(name)
+    if not fields or whole_text:
+        return fields, None
+
+    passages = []
+    for _, _, _, j1, j2 in changes:
+        start, end = max(j1 - dedup_context_words, 0), min(j2 + dedup_context_words, len(new_words))
+        if passages and start <= passages[-1][1]:
+            passages[-1] = (passages[-1][0], end)
+        else:
+            passages.append((start, end))
+    return fields, "\n...\n".join(new_text[new_words[start].start():new_words[end - 1].end()] for start, end in passages if end > start)
+
+near_duplicate_index = NearDuplicateIndex(
+    path=os.getenv("DEDUP_INDEX_PATH", "app/data/near_duplicates.sqlite"),
+    max_documents=int(os.getenv("DEDUP_MAX_DOCUMENTS", 50000)),
+)
@@ -1,42 +1,198 @@
 import os
-from typing import List
+import asyncio
+import threading
+from typing import Any, List, Tuple
 from dotenv import load_dotenv
 import logging
-from llama_parse import LlamaParse
-from llama_index.core import SimpleDirectoryReader
-from llama_index.core.program import LLMTextCompletionProgram
+from pydantic import ValidationError
 from api.data_models import response_models
-import csv
+from api.utils.cache_utils import parse_cache, llm_cache, llm_cache_key, hash_file
+from api.utils.upload_utils import delete_file
+from api.utils.chunk_utils import chunk_documents, chunk_max_chars, merge_data_models
+from api.utils.mapping_utils import match_columns
+from api.utils.classifier_utils import classify_document
+from api.utils.pdf_utils import pdf_text_layer_enabled, extract_text_layer
+from api.utils.schema_utils import schema_registry
+from api.utils.store_utils import extraction_store, extraction_store_enabled
+from api.utils.dedup_utils import dedup_enabled, near_duplicate_index, plan_reextraction
+from api.utils.fake_llm_utils import FakeProgram
+from api.utils.metrics_utils import timed, record_cache, record_estimated_tokens, record_parse_path
+from api.utils.resilience_utils import parse_policy, llm_policy
+from api.utils.repair_utils import RepairableOutputError, create_output_parser, repair_locally, repair_model, drop_repair_models, format_errors, record_repairs, repaired_fields
 
 logging.basicConfig(level=logging.INFO)
 load_dotenv()
 
 api_key = os.getenv("LLAMA_CLOUD_API_KEY")
+result_type = "markdown"  # "markdown" and "text" are available
 
-parser = LlamaParse(
-    api_key=api_key,
-    result_type="markdown"  # "markdown" and "text" are available
-)
+# "llamaparse" parses via LlamaParse, "local" uses the built-in llama_index file readers (e.g. pypdf for .pdf)
+parser_backend = os.getenv("PARSER_BACKEND", "llamaparse")
+# "default" uses the llama_index default LLM, "fake" returns placeholder results locally (see fake_llm_utils)
+llm_backend = os.getenv("LLM_BACKEND", "default")
+
+if parser_backend not in ("llamaparse", "local"):
+    raise ValueError(f"Unknown PARSER_BACKEND: {parser_backend}")
+if llm_backend not in ("default", "fake"):
+    raise ValueError(f"Unknown LLM_BACKEND: {llm_backend}")
+
+# with LlamaParse, PDFs with a usable text layer are read locally first (see pdf_utils)
+text_layer_first = pdf_text_layer_enabled and parser_backend == "llamaparse"
+parse_mode = f"text_layer+{parser_backend}" if text_layer_first else parser_backend
+
+# llama_index and llama_parse are only imported and their clients only built on first use (or warm_up),
+# which keeps app startup and worker forks cheap; one instance of each is shared per process
+parser = None
+_parser_lock = threading.Lock()
+
+def get_parser():
+    """returns the shared LlamaParse client, or None for the local parser backend"""
+    global parser
+    if parser is None and parser_backend == "llamaparse":
+        with _parser_lock:
+            if parser is None:
+                from llama_parse import LlamaParse
+                parser = LlamaParse(
+                    api_key=api_key,
+                    result_type=result_type
+                )
+    return parser
 
 #file_extractor = {".pdf": parser}
 
-async def return_csv_column_names(file_location: str) -> List:
-    """returns the column names of the csv file"""
-    logging.info(f"Reading columns from {file_location} initiated...")
-    with open(file_location, 'r') as file:
-        csv_reader = csv.reader(file)
-        header = next(csv_reader)
-    logging.info(f"Reading column names for {file_location} successful...")
-    return header
-
-async def read_file(file_location: str, extension: str) -> List:
-    directory = os.path.dirname(os.path.abspath(file_location))
-    logging.info(f"Reading file from directory: {directory}")
+llm_max_concurrency = int(os.getenv("LLM_MAX_CONCURRENCY", 8))
+parse_max_concurrency = int(os.getenv("PARSE_MAX_CONCURRENCY", 4))
+_llm_semaphore = None
+_parse_semaphore = None
+
+def get_llm_semaphore() -> asyncio.Semaphore:
+    """created on first use so it binds to the server's event loop, not the import-time one"""
+    global _llm_semaphore
+    if _llm_semaphore is None:
+        _llm_semaphore = asyncio.Semaphore(llm_max_concurrency)
+    return _llm_semaphore
+
+def get_parse_semaphore() -> asyncio.Semaphore:
+    global _parse_semaphore
+    if _parse_semaphore is None:
+        _parse_semaphore = asyncio.Semaphore(parse_max_concurrency)
+    return _parse_semaphore
+
+_programs = {}
+_programs_lock = threading.Lock()
+
+def get_program(output_cls, template: str):
+    """returns the shared program for (output_cls, template), building it on first use.
+    Programs hold no per-call state, so one instance is reused across concurrent requests."""
+    key = (output_cls, template)
+    program = _programs.get(key)
+    if program is None:
+        with _programs_lock:
+            program = _programs.get(key)
+            if program is None:
+                if llm_backend == "fake":
+                    program = FakeProgram(output_cls)
+                else:
+                    from llama_index.core.program import LLMTextCompletionProgram
+                    program = LLMTextCompletionProgram.from_defaults(
+                        output_parser=create_output_parser(output_cls),
+                        output_cls=output_cls,
+                        prompt_template_str=template,
+                        verbose=True
+                    )
+                _programs[key] = program
+    return program
+
+async def aget_program(output_cls, template: str):
+    """get_program for async code. Building the first program imports llama_index, which takes seconds,
+    so programs are built in a worker thread rather than blocking every request on the event loop."""
+    if (output_cls, template) in _programs:
+        return get_program(output_cls, template)
+    return await asyncio.to_thread(get_program, output_cls, template)
+
+_llm_clients_imported = False
+
+def import_llm_clients():
+    """imports llama_index and builds the parser client"""
+    global _llm_clients_imported
+    from llama_index.core import SimpleDirectoryReader, Document  # noqa: F401
+    get_parser()
+    _llm_clients_imported = True
+
+async def ensure_llm_clients():
+    """imports the LLM clients in a worker thread on first use, like aget_program"""
+    if not _llm_clients_imported:
+        await asyncio.to_thread(import_llm_clients)
+
+def drop_programs(output_cls):
+    """removes the programs of an output class, e.g. a registered schema's model evicted from its cache,
+    together with those of its repair models (used for repairs and incremental near-duplicate runs)"""
+    output_classes = [output_cls, *drop_repair_models(output_cls)]
+    with _programs_lock:
+        for key in [key for key in _programs if any(key[0] is cls for cls in output_classes)]:
+            del _programs[key]
+
+schema_registry.add_eviction_listener(drop_programs)
+
+def warm_up():
+    """builds the parser client and the programs for all built-in output classes ahead of the first request"""
+    import_llm_clients()
+    for output_cls in [response_models.DocumentMetadata, response_models.DocumentExtraction, *response_models.category_to_data_model.values()]:
+        get_program(output_cls, prompt_template_str)
+    get_program(response_models.InvestmentColumns, prompt_template_str_mapping)
+    logging.info(f"Warmed up {len(_programs)} LLM programs...")
+
+async def run_program(program, **kwargs):
+    """runs an LLM program via its native async call so the event loop is never blocked,
+    with at most LLM_MAX_CONCURRENCY calls in flight per worker and the LLM resilience policy applied"""
+    async with get_llm_semaphore():
+        result = await llm_policy.call(lambda: program.acall(**kwargs))
+    prompt = getattr(program, "prompt", None)
+    if prompt is not None:
+        # tokenizing long prompts takes milliseconds, so it runs off the event loop
+        await asyncio.to_thread(_estimate_tokens, prompt, kwargs, result)
+    return result
+
+def _estimate_tokens(prompt, kwargs: dict, result):
+    from llama_index.core.utils import get_tokenizer
+    tokenizer = get_tokenizer()
+    record_estimated_tokens(result.__class__.__name__, len(tokenizer(prompt.format(**kwargs))), len(tokenizer(result.model_dump_json())))
+
+@timed("read_file")
+async def read_file(file_location: str, extension: str, file_hash: str = None) -> Tuple[List, bool]:
+    """parses only the given file, never the rest of the upload directory. With LlamaParse, PDFs are read
+    from their text layer when it passes the quality checks in pdf_utils and only uploaded otherwise.
+    Returns the documents and whether they were served from the parse cache."""
+    file_hash = file_hash or await asyncio.to_thread(hash_file, file_location)
+    cache_key = f"{file_hash}:{parse_mode}:{result_type}"
+    # the disk cache blocks on sqlite, so it is never called on the event loop
+    cached = await asyncio.to_thread(parse_cache.get, cache_key)
+    record_cache("parse", cached is not None)
+    await ensure_llm_clients()
+    from llama_index.core import SimpleDirectoryReader, Document
+    if cached is not None:
+        logging.info(f"Parse cache hit for: {file_location}")
+        return [Document(text=doc["text"], metadata=doc["metadata"]) for doc in cached], True
+
+    logging.info(f"Reading file: {file_location}")
     print("Extension: ", extension)
-    reader = SimpleDirectoryReader(directory, file_extractor={extension: parser})
-    documents = await reader.aload_data(show_progress=True, num_workers=1)
+    if text_layer_first and extension == ".pdf":
+        pages = await extract_text_layer(file_location)
+        if pages is not None:
+            record_parse_path("text_layer")
+            metadata = {"file_path": file_location, "file_name": os.path.basename(file_location)}
+            documents = [Document(text=page, metadata={**metadata, "page_label": str(i + 1)}) for i, page in enumerate(pages)]
+            await asyncio.to_thread(parse_cache.set, cache_key, [{"text": doc.text, "metadata": doc.metadata} for doc in documents])
+            return documents, False
+
+    file_parser = get_parser()
+    reader = SimpleDirectoryReader(input_files=[file_location], file_extractor={extension: file_parser} if file_parser else None)
+    async with get_parse_semaphore():
+        documents = await parse_policy.call(lambda: reader.aload_data(show_progress=True, num_workers=1))
     print(documents)
-    return documents
+    record_parse_path(parser_backend)
+    await asyncio.to_thread(parse_cache.set, cache_key, [{"text": doc.text, "metadata": doc.metadata} for doc in documents])
+    return documents, False
 
 prompt_template_str = """\
 Extract all relevant information from {document_text}. Return a null value if a property cannot be found.\
@@ -48,42 +204,239 @@ Extract all relevant information from {document_text}. Return a null value if a
 #         ----------------\
 #         """
 
-async def create_data_model(document: dict, data_model) -> dict:
-    logging.info(f"Creating data model for: {document}")
+async def extract_with_cache(document_text: str, output_cls):
+    """runs the extraction prompt for output_cls over document_text, memoized in the LLM cache"""
+    cache_key = f"{llm_backend}:{llm_cache_key(document_text, output_cls, prompt_template_str)}"
+    cached = await asyncio.to_thread(llm_cache.get, cache_key)
+    record_cache("llm", cached is not None)
+    if cached is not None:
+        logging.info(f"LLM cache hit for: {output_cls.__name__}")
+        try:
+            return output_cls.model_validate(cached)
+        except ValidationError:
+            logging.warning(f"Cached {output_cls.__name__} no longer validates, extracting again...")
 
-    program = LLMTextCompletionProgram.from_defaults(
-        output_cls=data_model,
-        prompt_template_str=prompt_template_str,
-        verbose=True
-    )
+    program = await aget_program(output_cls, prompt_template_str)
+    try:
+        result = await run_program(program, document_text=document_text)
+    except RepairableOutputError as e:
+        result = await repair_output(e)
+    # defaults are left out, as some are not valid values themselves (e.g. OperationalKPIs.date)
+    await asyncio.to_thread(llm_cache.set, cache_key, result.model_dump(mode="json", exclude_defaults=True))
+    return result
+
+prompt_template_str_repair = """\
+The following values extracted for {data_model} failed validation:
+{errors}
+Return corrected values for only these fields. Return a null value if a value cannot be corrected.\
+"""
 
-    result = program(document_text=document.text)
+async def repair_output(error: RepairableOutputError):
+    """repairs output that failed validation instead of re-extracting: cheap local fixes first, then one
+    small prompt with only the still failing fields and their values, never the document text"""
+    output_cls = error.output_cls
+    raw, repaired, remaining = repair_locally(error)
+    if any(not validation_error["loc"] or validation_error["loc"][0] not in output_cls.model_fields for validation_error in remaining):
+        # model-level errors cannot be narrowed down to fields
+        raise error
+    if remaining:
+        fields = tuple(dict.fromkeys(validation_error["loc"][0] for validation_error in remaining))
+        program = await aget_program(repair_model(output_cls, fields), prompt_template_str_repair)
+        fix = await run_program(program, data_model=output_cls.__name__, errors=format_errors(raw, remaining))
+        for name, value in fix.model_dump(mode="json").items():
+            if isinstance(value, dict) and isinstance(raw.get(name), dict):
+                raw[name].update({key: item for key, item in value.items() if item is not None})
+            else:
+                raw[name] = value
+        repaired += [tuple(validation_error["loc"]) for validation_error in remaining]
+    result = output_cls.model_validate(raw)
+    record_repairs(output_cls, repaired)
     return result
 
-prompt_template_str_mapping = """\
-Map the following columns to {data_model}: {header}. Return a null value if a property cannot be found.\
+@timed("create_data_model")
+async def create_chunked_data_model(chunks: List[str], data_model) -> dict:
+    """extracts data_model from each chunk concurrently and merges the partial results.
+    Chunks that fail validation (e.g. a required field is only in another chunk) are skipped."""
+    if len(chunks) == 1:
+        return await extract_with_cache(chunks[0], data_model)
+    logging.info(f"Creating data model {data_model.__name__} from {len(chunks)} chunks")
+
+    async def extract_chunk(chunk: str):
+        try:
+            return await extract_with_cache(chunk, data_model)
+        except (ValidationError, RepairableOutputError) as e:
+            logging.info(f"Skipping chunk of {data_model.__name__} that failed validation: {e}")
+            return e
+
+    # any other error (timeouts, open circuits, backend errors) fails the whole extraction and cancels the other chunks
+    tasks = [asyncio.ensure_future(extract_chunk(chunk)) for chunk in chunks]
+    try:
+        results = await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+    partials = [result for result in results if not isinstance(result, Exception)]
+    if not partials:
+        raise results[0]
+    return merge_data_models(partials, data_model)
+
+prompt_template_str_incremental = """\
+Extract only the following fields of {data_model}: {fields}. Return a null value if a property cannot be found.
+{document_text}\
 """
 
-async def create_mapping_model(header: List, data_model) -> dict:
-    logging.info(f"Creating mapping model for: {header}")
+@timed("near_duplicate")
+async def extract_near_duplicate(text: str, data_model):
+    """reuses the data of a near-identical, already extracted document (e.g. the same capital call sent to
+    another investor) and only extracts the fields whose source text changed, from the changed passages.
+    None if there is no near-duplicate or too much has changed."""
+    match = await asyncio.to_thread(near_duplicate_index.find, text, data_model, llm_backend)
+    record_cache("near_duplicate", match is not None)
+    if match is None:
+        return None
+    old_text, old_data, similarity = match
+    try:
+        old_model = data_model.model_validate(old_data)
+    except ValidationError:
+        logging.warning(f"Near-duplicate {data_model.__name__} no longer validates, extracting in full...")
+        return None
+    plan = await asyncio.to_thread(plan_reextraction, old_text, text, old_model)
+    if plan is None:
+        logging.info(f"Near-duplicate ({similarity:.2f}) changed too much, extracting in full")
+        return None
+    fields, passages = plan
+    logging.info(f"Near-duplicate ({similarity:.2f}) found, extracting {fields or 'no fields'} again")
+    if not fields:
+        return old_model
+    document_text = passages or text
+    if len(document_text) > chunk_max_chars:
+        # the full extraction splits it into chunks, a single incremental prompt might not fit
+        logging.info(f"Near-duplicate ({similarity:.2f}) needs more than one chunk re-read, extracting in full")
+        return None
+    program = await aget_program(repair_model(data_model, tuple(fields)), prompt_template_str_incremental)
+    try:
+        update = await run_program(program, data_model=data_model.__name__, fields=", ".join(fields), document_text=document_text)
+        # fields that were empty before stay unset if still not found, as e.g. OperationalKPIs.date does not validate None
+        values = {name: value for name, value in update.model_dump(mode="json").items() if value is not None or name in old_data}
+        return data_model.model_validate({**old_data, **values})
+    except (RepairableOutputError, ValidationError) as e:
+        logging.info(f"Incremental extraction of {data_model.__name__} failed ({e}), extracting in full")
+        return None
+
+async def create_document_data(text: str, chunks: List[str], data_model):
+    """extracts data_model incrementally from a near-duplicate if there is one, in full otherwise"""
+    if dedup_enabled:
+        data = await extract_near_duplicate(text, data_model)
+        if data is not None:
+            return data
+    data = await create_chunked_data_model(chunks, data_model=data_model)
+    if dedup_enabled:
+        # only full extractions are indexed, so incremental results never build on each other
+        await asyncio.to_thread(near_duplicate_index.add, text, data_model, llm_backend, data)
+    return data
+
+prompt_template_str_mapping = """\
+Map the following csv columns to {data_model}. Each column is listed with its inferred type, null rate, \
+estimated number of distinct values and sample values:
+{header}
+Answer with the column names. Return a null value if a property cannot be found.\
+"""
 
-    program = LLMTextCompletionProgram.from_defaults(
-        output_cls=data_model,
-        prompt_template_str=prompt_template_str_mapping,
-        verbose=True
+def format_column_profiles(columns: List[response_models.ColumnProfile]) -> str:
+    return "\n".join(
+        f"- {column.name!r}: {column.inferredType}, {column.nullRate:.0%} null, ~{column.distinctEstimate} distinct, e.g. {', '.join(repr(value) for value in column.sample)}"
+        for column in columns
     )
 
-    result = program(data_model=data_model, header=header)
-    return result
+@timed("create_mapping_model")
+async def create_mapping_model(columns: List[response_models.ColumnProfile], data_model) -> dict:
+    """maps known headers locally and only sends the unresolved columns to the LLM"""
+    logging.info(f"Creating mapping model for: {[column.name for column in columns]}")
+
+    matches, unresolved = match_columns(columns, data_model)
+    missing_fields = [field for field in data_model.model_fields if field not in matches]
+    if not missing_fields or not unresolved:
+        logging.info(f"Mapped {len(matches)} columns locally, skipping LLM")
+        return data_model(**matches)
+
+    program = await aget_program(data_model, prompt_template_str_mapping)
+    result = await run_program(program, data_model=data_model, header=format_column_profiles(unresolved))
+    unresolved_headers = {column.name for column in unresolved}
+    llm_matches = {field: header for field, header in result.model_dump().items() if field in missing_fields and header in unresolved_headers}
+    return data_model(**matches, **llm_matches)
 
+@timed("create_document_metadata")
 async def create_document_metadata(document: dict, ) -> dict:
     logging.info(f"Creating file metadata for: {document}")
-    
-    program = LLMTextCompletionProgram.from_defaults(
-        output_cls = response_models.DocumentMetadata,
-        prompt_template_str = prompt_template_str,
-        verbose = True
-    )
+    return await extract_with_cache(document.text, response_models.DocumentMetadata)
+
+async def create_document_extraction(document: dict) -> dict:
+    """classifies and extracts a document in a single LLM call"""
+    logging.info(f"Creating single-pass extraction for: {document}")
+    return await extract_with_cache(document.text, response_models.DocumentExtraction)
 
-    result = program(document_text=document.text)
-    return result
\ No newline at end of file
+
+async def extract_document(documents: List, category: response_models.ModelCategory = None, single_pass: bool = False, data_model=None) -> Tuple[response_models.DocumentMetadata, Any]:
+    """returns the document metadata and the data extracted for the given or classified category,
+    or for data_model if given (e.g. a registered schema).
+    Without either, the local classifier routes the document and the LLM is the fallback.
+    Long documents are split into chunks: metadata comes from the first chunk, data from all of them."""
+    await ensure_llm_clients()
+    from llama_index.core import Document
+    chunks = chunk_documents(documents)
+    document = Document(text=chunks[0])
+    text = "\n\n".join(doc.text for doc in documents if doc.text)
+    if data_model is not None:
+        return await asyncio.gather(
+            create_document_metadata(document=document),
+            create_document_data(text, chunks, data_model=data_model)
+        )
+    # a confident local prediction routes the document without waiting for the metadata LLM call
+    category = category or classify_document(chunks[0])
+    if category:
+        if category in response_models.category_to_data_model:
+            # metadata and data are independent once the category is known
+            document_metadata, data = await asyncio.gather(
+                create_document_metadata(document=document),
+                create_document_data(text, chunks, data_model=response_models.category_to_data_model[category])
+            )
+        else:
+            document_metadata, data = await create_document_metadata(document=document), None
+        # the metadata call classifies the document again, but the response reports the category the data was extracted for
+        return document_metadata.model_copy(update={"category": category}), data
+    if single_pass and len(chunks) == 1:
+        extraction = await create_document_extraction(document=document)
+        return extraction.documentMetadata, extraction.data
+    document_metadata = await create_document_metadata(document=document)
+    data_model = response_models.category_to_data_model.get(document_metadata.category)
+    data = await create_document_data(text, chunks, data_model=data_model) if data_model else None
+    return document_metadata, data
+
+async def extract_file(file_location: str, file_metadata: response_models.FileMetadata, file_hash: str = None, category: response_models.ModelCategory = None, single_pass: bool = False, data_model=None) -> Tuple[response_models.ExtractResponse, bool]:
+    """runs the full pipeline for a saved file, deleting it once parsed, and queues the result for the
+    extraction store. Returns the response and whether parsing was served from the parse cache."""
+    try:
+        document, parse_cache_hit = await read_file(file_location, file_metadata.extension, file_hash=file_hash)
+        logging.info(f"Reading text for {file_metadata.fileName} successful...")
+    finally:
+        await delete_file(file_location)
+        logging.info(f"File deletion for {file_metadata.fileName} successful...")
+
+    repairs = []
+    token = repaired_fields.set(repairs)
+    try:
+        document_metadata, data = await extract_document(document, category=category, single_pass=single_pass, data_model=data_model)
+    finally:
+        repaired_fields.reset(token)
+    logging.info(f"Reading document metadata and data for {file_metadata.fileName} successful...")
+
+    extract_response = response_models.ExtractResponse(
+        fileMetadata = file_metadata,
+        documentMetadata = document_metadata,
+        data = data,
+        repairedFields = repairs or None
+    )
+    if extraction_store_enabled:
+        extraction_store.add(extract_response, file_hash=file_hash)
+    return extract_response, parse_cache_hit
@@ -0,0 +1,77 @@
+import os
+import enum
+import time
+import random
+import asyncio
+import datetime
+import typing
+from typing import Any
+import logging
+from pydantic import BaseModel
+
+logging.basicConfig(level=logging.INFO)
+
+fake_llm_latency_ms = float(os.getenv("FAKE_LLM_LATENCY_MS", 500))
+fake_llm_jitter_ms = float(os.getenv("FAKE_LLM_JITTER_MS", 100))
+fake_llm_error_rate = float(os.getenv("FAKE_LLM_ERROR_RATE", 0))
+
+class FakeLLMError(Exception):
+    """Injected failure of the fake LLM backend."""
+
+def _fake_value(name: str, annotation: Any) -> Any:
+    origin = typing.get_origin(annotation)
+    if origin is typing.Union:
+        args = [arg for arg in typing.get_args(annotation) if arg is not type(None)]
+        return None if len(args) < len(typing.get_args(annotation)) else _fake_value(name, args[0])
+    if origin is typing.Annotated:
+        return _fake_value(name, typing.get_args(annotation)[0])
+    if origin in (list, set):
+        return []
+    if origin is dict:
+        return {}
+    if isinstance(annotation, type):
+        if issubclass(annotation, BaseModel):
+            return fake_instance(annotation)
+        if issubclass(annotation, enum.Enum):
+            return next(iter(annotation))
+        if issubclass(annotation, bool):
+            return False
+        if issubclass(annotation, (int, float)):
+            return annotation(0)
+        if issubclass(annotation, datetime.datetime):
+            return datetime.datetime(2024, 1, 1)
+        if issubclass(annotation, str):
+            # 3 letters satisfies the currency constraints of the response models
+            return "EUR" if "currency" in name.lower() else f"fake {name}"
+    return None
+
+def fake_instance(output_cls):
+    """builds a schema-valid instance of output_cls, filling required fields with placeholder values
+    and leaving optional fields empty"""
+    values = {name: _fake_value(name, field.annotation) for name, field in output_cls.model_fields.items() if field.is_required()}
+    return output_cls.model_validate(values)
+
+class FakeProgram:
+    """Local stand-in for LLMTextCompletionProgram with configurable latency, jitter and error rate."""
+
+    def __init__(self, output_cls, latency_ms: float = None, jitter_ms: float = None, error_rate: float = None):
+        self.output_cls = output_cls
+        self.latency_ms = fake_llm_latency_ms if latency_ms is None else latency_ms
+        self.jitter_ms = fake_llm_jitter_ms if jitter_ms is None else jitter_ms
+        self.error_rate = fake_llm_error_rate if error_rate is None else error_rate
+
+    def _delay(self) -> float:
+        return max(0.0, random.gauss(self.latency_ms, self.jitter_ms)) / 1000
+
+    def _result(self):
+        if random.random() < self.error_rate:
+            raise FakeLLMError(f"Injected failure for {self.output_cls.__name__}")
+        return fake_instance(self.output_cls)
+
+    def __call__(self, **kwargs):
+        time.sleep(self._delay())
+        return self._result()
+
+    async def acall(self, **kwargs):
+        await asyncio.sleep(self._delay())
+        return self._result()
@@ -0,0 +1,126 @@
+import os
+import time
+import uuid
+import socket
+import asyncio
+import ipaddress
+from urllib.parse import urlsplit
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+import logging
+import httpx
+from api.data_models.response_models import JobResponse, JobStatus
+
+logging.basicConfig(level=logging.INFO)
+
+# hosts callbacks may be sent to, e.g. "hooks.example.com,10.0.0.5". If unset, any host resolving to public addresses only.
+callback_allowed_hosts = {host.strip().lower() for host in os.getenv("JOB_CALLBACK_ALLOWED_HOSTS", "").split(",") if host.strip()}
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the queue is at its maximum depth."""
+
+def validate_callback_url(callback_url: str):
+    """raises ValueError unless callback_url is http(s) and its host is allowed, so results are never posted
+    to internal services. Resolves the host, so call it off the event loop."""
+    url = urlsplit(callback_url)
+    if url.scheme not in ("http", "https") or not url.hostname:
+        raise ValueError(f"Callback URL must be an http or https URL: {callback_url}")
+    host = url.hostname.lower()
+    if callback_allowed_hosts:
+        if host not in callback_allowed_hosts:
+            raise ValueError(f"Callback host {host} is not in JOB_CALLBACK_ALLOWED_HOSTS")
+        return
+    try:
+        addresses = {info[4][0] for info in socket.getaddrinfo(host, url.port or (443 if url.scheme == "https" else 80), type=socket.SOCK_STREAM)}
+    except (socket.gaierror, UnicodeError):
+        raise ValueError(f"Callback host {host} cannot be resolved")
+    for address in addresses:
+        if not ipaddress.ip_address(address.split("%")[0]).is_global:
+            raise ValueError(f"Callback host {host} resolves to the non-public address {address}")
+
+class JobQueue:
+    """In-process job store with a bounded queue and a pool of worker tasks."""
+
+    def __init__(self, max_depth: int, num_workers: int, retention_seconds: int):
+        self.max_depth = max_depth
+        self.num_workers = num_workers
+        self.retention_seconds = retention_seconds
+        self.jobs: Dict[str, JobResponse] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+
+    async def start(self):
+        self._queue = asyncio.Queue(maxsize=self.max_depth)
+        self._workers = [asyncio.ensure_future(self._work()) for _ in range(self.num_workers)]
+        logging.info(f"Started {self.num_workers} job workers...")
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        # jobs that never ran still hold their uploads
+        while self._queue is not None and not self._queue.empty():
+            job_id, _, _, discard = self._queue.get_nowait()
+            job = self.jobs[job_id]
+            job.status, job.error, job.finishedAt = JobStatus.Failed, "Server shut down before the job ran", time.time()
+            if discard is not None:
+                try:
+                    await discard()
+                except Exception:
+                    logging.exception(f"Cleaning up job {job_id} failed")
+
+    def submit(self, handler: Callable[[], Awaitable[Any]], callback_url: str = None, discard: Callable[[], Awaitable[None]] = None) -> JobResponse:
+        """queues the handler and returns the job at once. discard is awaited instead if the job never runs,
+        e.g. to delete its upload at shutdown. Raises QueueFullError when the queue is at max_depth."""
+        if self._queue is None:
+            raise RuntimeError("Job queue has not been started")
+        self._purge()
+        job = JobResponse(jobId=uuid.uuid4().hex, status=JobStatus.Queued, createdAt=time.time())
+        try:
+            self._queue.put_nowait((job.jobId, handler, callback_url, discard))
+        except asyncio.QueueFull:
+            raise QueueFullError(f"Job queue is full ({self.max_depth} jobs)")
+        self.jobs[job.jobId] = job
+        return job
+
+    def get(self, job_id: str) -> Optional[JobResponse]:
+        return self.jobs.get(job_id)
+
+    def _purge(self):
+        """drops finished jobs older than the retention period"""
+        cutoff = time.time() - self.retention_seconds
+        for job_id in [job_id for job_id, job in self.jobs.items() if job.finishedAt and job.finishedAt < cutoff]:
+            del self.jobs[job_id]
+
+    async def _work(self):
+        while True:
+            job_id, handler, callback_url, _ = await self._queue.get()
+            job = self.jobs[job_id]
+            job.status = JobStatus.Running
+            try:
+                job.result = await handler()
+                job.status = JobStatus.Succeeded
+            except Exception as e:
+                logging.exception(f"Job {job_id} failed")
+                job.status = JobStatus.Failed
+                job.error = str(e)
+            finally:
+                job.finishedAt = time.time()
+                self._queue.task_done()
+            if callback_url:
+                await self._notify(job, callback_url)
+
+    async def _notify(self, job: JobResponse, callback_url: str):
+        try:
+            # checked again, as the host may resolve differently than at submission
+            await asyncio.to_thread(validate_callback_url, callback_url)
+            async with httpx.AsyncClient(timeout=10, follow_redirects=False) as client:
+                await client.post(callback_url, json=job.model_dump(mode="json"))
+        except (ValueError, httpx.HTTPError) as e:
+            logging.warning(f"Webhook for job {job.jobId} to {callback_url} failed: {e}")
+
+job_queue = JobQueue(
+    max_depth=int(os.getenv("JOB_QUEUE_MAX_DEPTH", 100)),
+    num_workers=int(os.getenv("JOB_WORKERS", 4)),
+    retention_seconds=int(os.getenv("JOB_RETENTION_SECONDS", 3600)),
+)
@@ -0,0 +1,112 @@
+import os
+import re
+import json
+import threading
+import unicodedata
+from difflib import SequenceMatcher
+from typing import Dict, List, Optional, Tuple
+import logging
+from api.data_models.response_models import ColumnProfile, InvestmentColumns
+
+logging.basicConfig(level=logging.INFO)
+
+mapping_confidence_threshold = float(os.getenv("MAPPING_CONFIDENCE_THRESHOLD", 0.85))
+synonyms_path = os.getenv("MAPPING_SYNONYMS_PATH", "app/cache/column_synonyms.json")
+
+# header conventions seen in our exports, by data model and field
+builtin_synonyms: Dict[type, Dict[str, List[str]]] = {
+    InvestmentColumns: {
+        "companyName": ["company", "company name", "name", "asset", "asset name", "portfolio company", "investment", "unternehmen", "firma", "firmenname"],
+        "currency": ["currency", "ccy", "cur", "curr", "whg", "waehrung", "währung"],
+        "type": ["type", "investment type", "asset type", "asset class", "art", "typ"],
+        "sector": ["sector", "industry", "vertical", "branche", "sektor"],
+        "businessModel": ["business model", "model", "revenue model", "geschäftsmodell"],
+        "website": ["website", "url", "homepage", "web", "domain", "webseite"],
+    }
+}
+
+def normalize_header(header: str) -> str:
+    """lowercases, strips accents and drops everything but letters and digits"""
+    header = unicodedata.normalize("NFKD", header.replace("ä", "ae").replace("ö", "oe").replace("ü", "ue").replace("ß", "ss"))
+    header = "".join(char for char in header if not unicodedata.combining(char))
+    return re.sub(r"[^a-z0-9]", "", header.lower())
+
+class SynonymStore:
+    """Learned header -> field synonyms per data model, persisted as JSON and shared by all workers."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._synonyms: Optional[Dict[str, Dict[str, str]]] = None
+        self._mtime = None
+
+    def _read(self) -> Tuple[Dict[str, Dict[str, str]], Optional[int]]:
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+            with open(self.path, "r") as file:
+                return json.load(file), mtime
+        except FileNotFoundError:
+            return {}, None
+
+    def _load(self) -> Dict[str, Dict[str, str]]:
+        # reloaded when the file changes, so synonyms learned by other workers are picked up
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if self._synonyms is None or mtime != self._mtime:
+            self._synonyms, self._mtime = self._read()
+        return self._synonyms
+
+    def get(self, data_model) -> Dict[str, str]:
+        with self._lock:
+            return dict(self._load().get(data_model.__name__, {}))
+
+    def learn(self, data_model, mapping: Dict[str, Optional[str]]):
+        """stores confirmed field -> header pairs so the headers resolve locally next time"""
+        with self._lock:
+            # merged into what is on disk right before writing, so pairs learned by other workers are kept
+            self._synonyms, _ = self._read()
+            synonyms = self._synonyms.setdefault(data_model.__name__, {})
+            for field, header in mapping.items():
+                if header and field in data_model.model_fields:
+                    synonyms[normalize_header(header)] = field
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            temporary_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(temporary_path, "w") as file:
+                json.dump(self._synonyms, file, indent=2, sort_keys=True)
+            os.replace(temporary_path, self.path)
+            self._mtime = os.stat(self.path).st_mtime_ns
+
+synonym_store = SynonymStore(synonyms_path)
+
+def _score(normalized_header: str, field: str, synonyms: List[str], learned: Dict[str, str]) -> float:
+    if learned.get(normalized_header) == field:
+        return 1.0
+    candidates = [normalize_header(field)] + [normalize_header(synonym) for synonym in synonyms]
+    if normalized_header in candidates:
+        return 1.0
+    return max(SequenceMatcher(None, normalized_header, candidate).ratio() for candidate in candidates)
+
+def match_columns(columns: List[ColumnProfile], data_model, threshold: float = None) -> Tuple[Dict[str, str], List[ColumnProfile]]:
+    """maps headers to data_model fields locally via exact, normalized, learned and fuzzy matches.
+    Returns the confident field -> header matches and the columns that remain unresolved."""
+    threshold = mapping_confidence_threshold if threshold is None else threshold
+    synonyms = builtin_synonyms.get(data_model, {})
+    learned = synonym_store.get(data_model)
+    scored = []
+    for column in columns:
+        normalized_header = normalize_header(column.name)
+        for field in data_model.model_fields:
+            score = 1.0 if column.name == field else _score(normalized_header, field, synonyms.get(field, []), learned)
+            if score >= threshold:
+                scored.append((score, column.name, field))
+
+    # greedy assignment, best scores first, each header and field used at most once
+    matches, used_headers = {}, set()
+    for score, header, field in sorted(scored, key=lambda match: -match[0]):
+        if field not in matches and header not in used_headers:
+            matches[field] = header
+            used_headers.add(header)
+    unresolved = [column for column in columns if column.name not in used_headers]
+    return matches, unresolved
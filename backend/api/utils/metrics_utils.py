@@ -0,0 +1,61 @@
+import os
+import time
+import functools
+import contextvars
+from typing import List, Optional, Tuple
+from prometheus_client import Counter, Histogram
+
+server_timing_enabled = os.getenv("SERVER_TIMING_HEADER", "false").lower() == "true"
+
+stage_seconds = Histogram(
+    "pipeline_stage_seconds",
+    "Duration of extraction pipeline stages.",
+    ["stage"],
+    buckets=(0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120),
+)
+# the completion programs do not expose the LLM's usage, so tokens are counted by tokenizing the prompt and the parsed result
+llm_estimated_tokens = Counter("llm_estimated_tokens_total", "Estimated tokens sent to and received from the LLM.", ["kind", "output_cls"])
+cache_requests = Counter("cache_requests_total", "Cache lookups by cache and result.", ["cache", "result"])
+parse_paths = Counter("parse_path_total", "Parsed files by parsing path.", ["path"])
+
+# (stage, seconds) spans of the current request, for the Server-Timing header
+request_spans: contextvars.ContextVar[Optional[List[Tuple[str, float]]]] = contextvars.ContextVar("request_spans", default=None)
+
+def _record(name: str, seconds: float):
+    stage_seconds.labels(name).observe(seconds)
+    spans = request_spans.get()
+    if spans is not None:
+        spans.append((name, seconds))
+
+def timed(name: str):
+    """records the duration of an async function as a pipeline stage"""
+    def decorator(function):
+        @functools.wraps(function)
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await function(*args, **kwargs)
+            finally:
+                _record(name, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+def record_cache(cache: str, hit: bool):
+    cache_requests.labels(cache, "hit" if hit else "miss").inc()
+    spans = request_spans.get()
+    if spans is not None:
+        spans.append((f"{cache}-cache-{'hit' if hit else 'miss'}", 0.0))
+
+def record_parse_path(path: str):
+    parse_paths.labels(path).inc()
+
+def record_estimated_tokens(output_cls: str, prompt_tokens: int, completion_tokens: int):
+    llm_estimated_tokens.labels("prompt", output_cls).inc(prompt_tokens)
+    llm_estimated_tokens.labels("completion", output_cls).inc(completion_tokens)
+
+def server_timing(spans: List[Tuple[str, float]]) -> str:
+    """formats spans as a Server-Timing header value, summing repeated stages"""
+    totals = {}
+    for name, seconds in spans:
+        totals[name] = totals.get(name, 0.0) + seconds
+    return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in totals.items())
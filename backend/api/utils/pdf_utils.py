@@ -0,0 +1,146 @@
+import os
+import sys
+import html
+import time
+import asyncio
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional, Tuple
+import logging
+from api.utils.metrics_utils import timed
+
+logging.basicConfig(level=logging.INFO)
+
+# reads the text layer of digitally generated PDFs with PyMuPDF instead of uploading them to LlamaParse
+pdf_text_layer_enabled = os.getenv("PDF_TEXT_LAYER", "true").lower() == "true"
+# a document is only accepted if it averages at least this many characters per page...
+pdf_text_min_chars_per_page = int(os.getenv("PDF_TEXT_MIN_CHARS_PER_PAGE", 200))
+# ...has no page that is mostly image with hardly any text (a scan)...
+pdf_scanned_image_coverage = float(os.getenv("PDF_SCANNED_IMAGE_COVERAGE", 0.5))
+# ...and at most this share of unmappable characters (fonts without a usable encoding)
+pdf_max_bad_char_ratio = float(os.getenv("PDF_MAX_BAD_CHAR_RATIO", 0.02))
+# documents with at least this many pages are split across a process pool
+pdf_process_pool_min_pages = int(os.getenv("PDF_PROCESS_POOL_MIN_PAGES", 20))
+pdf_process_pool_workers = int(os.getenv("PDF_PROCESS_POOL_WORKERS", os.cpu_count() or 1))
+
+def _is_bad_char(char: str) -> bool:
+    # replacement character and private use area glyphs
+    return char == "\ufffd" or "\ue000" <= char <= "\uf8ff"
+
+def _image_coverage(page) -> float:
+    area = abs(page.rect)
+    covered = sum(abs(rect & page.rect) for image in page.get_images() for rect in page.get_image_rects(image[0]))
+    return min(covered / area, 1.0) if area else 0.0
+
+def _page_markdown(page) -> str:
+    """text blocks in reading order, with data tables (at least 3 rows and 2 columns, smaller ones are
+    usually layout) converted to markdown in place of the text they cover"""
+    tables = [table for table in page.find_tables().tables if table.row_count >= 3 and table.col_count >= 2]
+    items = [(table.bbox[1], html.unescape(table.to_markdown()).strip()) for table in tables]
+    for x0, y0, x1, y1, text, _, block_type in page.get_text("blocks", sort=True):
+        center = ((x0 + x1) / 2, (y0 + y1) / 2)
+        if block_type == 0 and not any(table.bbox[0] <= center[0] <= table.bbox[2] and table.bbox[1] <= center[1] <= table.bbox[3] for table in tables):
+            items.append((y0, text.strip()))
+    return "\n\n".join(text for _, text in sorted(items, key=lambda item: item[0]) if text)
+
+def _extract_pages(file_location: str, page_numbers: List[int]) -> List[Tuple[str, Dict]]:
+    """markdown and quality stats of the given pages. Runs in pool workers, so it opens the file itself."""
+    import fitz
+    pages = []
+    with fitz.open(file_location) as pdf:
+        for page_number in page_numbers:
+            page = pdf[page_number]
+            text = page.get_text()
+            stats = {
+                "chars": len(text.strip()),
+                "badChars": sum(_is_bad_char(char) for char in text),
+                "imageCoverage": _image_coverage(page),
+            }
+            pages.append((_page_markdown(page), stats))
+    return pages
+
+def _page_count(file_location: str) -> int:
+    """number of pages, 0 if the file cannot be opened or is encrypted"""
+    import fitz
+    try:
+        with fitz.open(file_location) as pdf:
+            return 0 if pdf.needs_pass else pdf.page_count
+    except Exception as e:
+        logging.warning(f"Could not open {file_location} for text extraction: {e!r}")
+        return 0
+
+def rejection_reason(stats: List[Dict]) -> Optional[str]:
+    """why the text layer is not good enough to skip LlamaParse, None if it is"""
+    chars = sum(page["chars"] for page in stats)
+    if chars < pdf_text_min_chars_per_page * len(stats):
+        return f"{chars / len(stats):.0f} characters per page"
+    scanned = [i + 1 for i, page in enumerate(stats) if page["imageCoverage"] >= pdf_scanned_image_coverage and page["chars"] < pdf_text_min_chars_per_page]
+    if scanned:
+        return f"scanned pages {scanned}"
+    bad_chars = sum(page["badChars"] for page in stats)
+    if bad_chars > pdf_max_bad_char_ratio * chars:
+        return f"{bad_chars} unmappable characters"
+    return None
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool() -> ProcessPoolExecutor:
+    """shared pool for large PDFs, created on first use. Workers are spawned rather than forked,
+    as forking the threaded server process is unsafe."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ProcessPoolExecutor(max_workers=pdf_process_pool_workers, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(cancel_futures=True)
+        _pool = None
+
+@timed("pdf_text_layer")
+async def extract_text_layer(file_location: str) -> Optional[List[str]]:
+    """returns the markdown of every page from the PDF's text layer, or None if the file needs OCR
+    or layout-aware parsing. Pages of large files are split into one batch per pool worker."""
+    page_count = await asyncio.to_thread(_page_count, file_location)
+    if not page_count:
+        return None
+    try:
+        if page_count < pdf_process_pool_min_pages or pdf_process_pool_workers < 2:
+            pages = await asyncio.to_thread(_extract_pages, file_location, list(range(page_count)))
+        else:
+            loop = asyncio.get_running_loop()
+            batch_size = -(-page_count // pdf_process_pool_workers)
+            batches = [list(range(start, min(start + batch_size, page_count))) for start in range(0, page_count, batch_size)]
+            results = await asyncio.gather(*[loop.run_in_executor(get_pool(), _extract_pages, file_location, batch) for batch in batches])
+            pages = [page for result in results for page in result]
+    except BrokenProcessPool as e:
+        # a crashed worker breaks the whole pool, the next large file gets a fresh one
+        logging.warning(f"Text extraction pool failed on {file_location} ({e!r}), falling back...")
+        shutdown_pool()
+        return None
+    except Exception as e:
+        # e.g. a corrupt page or a failing table detection, which the fallback parser may still handle
+        logging.warning(f"Text extraction failed on {file_location} ({e!r}), falling back...")
+        return None
+
+    reason = rejection_reason([stats for _, stats in pages])
+    if reason:
+        logging.info(f"Text layer of {file_location} rejected ({reason}), falling back...")
+        return None
+    return [markdown for markdown, _ in pages]
+
+# Check which PDFs take the text-layer fast path, and how fast:
+#   python -m api.utils.pdf_utils file.pdf [file.pdf ...]
+if __name__ == "__main__":
+    for path in sys.argv[1:]:
+        start = time.perf_counter()
+        pages = _extract_pages(path, list(range(_page_count(path))))
+        latency_ms = (time.perf_counter() - start) * 1000
+        reason = rejection_reason([stats for _, stats in pages]) if pages else "unreadable"
+        print(f"{path}: {len(pages)} pages in {latency_ms:.0f} ms, {'rejected: ' + reason if reason else 'accepted'}")
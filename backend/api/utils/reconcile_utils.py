@@ -0,0 +1,68 @@
+import os
+from typing import Dict, List, Optional, Tuple
+import logging
+import numpy as np
+from api.data_models.response_models import CapitalCall, Discrepancy, ReconciliationReport
+
+logging.basicConfig(level=logging.INFO)
+
+amount_tolerance = float(os.getenv("RECONCILIATION_AMOUNT_TOLERANCE", 0.01))
+share_tolerance = float(os.getenv("RECONCILIATION_SHARE_TOLERANCE", 0.0001))
+
+# components that add up to an investor's totalCapitalCalled
+total_components = ["contributionToTarget", "organizationalExpenses", "bunchFee", "liquidityBuffer", "adjustmentsFromPreviousCapitalCalls"]
+
+def _as_float(value: Optional[float]) -> float:
+    return np.nan if value is None else value
+
+def _fund_key(fund_name: Optional[str]) -> Optional[str]:
+    """fund names differing only in case or whitespace, e.g. "Fund I " and "fund I", are the same fund"""
+    return " ".join(fund_name.split()).casefold() if fund_name else None
+
+def _reconcile_group(key: Tuple[Optional[str], Optional[int]], capital_calls: List[CapitalCall]) -> ReconciliationReport:
+    values = np.array(
+        [[_as_float(getattr(capital_call, field)) for field in total_components + ["totalCapitalCalled", "equityShare"]] for capital_call in capital_calls],
+        dtype=float,
+    )
+    components, totals, shares = values[:, :len(total_components)], values[:, -2], values[:, -1]
+    discrepancies = []
+
+    # missing components count as zero, rows without a total cannot be checked
+    sums = np.nansum(components, axis=1)
+    for index in np.flatnonzero(np.abs(sums - totals) > amount_tolerance):
+        discrepancies.append(Discrepancy(check="totalCapitalCalled", investor=capital_calls[index].name, expected=float(sums[index]), actual=float(totals[index])))
+    for index in np.flatnonzero(np.isnan(totals)):
+        discrepancies.append(Discrepancy(check="totalCapitalCalledMissing", investor=capital_calls[index].name))
+
+    share_sum = None
+    if not np.all(np.isnan(shares)):
+        share_sum = float(np.nansum(shares))
+        if abs(share_sum - 1) > share_tolerance:
+            discrepancies.append(Discrepancy(check="equityShareSum", expected=1.0, actual=share_sum))
+
+    currencies = sorted({capital_call.currency.strip().upper() for capital_call in capital_calls if capital_call.currency and capital_call.currency.strip()})
+    if len(currencies) > 1:
+        discrepancies.append(Discrepancy(check="currency", actual=currencies))
+
+    _, capital_call_number = key
+    # reported as first written, without surrounding whitespace
+    fund_name = next((" ".join(capital_call.fundName.split()) for capital_call in capital_calls if capital_call.fundName), None)
+    return ReconciliationReport(
+        fundName=fund_name,
+        capitalCallNumber=capital_call_number,
+        investors=len(capital_calls),
+        totalCapitalCalled=float(np.nansum(totals)),
+        equityShare=share_sum,
+        discrepancies=discrepancies,
+    )
+
+def reconcile_capital_calls(capital_calls: List[CapitalCall]) -> List[ReconciliationReport]:
+    """groups capital calls by fund and call number in one pass and checks each group's arithmetic:
+    components add up to totalCapitalCalled per investor, equity shares sum to 1, one currency per group.
+    Fund names are compared ignoring case and whitespace, currencies ignoring case."""
+    groups: Dict[Tuple[Optional[str], Optional[int]], List[CapitalCall]] = {}
+    for capital_call in capital_calls:
+        groups.setdefault((_fund_key(capital_call.fundName), capital_call.capitalCallNumber), []).append(capital_call)
+    reports = [_reconcile_group(key, group) for key, group in groups.items()]
+    logging.info(f"Reconciled {len(capital_calls)} capital calls in {len(reports)} groups, {sum(len(report.discrepancies) for report in reports)} discrepancies...")
+    return reports
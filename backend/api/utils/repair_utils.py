@@ -0,0 +1,232 @@
+import re
+import json
+import copy
+import functools
+import threading
+import contextvars
+from enum import Enum
+from difflib import get_close_matches
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+from pydantic import BaseModel, Field, ValidationError, create_model
+from api.utils.mapping_utils import normalize_header
+
+logging.basicConfig(level=logging.INFO)
+
+# fields repaired while handling the current request, as "<Model>.<path>"
+repaired_fields: contextvars.ContextVar[Optional[List[str]]] = contextvars.ContextVar("repaired_fields", default=None)
+
+currency_aliases = {
+    "€": "EUR", "euro": "EUR", "euros": "EUR",
+    "$": "USD", "us$": "USD", "usdollar": "USD", "usdollars": "USD", "dollar": "USD", "dollars": "USD",
+    "£": "GBP", "pound": "GBP", "pounds": "GBP", "sterling": "GBP", "poundsterling": "GBP",
+    "fr": "CHF", "franken": "CHF", "swissfranc": "CHF", "swissfrancs": "CHF", "schweizerfranken": "CHF",
+    "¥": "JPY", "yen": "JPY", "japaneseyen": "JPY",
+    "canadiandollar": "CAD", "canadiandollars": "CAD", "australiandollar": "AUD", "australiandollars": "AUD",
+}
+# active ISO 4217 codes
+iso_currency_codes = frozenset("""
+    AED AFN ALL AMD ANG AOA ARS AUD AWG AZN BAM BBD BDT BGN BHD BIF BMD BND BOB BRL BSD BTN BWP BYN BZD
+    CAD CDF CHF CLP CNY COP CRC CUP CVE CZK DJF DKK DOP DZD EGP ERN ETB EUR FJD FKP GBP GEL GHS GIP GMD
+    GNF GTQ GYD HKD HNL HTG HUF IDR ILS INR IQD IRR ISK JMD JOD JPY KES KGS KHR KMF KPW KRW KWD KYD KZT
+    LAK LBP LKR LRD LSL LYD MAD MDL MGA MKD MMK MNT MOP MRU MUR MVR MWK MXN MYR MZN NAD NGN NIO NOK NPR
+    NZD OMR PAB PEN PGK PHP PKR PLN PYG QAR RON RSD RUB RWF SAR SBD SCR SDG SEK SGD SHP SLE SOS SRD SSP
+    STN SVC SYP SZL THB TJS TMT TND TOP TRY TTD TWD TZS UAH UGX USD UYU UZS VES VND VUV WST XAF XCD XCG
+    XOF XPF YER ZAR ZMW ZWL
+""".split())
+# scale words written after amounts, e.g. "1,5 Mio" or "250k"
+amount_scales = {
+    "k": 10 ** 3, "tsd": 10 ** 3, "thousand": 10 ** 3, "tausend": 10 ** 3,
+    "m": 10 ** 6, "mm": 10 ** 6, "mn": 10 ** 6, "mio": 10 ** 6, "million": 10 ** 6, "millions": 10 ** 6, "millionen": 10 ** 6,
+    "bn": 10 ** 9, "bln": 10 ** 9, "mrd": 10 ** 9, "billion": 10 ** 9, "billions": 10 ** 9, "milliarde": 10 ** 9, "milliarden": 10 ** 9,
+}
+number_pattern = re.compile(r"[-+]?\d[\d.,' ]*")
+
+class RepairableOutputError(ValueError):
+    """LLM output that is valid JSON but fails validation against output_cls."""
+
+    def __init__(self, output_cls, raw: Dict[str, Any], errors: List[Dict[str, Any]]):
+        super().__init__(f"{output_cls.__name__} failed validation: {[error['msg'] for error in errors]}")
+        self.output_cls = output_cls
+        self.raw = raw
+        self.errors = errors
+
+@functools.lru_cache(maxsize=None)
+def _repairing_output_parser_cls():
+    # defined on first use so importing this module does not pull in llama_index
+    from llama_index.core.output_parsers import PydanticOutputParser
+    from llama_index.core.output_parsers.utils import extract_json_str
+
+    class RepairingOutputParser(PydanticOutputParser):
+        """Pydantic output parser that keeps the raw JSON of outputs failing validation, so they can be repaired."""
+
+        def parse(self, text: str) -> Any:
+            try:
+                raw = json.loads(extract_json_str(text))
+            except (ValueError, json.JSONDecodeError):
+                return super().parse(text)
+            try:
+                return self.output_cls.model_validate(raw)
+            except ValidationError as e:
+                raise RepairableOutputError(self.output_cls, raw, e.errors(include_url=False, include_context=False))
+
+    return RepairingOutputParser
+
+def create_output_parser(output_cls):
+    """returns an output parser for output_cls that raises RepairableOutputError on invalid outputs"""
+    return _repairing_output_parser_cls()(output_cls=output_cls)
+
+def _get(raw: Any, path: Tuple) -> Any:
+    for key in path:
+        raw = raw[key]
+    return raw
+
+def _set(raw: Any, path: Tuple, value: Any):
+    for key in path[:-1]:
+        raw = raw[key]
+    raw[path[-1]] = value
+
+def _field_enum(output_cls, path: Tuple) -> Optional[type]:
+    """returns the Enum type of the field at path, if any"""
+    model = output_cls
+    annotation = None
+    for key in path:
+        if not (isinstance(model, type) and issubclass(model, BaseModel)) or key not in model.model_fields:
+            return None
+        annotation = model.model_fields[key].annotation
+        candidates = [annotation, *getattr(annotation, "__args__", ())]
+        model = next((candidate for candidate in candidates if isinstance(candidate, type) and issubclass(candidate, BaseModel)), None)
+    candidates = [annotation, *getattr(annotation, "__args__", ())]
+    return next((candidate for candidate in candidates if isinstance(candidate, type) and issubclass(candidate, Enum)), None)
+
+def normalize_currency(value: str) -> Optional[str]:
+    """ISO 4217 code of a currency code, name or symbol. None if it is not a known currency."""
+    letters = normalize_header(value)
+    currency = currency_aliases.get(value.strip().lower()) or currency_aliases.get(letters)
+    if currency is None and letters.upper() in iso_currency_codes:
+        currency = letters.upper()
+    return currency
+
+def _parse_number(value: str) -> Optional[float]:
+    """parses English and German amounts with an optional scale ("1,5 Mio", "250k"), currency and percent
+    sign. None if the separators are ambiguous or anything else is written around the number, as a wrong
+    amount is worse than a failed validation."""
+    matches = list(number_pattern.finditer(value))
+    if len(matches) != 1:
+        return None
+    match = matches[0]
+    prefix, suffix = value[:match.start()].split(), value[match.end():].split()
+    percent = bool(suffix) and suffix[-1] == "%"
+    if percent:
+        suffix.pop()
+    scale = 1
+    if suffix and suffix[0].lower().rstrip(".") in amount_scales:
+        scale = amount_scales[suffix.pop(0).lower().rstrip(".")]
+    if any(normalize_currency(word) is None for word in prefix + suffix):
+        return None
+    number = match.group().strip().replace("'", "").replace(" ", "").rstrip(".,")
+    separators = set(re.findall(r"[.,]", number))
+    decimal_separator = None
+    if len(separators) == 2:
+        # the later separator is the decimal one
+        decimal_separator = number[max(number.rfind(","), number.rfind("."))]
+    elif len(separators) == 1:
+        separator = separators.pop()
+        groups = number.split(separator)
+        # a single separator followed by exactly three digits groups thousands, e.g. "100.000" or "100,000"
+        if len(groups) == 2 and (len(groups[1]) != 3 or groups[0].lstrip("+-") in ("", "0")):
+            decimal_separator = separator
+    integer, fraction = number, ""
+    if decimal_separator:
+        integer, _, fraction = number.rpartition(decimal_separator)
+    groups = re.split(r"[.,]", integer)
+    if len(groups) > 1 and (not groups[0].lstrip("+-") or any(len(group) != 3 for group in groups[1:])):
+        return None
+    number = "".join(groups) + (f".{fraction}" if fraction else "")
+    if not re.fullmatch(r"[-+]?\d+(\.\d+)?", number):
+        return None
+    # scaled in decimal, so "2.3m" is 2300000 and not 2299999.9999999995
+    parsed = float(Decimal(number) * scale)
+    return parsed / 100 if percent else parsed
+
+def _local_fix(output_cls, path: Tuple, error: Dict[str, Any], value: Any) -> Tuple[bool, Any]:
+    """tries a cheap deterministic fix for one failing value. Returns whether it applied and the new value."""
+    name = str(path[-1]).lower()
+    error_type = error["type"]
+    if "currency" in name and isinstance(value, str):
+        # unknown currencies are left to the targeted re-ask rather than guessed
+        currency = normalize_currency(value)
+        return currency is not None, currency if currency is not None else value
+    if error_type == "enum":
+        enum = _field_enum(output_cls, path)
+        if enum is not None and isinstance(value, str):
+            lookup = {normalize_header(member.value): member.value for member in enum}
+            lookup.update({normalize_header(member.name): member.value for member in enum})
+            match = get_close_matches(normalize_header(value), list(lookup), n=1, cutoff=0.6)
+            return bool(match), lookup[match[0]] if match else value
+    if error_type in ("float_parsing", "int_parsing") and isinstance(value, str):
+        number = _parse_number(value)
+        return number is not None, number
+    if error_type == "less_than_equal" and isinstance(value, (int, float)) and 1 < value <= 100:
+        # a percentage given where a fraction is expected
+        return True, value / 100
+    return False, value
+
+def repair_locally(error: RepairableOutputError) -> Tuple[Dict[str, Any], List[Tuple], List[Dict[str, Any]]]:
+    """applies local fixes to every failing value. Returns the patched raw output, the repaired paths
+    and the errors that remain."""
+    raw = copy.deepcopy(error.raw)
+    repaired, remaining = [], []
+    for validation_error in error.errors:
+        path = tuple(validation_error["loc"])
+        try:
+            value = _get(raw, path)
+        except (KeyError, IndexError, TypeError):
+            remaining.append(validation_error)
+            continue
+        fixed, new_value = _local_fix(error.output_cls, path, validation_error, value)
+        if fixed:
+            _set(raw, path, new_value)
+            repaired.append(path)
+        else:
+            remaining.append(validation_error)
+    return raw, repaired, remaining
+
+_repair_models: Dict[type, Dict[Tuple[str, ...], type]] = {}
+_repair_models_lock = threading.Lock()
+
+def repair_model(output_cls, fields: Tuple[str, ...]):
+    """model with only the given top-level fields of output_cls, all optional, for a targeted re-ask.
+    Cached so repeated failures on the same fields reuse one class and one program."""
+    with _repair_models_lock:
+        models = _repair_models.setdefault(output_cls, {})
+        model = models.get(fields)
+        if model is None:
+            model = models[fields] = create_model(
+                f"{output_cls.__name__}Repair",
+                **{name: (Optional[output_cls.model_fields[name].annotation], Field(None, description=output_cls.model_fields[name].description)) for name in fields}
+            )
+    return model
+
+def drop_repair_models(output_cls) -> List[type]:
+    """forgets the repair models of output_cls, e.g. an evicted registered schema, and returns them"""
+    with _repair_models_lock:
+        return list(_repair_models.pop(output_cls, {}).values())
+
+def format_errors(raw: Dict[str, Any], errors: List[Dict[str, Any]]) -> str:
+    lines = []
+    for error in errors:
+        path = tuple(error["loc"])
+        try:
+            value = _get(raw, path)
+        except (KeyError, IndexError, TypeError):
+            value = None
+        lines.append(f"- {'.'.join(str(key) for key in path)}: {json.dumps(value)} ({error['msg']})")
+    return "\n".join(lines)
+
+def record_repairs(output_cls, paths: List[Tuple]):
+    fields = repaired_fields.get()
+    if fields is not None:
+        fields.extend(f"{output_cls.__name__}.{'.'.join(str(key) for key in path)}" for path in paths)
+    logging.info(f"Repaired {output_cls.__name__} fields: {paths}")
@@ -0,0 +1,151 @@
+import os
+import time
+import random
+import asyncio
+from collections import deque
+from typing import Awaitable, Callable, Dict, TypeVar
+import logging
+
+logging.basicConfig(level=logging.INFO)
+
+T = TypeVar("T")
+
+class CircuitOpenError(Exception):
+    """Raised when a call is rejected because the upstream's circuit breaker is open."""
+
+class CircuitBreaker:
+    """Opens after failure_threshold consecutive failures and lets a single trial call through
+    once reset_seconds have passed (half-open). A successful trial closes it again."""
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._trial_running:
+            self._trial_running = True
+            return True
+        return False
+
+    def release(self):
+        """frees the half-open trial slot of a call that ended without a result, e.g. on cancellation"""
+        self._trial_running = False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self._trial_running or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+        self._trial_running = False
+
+class ResiliencePolicy:
+    """Per-call timeout, retries with jittered exponential backoff, optional hedging and a circuit breaker
+    around calls to one upstream. ValueErrors (e.g. output validation) pass straight through, as they
+    mean the upstream answered."""
+
+    def __init__(self, name: str, timeout: float, retries: int, backoff_seconds: float, hedge: bool, hedge_delay_seconds: float, breaker: CircuitBreaker):
+        self.name = name
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff_seconds = backoff_seconds
+        self.hedge = hedge
+        self.hedge_delay_seconds = hedge_delay_seconds
+        self.breaker = breaker
+        self.latencies = deque(maxlen=200)
+
+    def hedge_delay(self) -> float:
+        """p95 of recent successful call latencies, the configured delay until enough calls were seen"""
+        if len(self.latencies) < 20:
+            return self.hedge_delay_seconds
+        ordered = sorted(self.latencies)
+        return ordered[int(0.95 * (len(ordered) - 1))]
+
+    async def _attempt(self, factory: Callable[[], Awaitable[T]]) -> T:
+        if not self.hedge:
+            return await asyncio.wait_for(factory(), self.timeout)
+        tasks = {asyncio.ensure_future(asyncio.wait_for(factory(), self.timeout))}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self.hedge_delay())
+            if not done:
+                logging.info(f"Hedging slow {self.name} call...")
+                tasks.add(asyncio.ensure_future(asyncio.wait_for(factory(), self.timeout)))
+            pending = tasks
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def call(self, factory: Callable[[], Awaitable[T]]) -> T:
+        """runs factory() under this policy. factory must create a fresh awaitable per call."""
+        for attempt in range(self.retries + 1):
+            if not self.breaker.allow():
+                raise CircuitOpenError(f"{self.name} is unavailable, circuit breaker is open")
+            start = time.perf_counter()
+            try:
+                result = await self._attempt(factory)
+            except asyncio.CancelledError:
+                self.breaker.release()
+                raise
+            except ValueError:
+                self.breaker.record_success()
+                raise
+            except Exception as e:
+                self.breaker.record_failure()
+                if attempt == self.retries:
+                    raise
+                backoff = random.uniform(0, self.backoff_seconds * 2 ** attempt)
+                logging.warning(f"{self.name} call failed ({e!r}), retrying in {backoff:.2f}s...")
+                await asyncio.sleep(backoff)
+            else:
+                self.breaker.record_success()
+                self.latencies.append(time.perf_counter() - start)
+                return result
+
+    def health(self) -> Dict:
+        return {"state": self.breaker.state, "consecutiveFailures": self.breaker.failures, "hedgeDelaySeconds": self.hedge_delay() if self.hedge else None}
+
+def create_policy(name: str, prefix: str, timeout: float) -> ResiliencePolicy:
+    """builds a policy configured from <prefix>_TIMEOUT_SECONDS, _RETRIES, _BACKOFF_SECONDS, _HEDGE,
+    _HEDGE_DELAY_SECONDS, _CIRCUIT_FAILURE_THRESHOLD and _CIRCUIT_RESET_SECONDS"""
+    return ResiliencePolicy(
+        name=name,
+        timeout=float(os.getenv(f"{prefix}_TIMEOUT_SECONDS", timeout)),
+        retries=int(os.getenv(f"{prefix}_RETRIES", 2)),
+        backoff_seconds=float(os.getenv(f"{prefix}_BACKOFF_SECONDS", 0.5)),
+        hedge=os.getenv(f"{prefix}_HEDGE", "false").lower() == "true",
+        hedge_delay_seconds=float(os.getenv(f"{prefix}_HEDGE_DELAY_SECONDS", timeout / 4)),
+        breaker=CircuitBreaker(
+            failure_threshold=int(os.getenv(f"{prefix}_CIRCUIT_FAILURE_THRESHOLD", 5)),
+            reset_seconds=float(os.getenv(f"{prefix}_CIRCUIT_RESET_SECONDS", 30)),
+        ),
+    )
+
+parse_policy = create_policy("LlamaParse", "PARSE", timeout=300)
+llm_policy = create_policy("LLM", "LLM", timeout=120)
+
+def health() -> Dict[str, Dict]:
+    return {policy.name: policy.health() for policy in (parse_policy, llm_policy)}
@@ -0,0 +1,246 @@
+import os
+import json
+import keyword
+import hashlib
+import datetime
+import threading
+from enum import Enum
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Literal, Optional, Tuple, Union
+from typing_extensions import Annotated
+import logging
+from pydantic import Field, create_model
+from pydantic_core import SchemaError as CoreSchemaError
+from api.utils.metrics_utils import record_cache
+
+logging.basicConfig(level=logging.INFO)
+
+schema_registry_path = os.getenv("SCHEMA_REGISTRY_PATH", "app/cache/schemas.json")
+# compiled models kept in memory; the least recently used are evicted together with their LLM programs
+schema_cache_max_models = int(os.getenv("SCHEMA_CACHE_MAX_MODELS", 128))
+schema_max_depth = 8
+
+class SchemaError(ValueError):
+    """A registered schema that cannot be compiled into a data model."""
+
+# JSON Schema keywords translated to pydantic constraints, with the types they apply to
+constraint_keywords = {
+    "minLength": ("min_length", ("string",)), "maxLength": ("max_length", ("string",)), "pattern": ("pattern", ("string",)),
+    "minimum": ("ge", ("integer", "number")), "maximum": ("le", ("integer", "number")),
+    "exclusiveMinimum": ("gt", ("integer", "number")), "exclusiveMaximum": ("lt", ("integer", "number")),
+    "minItems": ("min_length", ("array",)), "maxItems": ("max_length", ("array",)),
+}
+
+def schema_hash(name: str, schema: Dict[str, Any]) -> str:
+    """the name is part of the hash, as it becomes the model name shown to the LLM"""
+    return hashlib.sha256(json.dumps({"name": name, "schema": schema}, sort_keys=True).encode("utf-8")).hexdigest()
+
+def schema_from_example(example: Any) -> Dict[str, Any]:
+    """infers a JSON Schema from an example value. Every property is optional, as extraction
+    returns null for anything not found in the document."""
+    if isinstance(example, dict):
+        return {"type": "object", "properties": {key: schema_from_example(value) for key, value in example.items()}}
+    if isinstance(example, list):
+        return {"type": "array", "items": schema_from_example(example[0]) if example else {}}
+    if isinstance(example, bool):
+        return {"type": "boolean"}
+    if isinstance(example, int):
+        return {"type": "integer"}
+    if isinstance(example, float):
+        return {"type": "number"}
+    if isinstance(example, str):
+        try:
+            datetime.datetime.fromisoformat(example)
+            return {"type": "string", "format": "date-time"}
+        except ValueError:
+            return {"type": "string"}
+    return {}
+
+def _resolve(schema: Dict[str, Any], definitions: Dict[str, Any]) -> Dict[str, Any]:
+    if "$ref" not in schema:
+        return schema
+    reference = schema["$ref"].split("/")[-1]
+    if reference not in definitions:
+        raise SchemaError(f"Unresolvable reference {schema['$ref']}")
+    return definitions[reference]
+
+def _annotation(name: str, schema: Any, definitions: Dict[str, Any], depth: int) -> Any:
+    if depth > schema_max_depth:
+        raise SchemaError(f"{name} is nested deeper than {schema_max_depth} levels (recursive schemas are not supported)")
+    if not isinstance(schema, dict):
+        raise SchemaError(f"Schema of {name} must be an object")
+    schema = _resolve(schema, definitions)
+
+    options = schema.get("anyOf") or schema.get("oneOf")
+    if options:
+        non_null = [option for option in options if not (isinstance(option, dict) and option.get("type") == "null")]
+        annotations = tuple(_annotation(f"{name}{i}" if len(non_null) > 1 else name, option, definitions, depth + 1) for i, option in enumerate(non_null))
+        annotation = annotations[0] if len(annotations) == 1 else Union[annotations]
+        return Optional[annotation] if len(non_null) < len(options) else annotation
+
+    types = schema.get("type")
+    if isinstance(types, list):
+        non_null = [item for item in types if item != "null"]
+        annotation = _annotation(name, {**schema, "type": non_null[0] if non_null else None}, definitions, depth)
+        return Optional[annotation] if len(non_null) < len(types) else annotation
+
+    for key in schema:
+        if key in constraint_keywords and types not in constraint_keywords[key][1]:
+            raise SchemaError(f"{key} of {name} does not apply to type {types!r}")
+    if "enum" in schema:
+        values = schema["enum"]
+        if not isinstance(values, list) or not values:
+            raise SchemaError(f"enum of {name} must be a non-empty list")
+        if all(isinstance(value, str) for value in values):
+            return Enum(name, {value: value for value in values})
+        return Literal[tuple(values)]
+    if types == "object" or "properties" in schema:
+        if "properties" in schema:
+            return _object_model(name, schema, definitions, depth + 1)
+        return Dict[str, Any]
+    if types == "array":
+        annotation = List[_annotation(f"{name}Item", schema.get("items", {}), definitions, depth + 1)]
+    elif types == "string":
+        annotation = {"date-time": datetime.datetime, "date": datetime.date}.get(schema.get("format"), str)
+    elif types in ("integer", "number", "boolean"):
+        annotation = {"integer": int, "number": float, "boolean": bool}[types]
+    elif types is None:
+        return Any
+    else:
+        raise SchemaError(f"Unsupported type {types!r} of {name}")
+
+    constraints = {constraint_keywords[key][0]: value for key, value in schema.items() if key in constraint_keywords}
+    return Annotated[annotation, Field(**constraints)] if constraints else annotation
+
+def _object_model(name: str, schema: Dict[str, Any], definitions: Dict[str, Any], depth: int):
+    required = set(schema.get("required", []))
+    fields = {}
+    for field, field_schema in schema.get("properties", {}).items():
+        if not field.isidentifier() or keyword.iskeyword(field) or field.startswith("_"):
+            raise SchemaError(f"Property {field!r} of {name} is not a valid field name")
+        annotation = _annotation(f"{name}{field[0].upper()}{field[1:]}", field_schema, definitions, depth)
+        description = field_schema.get("description") if isinstance(field_schema, dict) else None
+        if field in required:
+            fields[field] = (annotation, Field(..., description=description))
+        else:
+            fields[field] = (Optional[annotation], Field(None, description=description))
+    return create_model(name, __doc__=schema.get("description"), **fields)
+
+def compile_schema(name: str, schema: Dict[str, Any]):
+    """builds a pydantic model from a JSON Schema object, with nested objects as nested models.
+    Properties not listed in "required" become optional."""
+    if not name.isidentifier():
+        raise SchemaError(f"Schema name {name!r} must be a valid identifier")
+    if not isinstance(schema, dict) or schema.get("type", "object") != "object" or "properties" not in schema:
+        raise SchemaError("Schema must be an object with properties")
+    definitions = {**schema.get("definitions", {}), **schema.get("$defs", {})}
+    try:
+        return _object_model(name, schema, definitions, 0)
+    except SchemaError:
+        raise
+    except (TypeError, ValueError, AssertionError, CoreSchemaError) as e:
+        # e.g. an invalid pattern, or enum values that are reserved member names
+        raise SchemaError(str(e)) from e
+
+def columns_model(data_model):
+    """model mapping each top-level field of data_model to a csv column header, like InvestmentColumns"""
+    fields = {
+        name: (Optional[str], Field(None, description=f"Name of a column header for {field.description or name}."))
+        for name, field in data_model.model_fields.items()
+    }
+    return create_model(f"{data_model.__name__}Columns", __doc__=f"Mapping of columns of a csv to {data_model.__name__}.", **fields)
+
+class SchemaRegistry:
+    """Extraction schemas registered at runtime, persisted as JSON. Compiled models are cached
+    by schema hash with LRU eviction, so a schema is only compiled again after being evicted."""
+
+    def __init__(self, path: str, max_models: int):
+        self.path = path
+        self.max_models = max_models
+        self._lock = threading.Lock()
+        self._schemas: Optional[Dict[str, Dict[str, Any]]] = None
+        self._mtime = None
+        self._models = OrderedDict()
+        self._eviction_listeners: List[Callable[[type], None]] = []
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        # reloaded when the file changes, so schemas registered by other workers are picked up
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if self._schemas is None or mtime != self._mtime:
+            if mtime is None:
+                self._schemas = {}
+            else:
+                with open(self.path, "r") as file:
+                    self._schemas = json.load(file)
+            self._mtime = mtime
+        return self._schemas
+
+    def _save(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        # one temporary file per process, so workers saving at the same time never replace each other's
+        temporary_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(temporary_path, "w") as file:
+            json.dump(self._schemas, file, indent=2, sort_keys=True)
+        os.replace(temporary_path, self.path)
+        self._mtime = os.stat(self.path).st_mtime_ns
+
+    def add_eviction_listener(self, listener: Callable[[type], None]):
+        """listener is called with every model evicted from the cache, e.g. to drop its programs"""
+        self._eviction_listeners.append(listener)
+
+    def _cached(self, key: str, build: Callable[[], type]) -> type:
+        model = self._models.get(key)
+        record_cache("schema", model is not None)
+        if model is not None:
+            self._models.move_to_end(key)
+            return model
+        model = self._models[key] = build()
+        while len(self._models) > self.max_models:
+            _, evicted = self._models.popitem(last=False)
+            logging.info(f"Evicted compiled schema {evicted.__name__}...")
+            for listener in self._eviction_listeners:
+                listener(evicted)
+        return model
+
+    def register(self, name: str, schema: Dict[str, Any]) -> Tuple[str, type]:
+        """compiles and stores schema under name, replacing any earlier version. Returns its hash and model."""
+        digest = schema_hash(name, schema)
+        with self._lock:
+            model = self._cached(digest, lambda: compile_schema(name, schema))
+            self._load()[name] = {"schema": schema, "hash": digest}
+            self._save()
+        logging.info(f"Registered schema {name} ({digest[:12]})...")
+        return digest, model
+
+    def remove(self, name: str) -> bool:
+        with self._lock:
+            if self._load().pop(name, None) is None:
+                return False
+            self._save()
+            return True
+
+    def schemas(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return dict(self._load())
+
+    def get(self, name: str) -> Optional[type]:
+        """the compiled model of a registered schema, None if there is no schema with this name"""
+        with self._lock:
+            entry = self._load().get(name)
+            if entry is None:
+                return None
+            return self._cached(entry["hash"], lambda: compile_schema(name, entry["schema"]))
+
+    def get_columns_model(self, name: str) -> Optional[type]:
+        """the column mapping model of a registered schema, for /map-columns/"""
+        with self._lock:
+            entry = self._load().get(name)
+            if entry is None:
+                return None
+            data_model = self._cached(entry["hash"], lambda: compile_schema(name, entry["schema"]))
+            return self._cached(f"{entry['hash']}:columns", lambda: columns_model(data_model))
+
+schema_registry = SchemaRegistry(schema_registry_path, schema_cache_max_models)
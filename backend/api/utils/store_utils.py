@@ -0,0 +1,199 @@
+import os
+import json
+import time
+import base64
+import sqlite3
+import asyncio
+import datetime
+import threading
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Tuple
+import logging
+from api.data_models.response_models import ExtractResponse, StoredExtraction, ExtractionPage
+
+logging.basicConfig(level=logging.INFO)
+
+extraction_store_enabled = os.getenv("EXTRACTION_STORE", "true").lower() == "true"
+
+class ExtractionStore:
+    """SQLite store of every ExtractResponse, indexed by category, investor, fund, document date, file hash
+    and the entities of its DocumentMetadata. Writes are buffered in memory and flushed in batches by a
+    background task, so storing never adds latency to an extraction."""
+
+    def __init__(self, path: str, batch_size: int, flush_seconds: float, max_pending: int):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.max_pending = max_pending
+        self._pending: List[Tuple[ExtractResponse, Optional[str], float]] = []
+        self._pending_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._wake: Optional[asyncio.Event] = None
+        self._flusher: Optional[asyncio.Task] = None
+        self._create_lock = threading.Lock()
+        self._created = False
+
+    def _create(self):
+        # on first use rather than on import, so importing the app never touches the disk
+        with self._create_lock:
+            if self._created:
+                return
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=30)
+            try:
+                with connection:
+                    # WAL lets queries read while a batch is being written
+                    connection.execute("PRAGMA journal_mode=WAL")
+                    connection.execute(
+                        "CREATE TABLE IF NOT EXISTS extractions ("
+                        "id INTEGER PRIMARY KEY AUTOINCREMENT, file_hash TEXT, file_name TEXT NOT NULL, "
+                        "category TEXT NOT NULL, data_model TEXT, investor TEXT, fund TEXT, "
+                        "document_date TEXT NOT NULL, created_at REAL NOT NULL, response TEXT NOT NULL)"
+                    )
+                    connection.execute("CREATE TABLE IF NOT EXISTS entities (extraction_id INTEGER NOT NULL, entity TEXT NOT NULL)")
+                    # every filter is indexed together with the sort order, so pages are read straight off an index
+                    connection.execute("CREATE INDEX IF NOT EXISTS extractions_category ON extractions (category, document_date, id)")
+                    connection.execute("CREATE INDEX IF NOT EXISTS extractions_investor ON extractions (investor COLLATE NOCASE, document_date, id)")
+                    connection.execute("CREATE INDEX IF NOT EXISTS extractions_fund ON extractions (fund COLLATE NOCASE, document_date, id)")
+                    connection.execute("CREATE INDEX IF NOT EXISTS extractions_document_date ON extractions (document_date, id)")
+                    connection.execute("CREATE INDEX IF NOT EXISTS extractions_file_hash ON extractions (file_hash)")
+                    connection.execute("CREATE INDEX IF NOT EXISTS entities_entity ON entities (entity COLLATE NOCASE, extraction_id)")
+            finally:
+                connection.close()
+            self._created = True
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        if not self._created:
+            self._create()
+        connection = sqlite3.connect(self.path, timeout=30)
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    async def start(self):
+        self._wake = asyncio.Event()
+        self._flusher = asyncio.ensure_future(self._flush_periodically())
+
+    async def stop(self):
+        if self._flusher is not None:
+            self._flusher.cancel()
+            await asyncio.gather(self._flusher, return_exceptions=True)
+            self._flusher = None
+        await asyncio.to_thread(self.flush)
+
+    def add(self, extract_response: ExtractResponse, file_hash: str = None):
+        """queues a result for the next batch. Never blocks on the database."""
+        with self._pending_lock:
+            if len(self._pending) >= self.max_pending:
+                logging.warning(f"Extraction store is {self.max_pending} writes behind, dropping the oldest...")
+                self._pending.pop(0)
+            self._pending.append((extract_response, file_hash, time.time()))
+            full = len(self._pending) >= self.batch_size
+        if full and self._wake is not None:
+            self._wake.set()
+
+    async def _flush_periodically(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await asyncio.to_thread(self.flush)
+            except Exception:
+                logging.exception("Flushing the extraction store failed")
+
+    def flush(self):
+        """writes all queued results in a single transaction"""
+        with self._pending_lock:
+            pending, self._pending = self._pending, []
+        if not pending:
+            return
+        rows, entities = [], []
+        for extract_response, file_hash, created_at in pending:
+            response = extract_response.model_dump(mode="json")
+            data = response["data"] if isinstance(response["data"], dict) else {}
+            document_date = data.get("date") if isinstance(data.get("date"), str) else ""
+            rows.append((
+                file_hash, extract_response.fileMetadata.fileName, response["documentMetadata"]["category"],
+                type(extract_response.data).__name__ if extract_response.data is not None else None,
+                data.get("name") if isinstance(data.get("name"), str) else None,
+                data.get("fundName") if isinstance(data.get("fundName"), str) else None,
+                document_date, created_at, json.dumps(response),
+            ))
+            entities.append(response["documentMetadata"]["entities"])
+        with self._write_lock, self._connect() as connection:
+            for row, row_entities in zip(rows, entities):
+                # ids are needed for the entities, so rows go in one by one, still within one transaction
+                extraction_id = connection.execute(
+                    "INSERT INTO extractions (file_hash, file_name, category, data_model, investor, fund, document_date, created_at, response) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", row
+                ).lastrowid
+                connection.executemany("INSERT INTO entities (extraction_id, entity) VALUES (?, ?)", [(extraction_id, entity) for entity in dict.fromkeys(row_entities)])
+        logging.info(f"Stored {len(rows)} extractions...")
+
+    @staticmethod
+    def _stored(row: Tuple) -> StoredExtraction:
+        extraction_id, file_hash, category, document_date, created_at, response = row
+        return StoredExtraction(id=extraction_id, fileHash=file_hash, category=category, documentDate=document_date or None, createdAt=created_at, extraction=json.loads(response))
+
+    def get(self, extraction_id: int) -> Optional[StoredExtraction]:
+        with self._connect() as connection:
+            row = connection.execute("SELECT id, file_hash, category, document_date, created_at, response FROM extractions WHERE id = ?", (extraction_id,)).fetchone()
+        return self._stored(row) if row else None
+
+    def query(self, category: str = None, entity: str = None, investor: str = None, fund: str = None, file_hash: str = None, date_from: datetime.datetime = None, date_to: datetime.datetime = None, limit: int = 50, cursor: str = None) -> ExtractionPage:
+        """filtered results, newest document date first, a page at a time. The cursor of a page points
+        past its last row (keyset pagination), so deep pages cost the same as the first."""
+        conditions, parameters = [], []
+        for column, value in (("category", category), ("investor", investor), ("fund", fund), ("file_hash", file_hash)):
+            if value is not None:
+                conditions.append(f"{column} = ?" + (" COLLATE NOCASE" if column in ("investor", "fund") else ""))
+                parameters.append(value)
+        if entity is not None:
+            conditions.append("id IN (SELECT extraction_id FROM entities WHERE entity = ? COLLATE NOCASE)")
+            parameters.append(entity)
+        if date_from is not None:
+            conditions.append("document_date >= ?")
+            parameters.append(date_from.isoformat())
+        if date_to is not None:
+            conditions.append("document_date <= ? AND document_date != ''")
+            parameters.append(date_to.isoformat())
+        if cursor is not None:
+            document_date, extraction_id = decode_cursor(cursor)
+            conditions.append("(document_date, id) < (?, ?)")
+            parameters.extend([document_date, extraction_id])
+
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        with self._connect() as connection:
+            rows = connection.execute(
+                f"SELECT id, file_hash, category, document_date, created_at, response FROM extractions {where} "
+                "ORDER BY document_date DESC, id DESC LIMIT ?", (*parameters, limit + 1)
+            ).fetchall()
+        items = [self._stored(row) for row in rows[:limit]]
+        next_cursor = encode_cursor(rows[limit - 1][3], rows[limit - 1][0]) if len(rows) > limit else None
+        return ExtractionPage(items=items, nextCursor=next_cursor)
+
+def encode_cursor(document_date: str, extraction_id: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps([document_date, extraction_id]).encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor: str) -> Tuple[str, int]:
+    """raises ValueError for cursors not produced by encode_cursor"""
+    try:
+        document_date, extraction_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except Exception:
+        raise ValueError(f"Invalid cursor: {cursor}")
+    if not isinstance(document_date, str) or not isinstance(extraction_id, int):
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return document_date, extraction_id
+
+extraction_store = ExtractionStore(
+    path=os.getenv("EXTRACTION_STORE_PATH", "app/data/extractions.sqlite"),
+    batch_size=int(os.getenv("EXTRACTION_STORE_BATCH_SIZE", 200)),
+    flush_seconds=float(os.getenv("EXTRACTION_STORE_FLUSH_SECONDS", 1)),
+    max_pending=int(os.getenv("EXTRACTION_STORE_MAX_PENDING", 10000)),
+)
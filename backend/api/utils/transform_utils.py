@@ -0,0 +1,110 @@
+import os
+import csv
+import json
+from difflib import get_close_matches
+from enum import Enum
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+import logging
+from api.data_models.response_models import InvestmentColumns, InvestmentType, Sector, BusinessModel
+from api.utils.csv_utils import sniff_csv
+from api.utils.mapping_utils import normalize_header
+from api.utils.repair_utils import normalize_currency
+
+logging.basicConfig(level=logging.INFO)
+
+transform_batch_size = int(os.getenv("TRANSFORM_BATCH_SIZE", 5000))
+max_memoized_values = 10000
+
+Coercer = Callable[[str], Tuple[Optional[str], Optional[str]]]
+
+def _text(value: str) -> Tuple[Optional[str], Optional[str]]:
+    return value or None, None
+
+def _currency(value: str) -> Tuple[Optional[str], Optional[str]]:
+    if not value:
+        return None, None
+    currency = normalize_currency(value)
+    if currency is None:
+        return None, f"invalid currency {value!r}"
+    return currency, None
+
+def enum_coercer(enum: type, default: Enum = None) -> Coercer:
+    """builds a coercer that resolves raw values to enum values via a lookup table precomputed
+    from names and values, falling back to a fuzzy match once per distinct unseen value"""
+    lookup: Dict[str, Optional[str]] = {}
+    for member in enum:
+        lookup[normalize_header(member.name)] = member.value
+        lookup[normalize_header(member.value)] = member.value
+    known = list(lookup)
+    memo: Dict[str, Tuple[Optional[str], Optional[str]]] = {}
+
+    def coerce(value: str) -> Tuple[Optional[str], Optional[str]]:
+        if not value:
+            return None, None
+        result = memo.get(value)
+        if result is None:
+            normalized = normalize_header(value)
+            match = lookup.get(normalized)
+            if match is None:
+                close = get_close_matches(normalized, known, n=1, cutoff=0.8)
+                match = lookup[close[0]] if close else None
+            if match is not None:
+                result = (match, None)
+            elif default is not None:
+                result = (default.value, None)
+            else:
+                result = (None, f"invalid {enum.__name__} {value!r}")
+            if len(memo) < max_memoized_values:
+                memo[value] = result
+        return result
+
+    return coerce
+
+def create_coercers(data_model) -> Dict[str, Coercer]:
+    """returns a fresh set of per-field coercers, so memoized lookups stay scoped to one request"""
+    if data_model is InvestmentColumns:
+        return {
+            "companyName": _text,
+            "currency": _currency,
+            "type": enum_coercer(InvestmentType),
+            "sector": enum_coercer(Sector, default=Sector.Other),
+            "businessModel": enum_coercer(BusinessModel, default=BusinessModel.Other),
+            "website": _text,
+        }
+    return {field: _text for field in data_model.model_fields}
+
+def _transform_batch(rows: List[Tuple[int, List[str]]], indices: Dict[str, int], coercers: Dict[str, Coercer]) -> str:
+    """validates a batch column by column and returns it as NDJSON"""
+    columns = {field: [row[index].strip() if index < len(row) else "" for _, row in rows] for field, index in indices.items()}
+    coerced = {field: [coercers[field](value) for value in values] for field, values in columns.items()}
+    lines = []
+    for position, (row_number, _) in enumerate(rows):
+        record, errors = {}, []
+        for field in coercers:
+            value, error = coerced[field][position] if field in coerced else (None, None)
+            record[field] = value
+            if error:
+                errors.append(f"{field}: {error}")
+        lines.append(json.dumps({"row": row_number, "data": record, "errors": errors} if errors else {"row": row_number, "data": record}))
+    return "\n".join(lines) + "\n"
+
+def transform_csv(file_location: str, mapping: Dict[str, Optional[str]], data_model, batch_size: int = None) -> Iterator[str]:
+    """streams the csv row by row and yields NDJSON batches of records shaped like data_model,
+    with fields taken from the mapped columns. Memory is bounded by batch_size."""
+    batch_size = batch_size or transform_batch_size
+    encoding, dialect = sniff_csv(file_location)
+    coercers = create_coercers(data_model)
+    with open(file_location, "r", encoding=encoding, errors="replace", newline="") as file:
+        csv_reader = csv.reader(file, dialect)
+        header = next(csv_reader, [])
+        positions = {name: index for index, name in enumerate(header)}
+        indices = {field: positions[column] for field, column in mapping.items() if field in coercers and column in positions}
+        logging.info(f"Transforming {file_location} with columns {indices}...")
+        batch = []
+        for row_number, row in enumerate(csv_reader, start=1):
+            batch.append((row_number, row))
+            if len(batch) >= batch_size:
+                yield _transform_batch(batch, indices, coercers)
+                batch = []
+        if batch:
+            yield _transform_batch(batch, indices, coercers)
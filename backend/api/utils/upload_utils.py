@@ -1,27 +1,54 @@
 import os
-from fastapi import UploadFile
-from typing import List
+import hashlib
+import tempfile
+from fastapi import UploadFile, HTTPException
+from typing import List, Tuple
 import logging
+from api.utils.metrics_utils import timed
 
-logging.basicConfig(level=logging.INFO)    
+logging.basicConfig(level=logging.INFO)
+
+upload_directory = "app/uploaded_files"
+upload_chunk_size = int(os.getenv("UPLOAD_CHUNK_SIZE", 1024 * 1024))
+max_upload_bytes = int(os.getenv("MAX_UPLOAD_BYTES", 250 * 1024 * 1024))
+# csv endpoints stream the file from disk in a single pass, so full exports of several GB are accepted
+max_csv_upload_bytes = int(os.getenv("MAX_CSV_UPLOAD_BYTES", 8 * 1024 * 1024 * 1024))
 
 async def save_uploaded_files(upload_files: List[UploadFile]) -> List[str]:
     save_paths = []
     for upload_file in upload_files:
-        file_location = f"app/uploaded_files/{upload_file.filename}"
-        os.makedirs(os.path.dirname(file_location), exist_ok=True)
-        with open(file_location, "wb+") as file_object:
-            file_object.write(await upload_file.read())
+        file_location, _ = await save_uploaded_file(upload_file)
         save_paths.append(file_location)
     return save_paths
 
-async def save_uploaded_file(upload_file: UploadFile) -> str:
-    file_location = f"app/uploaded_files/{upload_file.filename}"
-    os.makedirs(os.path.dirname(file_location), exist_ok=True)
-    with open(file_location, "wb+") as file_object:
-        file_object.write(await upload_file.read())
-        logging.info(f"Successfully saved file at: {file_location}.")
-    return file_location
+@timed("save_uploaded_file")
+async def save_uploaded_file(upload_file: UploadFile, max_bytes: int = None) -> Tuple[str, str]:
+    """streams the upload to a unique path in chunks and returns the path and the sha256 of its content.
+    Raises a 413 once the upload exceeds max_bytes, MAX_UPLOAD_BYTES by default."""
+    max_bytes = max_upload_bytes if max_bytes is None else max_bytes
+    os.makedirs(upload_directory, exist_ok=True)
+    # one directory per upload keeps the original filename while never clobbering same-named uploads
+    file_location = os.path.join(tempfile.mkdtemp(dir=upload_directory), os.path.basename(upload_file.filename))
+    sha256 = hashlib.sha256()
+    size = 0
+    try:
+        with open(file_location, "wb") as file_object:
+            while chunk := await upload_file.read(upload_chunk_size):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise HTTPException(status_code=413, detail=f"File exceeds the maximum upload size of {max_bytes} bytes")
+                sha256.update(chunk)
+                file_object.write(chunk)
+    except BaseException:
+        await delete_file(file_location)
+        raise
+    logging.info(f"Successfully saved file at: {file_location}.")
+    return file_location, sha256.hexdigest()
 
+@timed("delete_file")
 async def delete_file(file_location: str):
-    os.remove(file_location)
\ No newline at end of file
+    if os.path.exists(file_location):
+        os.remove(file_location)
+    directory = os.path.dirname(file_location)
+    if os.path.abspath(directory) != os.path.abspath(upload_directory) and os.path.isdir(directory) and not os.listdir(directory):
+        os.rmdir(directory)
@@ -0,0 +1,27 @@
+from fastapi import APIRouter, HTTPException, Query
+from api.utils.store_utils import extraction_store
+from api.data_models.response_models import ModelCategory, StoredExtraction, ExtractionPage
+import asyncio
+import datetime
+import logging
+
+logging.basicConfig(level=logging.INFO)
+
+router = APIRouter()
+
+@router.get("/", response_model=ExtractionPage, description="Query stored extraction results, newest document date first. Results of /extract/ are stored in batches and become visible within about a second.")
+async def query_extractions(category: ModelCategory = None, entity: str = Query(None, description="Entity from the document metadata, e.g. a company or fund name. Case-insensitive."), investor: str = Query(None, description="Investor name of a capital call. Case-insensitive."), fund: str = Query(None, description="Fund name of a capital call. Case-insensitive."), file_hash: str = Query(None, description="sha256 of the extracted file."), date_from: datetime.datetime = Query(None, description="Earliest date of the extracted data."), date_to: datetime.datetime = Query(None, description="Latest date of the extracted data."), limit: int = Query(50, ge=1, le=500), cursor: str = Query(None, description="nextCursor of the previous page.")):
+    try:
+        return await asyncio.to_thread(
+            extraction_store.query, category=category.value if category else None, entity=entity, investor=investor, fund=fund,
+            file_hash=file_hash, date_from=date_from, date_to=date_to, limit=limit, cursor=cursor
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/{extraction_id}", response_model=StoredExtraction, description="Get a stored extraction result.")
+async def get_extraction(extraction_id: int):
+    extraction = await asyncio.to_thread(extraction_store.get, extraction_id)
+    if extraction is None:
+        raise HTTPException(status_code=404, detail="Extraction not found")
+    return extraction
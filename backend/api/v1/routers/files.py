@@ -1,8 +1,19 @@
-from fastapi import APIRouter, File, UploadFile, Form, HTTPException, Query
-from api.utils.upload_utils import save_uploaded_files, save_uploaded_file, delete_file
-from api.utils.extract_utils import read_file,create_document_metadata,create_data_model, return_csv_column_names, create_mapping_model
-from api.data_models.response_models import FileMetadata, ModelCategory, CapitalCall, ConvertibleLoanAgreement, ExtractResponse, MappingResponse, MappingCategory, InvestmentColumns, GeneralCompanyInfo, OperationalKPIs
+from fastapi import APIRouter, File, UploadFile, Form, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse, JSONResponse
+from starlette.concurrency import iterate_in_threadpool
+from api.utils.upload_utils import save_uploaded_files, save_uploaded_file, delete_file, max_csv_upload_bytes
+from api.utils.extract_utils import extract_file, create_mapping_model
+from api.utils.csv_utils import profile_csv
+from api.utils.transform_utils import transform_csv
+from api.utils.job_utils import job_queue, QueueFullError, validate_callback_url
+from api.utils.mapping_utils import synonym_store
+from api.utils.schema_utils import schema_registry
+from api.data_models.response_models import FileMetadata, ModelCategory, ExtractResponse, MappingResponse, MappingCategory, JobResponse, mapping_category_to_data_model
+from api.data_models.request_models import MappingConfirmation
 from typing import List
+import asyncio
+import json
+import os
 from dotenv import load_dotenv
 import logging
 
@@ -11,74 +22,173 @@ load_dotenv()
 
 router = APIRouter()
 
+batch_max_concurrency = int(os.getenv("BATCH_MAX_CONCURRENCY", 8))
+
 @router.post("/upload/")
 async def upload_multiple_files(files: List[UploadFile] = File(...)):
     saved_paths = await save_uploaded_files(files)
     return {"file_paths": saved_paths}
 
-@router.post("/extract/", response_model=ExtractResponse, description="Extract a pre-defined data model from a file.")
-async def extract_data_model(file: UploadFile = File(..., description="Currently, only the following file types are supported: ['.pdf', '.xml.doc', '.docx', '.pptx', '.rtf', '.pages', '.key', '.epub']"), category: ModelCategory = None):
+@router.post("/extract/", response_model=ExtractResponse, responses={202: {"model": JobResponse}}, description="Extract a pre-defined data model from a file. With background=true, returns a job to poll at /v1/jobs/{job_id} instead.")
+async def extract_data_model(response: Response, file: UploadFile = File(..., description="Currently, only the following file types are supported: ['.pdf', '.xml.doc', '.docx', '.pptx', '.rtf', '.pages', '.key', '.epub']"), category: ModelCategory = None, single_pass: bool = Query(False, description="Classify and extract in a single LLM call when no category is given."), background: bool = Query(False, description="Run the extraction as a background job and return its id at once."), callback_url: str = Query(None, description="URL the finished job is POSTed to when running in the background."), schema: str = Query(None, description="Name of a data model registered at /v1/schemas/ to extract instead of a pre-defined category.")):
     logging.info(f"/extract for {file.filename} initiated...")
 
-    file_metadata = FileMetadata(fileName=file.filename, contentType=file.content_type, extension="."+file.filename.split(".")[-1], size=file.size)
-
-    file_location = await save_uploaded_file(file)
-    logging.info(f"File upload for {file.filename} successful...")
-
-    document = await read_file(file_location, file_metadata.extension)
-    logging.info(f"Reading text for {file.filename} successful...")
-    print(len(document))
-
-    await delete_file(file_location)
-    logging.info(f"File deletion for {file.filename} successful...")
-
-    document_metadata = await create_document_metadata(document=document[0])
-    logging.info(f"Reading document metadata for {file.filename} successful...")
+    data_model = None
+    if schema is not None:
+        if category is not None:
+            raise HTTPException(status_code=400, detail="Provide either category or schema")
+        data_model = schema_registry.get(schema)
+        if data_model is None:
+            raise HTTPException(status_code=404, detail=f"Schema {schema} not found")
 
-    category_to_data_model = {
-        ModelCategory.CapitalCall: CapitalCall,
-        ModelCategory.CLA: ConvertibleLoanAgreement,
-        ModelCategory.GeneralInformation: GeneralCompanyInfo,
-        ModelCategory.OperationalKPIs: OperationalKPIs
-    }
-    category = category or document_metadata.category
-    data_model = category_to_data_model.get(category)
-    data = await create_data_model(document=document[0], data_model=data_model)
+    if background and callback_url is not None:
+        try:
+            await asyncio.to_thread(validate_callback_url, callback_url)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
 
-    response = ExtractResponse(
-        fileMetadata = file_metadata,
-        documentMetadata = document_metadata,
-        data = data
-    )
+    file_metadata = FileMetadata(fileName=file.filename, contentType=file.content_type, extension="."+file.filename.split(".")[-1], size=file.size)
 
-    return response
+    file_location, file_hash = await save_uploaded_file(file)
+    logging.info(f"File upload for {file.filename} successful...")
 
-@router.post("/map-columns/", response_model=MappingResponse, description="Map columns of a csv to a pre-defined data model.")
-async def map_columns(file: UploadFile = File(..., description="Only csv files are supported."), category: MappingCategory = Query(..., description="The category for mapping.")):
+    if background:
+        async def run_job():
+            extract_response, _ = await extract_file(file_location, file_metadata, file_hash=file_hash, category=category, single_pass=single_pass, data_model=data_model)
+            return extract_response
+
+        try:
+            job = job_queue.submit(run_job, callback_url=callback_url, discard=lambda: delete_file(file_location))
+        except QueueFullError as e:
+            await delete_file(file_location)
+            raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "10"})
+        logging.info(f"/extract for {file.filename} queued as job {job.jobId}...")
+        return JSONResponse(status_code=202, content=job.model_dump(mode="json"))
+
+    extract_response, parse_cache_hit = await extract_file(file_location, file_metadata, file_hash=file_hash, category=category, single_pass=single_pass, data_model=data_model)
+    response.headers["X-Parse-Cache"] = "HIT" if parse_cache_hit else "MISS"
+
+    return extract_response
+
+@router.post("/extract/batch", description="Extract pre-defined data models from many files concurrently. Results are streamed back as NDJSON, one line per file in order of completion.")
+async def extract_data_models_batch(files: List[UploadFile] = File(...), category: ModelCategory = None, single_pass: bool = Query(False, description="Classify and extract in a single LLM call when no category is given."), concurrency: int = Query(batch_max_concurrency, ge=1, description="Maximum number of files processed at the same time.")):
+    logging.info(f"/extract/batch for {len(files)} files initiated...")
+
+    # uploads are saved before streaming starts, as the request body is not available afterwards
+    saved_files, failed_files = [], []
+    for file in files:
+        file_metadata = FileMetadata(fileName=file.filename, contentType=file.content_type, extension="."+file.filename.split(".")[-1], size=file.size)
+        try:
+            file_location, file_hash = await save_uploaded_file(file)
+        except HTTPException as e:
+            failed_files.append({"fileName": file.filename, "status": "error", "error": e.detail})
+            continue
+        saved_files.append((file_metadata, file_location, file_hash))
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def extract_one(file_metadata: FileMetadata, file_location: str, file_hash: str) -> dict:
+        async with semaphore:
+            try:
+                extract_response, parse_cache_hit = await extract_file(file_location, file_metadata, file_hash=file_hash, category=category, single_pass=single_pass)
+                return {"fileName": file_metadata.fileName, "status": "success", "parseCacheHit": parse_cache_hit, "result": extract_response.model_dump(mode="json")}
+            except Exception as e:
+                logging.exception(f"/extract/batch failed for {file_metadata.fileName}")
+                return {"fileName": file_metadata.fileName, "status": "error", "error": str(e)}
+
+    async def stream_results():
+        for failed_file in failed_files:
+            yield json.dumps(failed_file) + "\n"
+        tasks = [asyncio.ensure_future(extract_one(*saved_file)) for saved_file in saved_files]
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield json.dumps(await task) + "\n"
+        finally:
+            # the client may disconnect mid-stream, so unfinished work is cancelled and its files removed
+            for task in tasks:
+                task.cancel()
+            for _, file_location, _ in saved_files:
+                await delete_file(file_location)
+
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+@router.post("/map-columns/", response_model=MappingResponse, description="Map columns of a csv to a pre-defined or registered data model.")
+async def map_columns(file: UploadFile = File(..., description="Only csv files are supported."), category: MappingCategory = Query(None, description="The category for mapping."), schema: str = Query(None, description="Name of a data model registered at /v1/schemas/ to map to instead of a category.")):
     logging.info(f"/map-columns for {file.filename} initiated...")
     file_metadata = FileMetadata(fileName=file.filename, contentType=file.content_type, extension="."+file.filename.split(".")[-1], size=file.size)
 
     if not file_metadata.extension == ".csv":
         raise HTTPException(status_code=400, detail="File must be a csv file")
+    if (category is None) == (schema is None):
+        raise HTTPException(status_code=400, detail="Provide either category or schema")
+    data_model = mapping_category_to_data_model.get(category) if category else schema_registry.get_columns_model(schema)
+    if data_model is None:
+        raise HTTPException(status_code=404, detail=f"Schema {schema} not found")
 
-    file_location = await save_uploaded_file(file)
+    file_location, _ = await save_uploaded_file(file, max_bytes=max_csv_upload_bytes)
     logging.info(f"File upload for {file.filename} successful...")
 
-    columns = await return_csv_column_names(file_location)
-
-    await delete_file(file_location)
+    try:
+        # profiling reads the whole file, so it runs in a thread to keep the event loop free
+        columns = await asyncio.to_thread(profile_csv, file_location)
+    finally:
+        await delete_file(file_location)
     logging.info(f"File deletion for {file.filename} successful...")
 
-    category_to_data_model = {
-        MappingCategory.Investment: InvestmentColumns
-        }
-    data_model = category_to_data_model.get(category)
-
-    data = await create_mapping_model(header=columns, data_model=data_model)
+    data = await create_mapping_model(columns=columns, data_model=data_model)
 
     response = MappingResponse(
         fileMetadata = file_metadata,
         data = data
     )
 
-    return response
\ No newline at end of file
+    return response
+
+@router.post("/map-columns/confirm", description="Confirm a column mapping so its headers are mapped without the LLM next time.")
+async def confirm_column_mapping(confirmation: MappingConfirmation):
+    data_model = mapping_category_to_data_model.get(confirmation.category)
+    unknown_fields = [field for field in confirmation.mapping if field not in data_model.model_fields]
+    if unknown_fields:
+        raise HTTPException(status_code=400, detail=f"Unknown fields for {data_model.__name__}: {unknown_fields}")
+    synonym_store.learn(data_model, confirmation.mapping)
+    return {"learned": sum(1 for header in confirmation.mapping.values() if header)}
+
+
+@router.post("/transform/", description="Apply a column mapping to a csv and stream its rows as NDJSON records shaped like the category's data model. Enum values are coerced and invalid values reported per row.")
+async def transform_rows(file: UploadFile = File(..., description="Only csv files are supported."), category: MappingCategory = Query(..., description="The category for mapping."), mapping: str = Form(None, description="JSON object of field name to csv column header. Computed like /map-columns/ if omitted.")):
+    logging.info(f"/transform for {file.filename} initiated...")
+    if not file.filename.endswith(".csv"):
+        raise HTTPException(status_code=400, detail="File must be a csv file")
+
+    data_model = mapping_category_to_data_model.get(category)
+    if mapping is not None:
+        try:
+            mapping = json.loads(mapping)
+        except json.JSONDecodeError:
+            raise HTTPException(status_code=400, detail="Mapping must be a JSON object")
+        if not isinstance(mapping, dict) or not all(isinstance(column, str) or column is None for column in mapping.values()):
+            raise HTTPException(status_code=400, detail="Mapping must be a JSON object of field names to column headers or null")
+        unknown_fields = [field for field in mapping if field not in data_model.model_fields]
+        if unknown_fields:
+            raise HTTPException(status_code=400, detail=f"Unknown fields for {data_model.__name__}: {unknown_fields}")
+
+    file_location, _ = await save_uploaded_file(file, max_bytes=max_csv_upload_bytes)
+    logging.info(f"File upload for {file.filename} successful...")
+
+    if mapping is None:
+        try:
+            columns = await asyncio.to_thread(profile_csv, file_location)
+            mapping = (await create_mapping_model(columns=columns, data_model=data_model)).model_dump()
+        except BaseException:
+            await delete_file(file_location)
+            raise
+
+    async def stream_rows():
+        try:
+            async for batch in iterate_in_threadpool(transform_csv(file_location, mapping, data_model)):
+                yield batch
+        finally:
+            await delete_file(file_location)
+            logging.info(f"File deletion for {file.filename} successful...")
+
+    return StreamingResponse(stream_rows(), media_type="application/x-ndjson")
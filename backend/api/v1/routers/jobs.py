@@ -0,0 +1,15 @@
+from fastapi import APIRouter, HTTPException
+from api.utils.job_utils import job_queue
+from api.data_models.response_models import JobResponse
+import logging
+
+logging.basicConfig(level=logging.INFO)
+
+router = APIRouter()
+
+@router.get("/{job_id}", response_model=JobResponse, description="Get the status and, once finished, the result of a background job.")
+async def get_job(job_id: str):
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
@@ -0,0 +1,14 @@
+from fastapi import APIRouter
+from api.utils.reconcile_utils import reconcile_capital_calls
+from api.data_models.response_models import CapitalCall, ReconciliationReport
+from typing import List
+import logging
+
+logging.basicConfig(level=logging.INFO)
+
+router = APIRouter()
+
+@router.post("/capital-calls/", response_model=List[ReconciliationReport], description="Reconcile extracted capital calls, grouped by fund and call number, and report arithmetic discrepancies.")
+async def reconcile(capital_calls: List[CapitalCall]):
+    logging.info(f"/reconciliation/capital-calls for {len(capital_calls)} capital calls initiated...")
+    return reconcile_capital_calls(capital_calls)
@@ -0,0 +1,38 @@
+from fastapi import APIRouter, HTTPException
+from api.utils.schema_utils import schema_registry, schema_from_example, SchemaError
+from api.data_models.request_models import SchemaRegistration
+from api.data_models.response_models import SchemaResponse
+from typing import List
+import logging
+
+logging.basicConfig(level=logging.INFO)
+
+router = APIRouter()
+
+@router.post("/", response_model=SchemaResponse, description="Register a data model from a JSON Schema or an example object. Registering an existing name replaces its schema.")
+async def register_schema(registration: SchemaRegistration):
+    if (registration.jsonSchema is None) == (registration.example is None):
+        raise HTTPException(status_code=400, detail="Provide either jsonSchema or example")
+    schema = registration.jsonSchema or schema_from_example(registration.example)
+    try:
+        digest, _ = schema_registry.register(registration.name, schema)
+    except SchemaError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid schema: {e}")
+    return SchemaResponse(name=registration.name, schemaHash=digest, jsonSchema=schema)
+
+@router.get("/", response_model=List[SchemaResponse], description="List all registered data models.")
+async def list_schemas():
+    return [SchemaResponse(name=name, schemaHash=entry["hash"], jsonSchema=entry["schema"]) for name, entry in sorted(schema_registry.schemas().items())]
+
+@router.get("/{name}", response_model=SchemaResponse, description="Get a registered data model.")
+async def get_schema(name: str):
+    entry = schema_registry.schemas().get(name)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Schema not found")
+    return SchemaResponse(name=name, schemaHash=entry["hash"], jsonSchema=entry["schema"])
+
+@router.delete("/{name}", description="Remove a registered data model.")
+async def delete_schema(name: str):
+    if not schema_registry.remove(name):
+        raise HTTPException(status_code=404, detail="Schema not found")
+    return {"deleted": name}
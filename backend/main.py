@@ -1,9 +1,33 @@
-from fastapi import FastAPI
-from api.v1.routers import files
-from fastapi.responses import RedirectResponse
+import os
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request, Response
+from api.v1.routers import files, jobs, reconciliation, schemas, extractions
+from api.utils.extract_utils import warm_up
+from api.utils.job_utils import job_queue
+from api.utils.pdf_utils import shutdown_pool
+from api.utils.store_utils import extraction_store
+from api.utils.metrics_utils import request_spans, server_timing, server_timing_enabled
+from api.utils.resilience_utils import CircuitOpenError, health
+from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
+from fastapi.responses import RedirectResponse, JSONResponse
 # from fastapi.staticfiles import StaticFiles
 
+warm_up_on_startup = os.getenv("WARM_UP_ON_STARTUP", "false").lower() == "true"
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if warm_up_on_startup:
+        await asyncio.to_thread(warm_up)
+    await job_queue.start()
+    await extraction_store.start()
+    yield
+    await job_queue.stop()
+    await extraction_store.stop()
+    shutdown_pool()
+
 app = FastAPI(
+    lifespan=lifespan,
     title="bunch of llamas Docs",
     description="This documentation summarizes the bunch of llamas API.",
     version="0.0.1",
@@ -15,6 +39,42 @@ app = FastAPI(
 
 
 app.include_router(files.router, prefix="/v1/files", tags=["files"])
+app.include_router(jobs.router, prefix="/v1/jobs", tags=["jobs"])
+app.include_router(reconciliation.router, prefix="/v1/reconciliation", tags=["reconciliation"])
+app.include_router(schemas.router, prefix="/v1/schemas", tags=["schemas"])
+app.include_router(extractions.router, prefix="/v1/extractions", tags=["extractions"])
+
+@app.middleware("http")
+async def add_server_timing(request: Request, call_next):
+    if not server_timing_enabled:
+        return await call_next(request)
+    spans = []
+    token = request_spans.set(spans)
+    try:
+        response = await call_next(request)
+    finally:
+        request_spans.reset(token)
+    if spans:
+        response.headers["Server-Timing"] = server_timing(spans)
+    return response
+
+@app.exception_handler(CircuitOpenError)
+async def circuit_open_handler(request: Request, exc: CircuitOpenError):
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "30"})
+
+@app.get("/health", description="Circuit breaker state of the parsing and LLM upstreams.")
+def get_health():
+    return health()
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+@app.post("/warm-up", include_in_schema=False)
+async def post_warm_up():
+    """builds the parser and LLM clients ahead of traffic, e.g. from a readiness probe"""
+    await asyncio.to_thread(warm_up)
+    return {"status": "ok"}
 
 # doesn't work for some reason
 @app.get("/docs", include_in_schema=False)
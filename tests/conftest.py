@@ -0,0 +1,25 @@
+"""
+Runs the backend without network dependencies: the local parser, the fake LLM without latency and all
+caches, stores and indexes in a temporary directory. Run from the repository root:
+    python -m pytest -q tests
+"""
+import os
+import sys
+import tempfile
+
+tests_directory = os.path.dirname(os.path.abspath(__file__))
+backend_directory = os.path.join(os.path.dirname(tests_directory), "backend")
+sample_pdf = os.path.join(tests_directory, "testfiles", "Capital Call 1 - Valentina Pape - 13251239173529.pdf")
+
+runtime_directory = tempfile.mkdtemp(prefix="backend-tests-")
+for name, value in {
+    "PARSER_BACKEND": "local",
+    "LLM_BACKEND": "fake",
+    "FAKE_LLM_LATENCY_MS": "0",
+    "FAKE_LLM_JITTER_MS": "0",
+    "WARM_UP_ON_STARTUP": "false",
+}.items():
+    os.environ.setdefault(name, value)
+sys.path.insert(0, backend_directory)
+# relative runtime paths (app/cache, app/data, app/uploaded_files) resolve inside the temporary directory
+os.chdir(runtime_directory)
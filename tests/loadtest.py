@@ -0,0 +1,92 @@
+"""
+Load test for /v1/files/extract/ and /v1/files/map-columns/.
+
+Every request posts a unique variant of the file (a nonce page appended to PDFs, a nonce row to CSVs),
+so parsing and extraction are measured rather than the parse and LLM caches. Variants differ only in
+the nonce, so near-duplicate reuse must be disabled on the server to measure full extractions.
+Pass --same-content to post identical bytes and measure the cached path instead.
+
+Start the server without network dependencies, e.g. from backend/:
+    DEDUP=false PARSER_BACKEND=local LLM_BACKEND=fake FAKE_LLM_LATENCY_MS=500 uvicorn main:app --port 8000
+
+Then run:
+    python tests/loadtest.py extract "tests/testfiles/Capital Call 1 - Valentina Pape - 13251239173529.pdf" --requests 200 --concurrency 20
+    python tests/loadtest.py map-columns investments.csv --requests 200 --concurrency 20
+"""
+import argparse
+import asyncio
+import csv
+import io
+import os
+import statistics
+import time
+import uuid
+from typing import List
+
+import httpx
+
+endpoints = {
+    "extract": ("/v1/files/extract/", {"category": "CapitalCall"}),
+    "map-columns": ("/v1/files/map-columns/", {"category": "Investment"}),
+}
+
+def percentile(latencies: List[float], fraction: float) -> float:
+    ordered = sorted(latencies)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+def with_nonce(content: bytes, file_name: str) -> bytes:
+    """a variant of the file with a unique page or row, so it misses every cache"""
+    nonce = uuid.uuid4().hex
+    if file_name.lower().endswith(".pdf"):
+        import fitz
+        with fitz.open(stream=content, filetype="pdf") as pdf:
+            pdf.new_page().insert_text((72, 72), f"Load test {nonce}")
+            return pdf.tobytes()
+    header = next(csv.reader(io.StringIO(content.decode("utf-8-sig").split("\n", 1)[0])))
+    row = io.StringIO()
+    csv.writer(row, lineterminator="\n").writerow([nonce] + [""] * (len(header) - 1))
+    return content.rstrip(b"\r\n") + b"\n" + row.getvalue().encode("utf-8")
+
+async def run(base_url: str, endpoint: str, file_path: str, total: int, concurrency: int, same_content: bool = False):
+    path, params = endpoints[endpoint]
+    with open(file_path, "rb") as file:
+        content = file.read()
+    file_name = os.path.basename(file_path)
+    latencies, errors = [], 0
+    queue = asyncio.Queue()
+    for _ in range(total):
+        queue.put_nowait(None)
+
+    async def worker(client: httpx.AsyncClient):
+        nonlocal errors
+        while not queue.empty():
+            queue.get_nowait()
+            body = content if same_content else with_nonce(content, file_name)
+            start = time.perf_counter()
+            try:
+                response = await client.post(path, params=params, files={"file": (file_name, body)})
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - start)
+            except httpx.HTTPError:
+                errors += 1
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=300) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*[worker(client) for _ in range(concurrency)])
+        elapsed = time.perf_counter() - start
+
+    print(f"{endpoint}: {total} requests, concurrency {concurrency}, {errors} errors, {elapsed:.2f}s, {len(latencies) / elapsed:.1f} req/s")
+    if latencies:
+        print(f"latency ms: p50 {percentile(latencies, 0.5) * 1000:.1f}, p95 {percentile(latencies, 0.95) * 1000:.1f}, "
+              f"p99 {percentile(latencies, 0.99) * 1000:.1f}, mean {statistics.mean(latencies) * 1000:.1f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("endpoint", choices=list(endpoints))
+    parser.add_argument("file")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--same-content", action="store_true", help="post identical bytes, measuring cache hits")
+    args = parser.parse_args()
+    asyncio.run(run(args.base_url, args.endpoint, args.file, args.requests, args.concurrency, args.same_content))
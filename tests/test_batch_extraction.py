@@ -0,0 +1,62 @@
+import json
+import asyncio
+
+from fastapi.testclient import TestClient
+
+from api.v1.routers import files as files_router
+from conftest import sample_pdf
+
+
+def _post_batch(names, **params):
+    import main
+    with open(sample_pdf, "rb") as file:
+        content = file.read()
+    client = TestClient(main.app)
+    response = client.post("/v1/files/extract/batch", params=params, files=[("files", (name, content, "application/pdf")) for name in names])
+    return response, [json.loads(line) for line in response.text.splitlines()]
+
+
+def test_every_file_gets_one_line_with_its_result():
+    response, lines = _post_batch(["first.pdf", "second.pdf"])
+
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    assert sorted(line["fileName"] for line in lines) == ["first.pdf", "second.pdf"]
+    assert all(line["status"] == "success" and line["result"]["fileMetadata"]["fileName"] == line["fileName"] for line in lines)
+
+
+def test_a_failing_file_reports_an_error_line_without_aborting_the_stream(monkeypatch):
+    extract_file = files_router.extract_file
+
+    async def failing_extract_file(file_location, file_metadata, **kwargs):
+        if file_metadata.fileName == "broken.pdf":
+            raise RuntimeError("parser failed")
+        return await extract_file(file_location, file_metadata, **kwargs)
+    monkeypatch.setattr(files_router, "extract_file", failing_extract_file)
+
+    _, lines = _post_batch(["broken.pdf", "first.pdf", "second.pdf"])
+
+    by_name = {line["fileName"]: line for line in lines}
+    assert len(lines) == 3
+    assert by_name["broken.pdf"] == {"fileName": "broken.pdf", "status": "error", "error": "parser failed"}
+    assert by_name["first.pdf"]["status"] == by_name["second.pdf"]["status"] == "success"
+
+
+def test_results_stream_in_order_of_completion_within_the_concurrency_limit(monkeypatch):
+    delays = {"slow.pdf": 0.3, "medium.pdf": 0.15, "fast.pdf": 0.0, "last.pdf": 0.0}
+    in_flight, max_in_flight = [0], [0]
+
+    async def timed_extract_file(file_location, file_metadata, **kwargs):
+        in_flight[0] += 1
+        max_in_flight[0] = max(max_in_flight[0], in_flight[0])
+        try:
+            await asyncio.sleep(delays[file_metadata.fileName])
+            raise RuntimeError("not extracted")
+        finally:
+            in_flight[0] -= 1
+    monkeypatch.setattr(files_router, "extract_file", timed_extract_file)
+
+    _, lines = _post_batch(list(delays), concurrency=2)
+
+    # fast.pdf only starts once medium.pdf frees a slot, and last.pdf after fast.pdf
+    assert [line["fileName"] for line in lines] == ["medium.pdf", "fast.pdf", "last.pdf", "slow.pdf"]
+    assert max_in_flight[0] == 2
@@ -0,0 +1,33 @@
+import time
+
+from api.utils.cache_utils import DiskCache, MemoryCache
+
+
+def test_disk_cache_evicts_least_recently_used_entries(tmp_path):
+    cache = DiskCache(str(tmp_path / "cache.sqlite"), max_bytes=30, ttl_seconds=0)
+    cache.set("a", "x" * 10)
+    time.sleep(0.01)
+    cache.set("b", "y" * 10)
+    time.sleep(0.01)
+    assert cache.get("a") == "x" * 10
+    cache.set("c", "z" * 10)
+
+    assert cache.get("a") == "x" * 10
+    assert cache.get("b") is None
+    assert cache.get("c") == "z" * 10
+
+
+def test_disk_cache_expires_entries(tmp_path):
+    cache = DiskCache(str(tmp_path / "cache.sqlite"), max_bytes=1024, ttl_seconds=1)
+    cache.set("a", {"text": "parsed"})
+    assert cache.get("a") == {"text": "parsed"}
+    time.sleep(1.1)
+    assert cache.get("a") is None
+
+
+def test_memory_cache_is_bounded():
+    cache = MemoryCache(max_entries=2, ttl_seconds=0)
+    for key in "abc":
+        cache.set(key, key)
+    assert cache.get("a") is None
+    assert cache.get("c") == "c"
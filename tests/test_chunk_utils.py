@@ -0,0 +1,34 @@
+from api.data_models.response_models import GeneralCompanyInfo, OperationalKPIs
+from api.utils.chunk_utils import chunk_documents, merge_data_models
+
+
+class Document:
+    def __init__(self, text: str):
+        self.text = text
+
+
+def test_long_documents_are_split_into_overlapping_chunks():
+    text = " ".join(f"word{i}" for i in range(3000))
+    chunks = chunk_documents([Document(text)], max_chars=5000, overlap_chars=200)
+
+    assert len(chunks) > 1
+    assert all(len(chunk) <= 5000 for chunk in chunks)
+    assert all(chunk[-100:] in following for chunk, following in zip(chunks, chunks[1:]))
+
+
+def test_partial_results_are_merged_field_by_field():
+    merged = merge_data_models([
+        GeneralCompanyInfo(type="Fund", companyName="Acme", founders=["Ada"]),
+        GeneralCompanyInfo(type="Fund", companyName="Acme GmbH", website="acme.com", founders=["Ada", "Grace"]),
+    ], GeneralCompanyInfo)
+
+    assert merged.companyName == "Acme"
+    assert merged.website == "acme.com"
+    assert merged.founders == ["Ada", "Grace"]
+
+
+def test_fields_found_in_no_chunk_keep_their_default():
+    merged = merge_data_models([OperationalKPIs(type="OperationalKPIs", ftes=12), OperationalKPIs(type="OperationalKPIs", cashBalance=1000.0)], OperationalKPIs)
+
+    assert merged.date is None
+    assert (merged.ftes, merged.cashBalance) == (12, 1000.0)
@@ -0,0 +1,100 @@
+import json
+import asyncio
+
+import pytest
+
+from api.data_models.response_models import CapitalCall, ModelCategory, OperationalKPIs
+from api.utils import classifier_utils, extract_utils
+from api.utils.classifier_utils import DocumentClassifier, classify_document, featurize
+
+capital_calls = [
+    f"Capital Call No. {i} of Fund {fund}. Dear {investor}, we hereby call EUR {amount},000 of your commitment. "
+    f"Please transfer the capital call amount to the account of the fund until the deadline."
+    for i, (fund, investor, amount) in enumerate([("I", "Ada", 50), ("II", "Jonas", 20), ("III", "Valentina", 75), ("I", "Lena", 10)])
+]
+updates = [
+    f"Quarterly update {quarter}: revenue grew to {revenue}k, monthly burn of {burn}k, cash balance covers {runway} months of runway, we now have {ftes} FTEs."
+    for quarter, revenue, burn, runway, ftes in [("Q1", 120, 80, 14, 12), ("Q2", 150, 85, 13, 14), ("Q3", 170, 90, 12, 15), ("Q4", 210, 95, 11, 18)]
+]
+
+
+def _classifier() -> DocumentClassifier:
+    return DocumentClassifier.train(capital_calls + updates, [ModelCategory.CapitalCall] * len(capital_calls) + [ModelCategory.OperationalKPIs] * len(updates))
+
+
+@pytest.fixture
+def trained(monkeypatch):
+    monkeypatch.setattr(classifier_utils, "_classifier", _classifier())
+    monkeypatch.setattr(classifier_utils, "_classifier_loaded", True)
+
+
+def test_features_are_normalized_hashed_ngrams():
+    features = featurize("capital call capital call")
+
+    assert features.shape == (classifier_utils.num_features,)
+    assert features.dtype.name == "float32"
+    assert abs(float(features @ features) - 1) < 1e-6
+    assert not featurize("").any()
+
+
+def test_documents_are_assigned_to_the_nearest_category():
+    classifier = _classifier()
+
+    category, confidence = classifier.predict("Capital Call No. 5 of Fund IV. Dear Mia, we hereby call EUR 30,000 of your commitment.")
+    assert category == ModelCategory.CapitalCall
+    assert confidence > 0.8
+    assert classifier.predict("Quarterly update Q1: monthly burn of 70k, 9 FTEs.")[0] == ModelCategory.OperationalKPIs
+
+
+def test_trained_classifiers_are_saved_and_loaded(tmp_path):
+    classifier = _classifier()
+    path = str(tmp_path / "models" / "document_classifier.npz")
+    classifier.save(path)
+
+    loaded = DocumentClassifier.load(path)
+
+    assert loaded.categories == classifier.categories
+    assert loaded.predict(updates[0]) == classifier.predict(updates[0])
+
+
+def test_examples_are_read_from_stored_extractions(tmp_path):
+    path = tmp_path / "labelled.jsonl"
+    path.write_text(json.dumps({"text": capital_calls[0], "category": "CapitalCall"}) + "\n\n" + json.dumps({"text": updates[0], "documentMetadata": {"category": "OperationalKPIs"}}) + "\n")
+
+    assert classifier_utils._load_examples(str(path)) == ([capital_calls[0], updates[0]], [ModelCategory.CapitalCall, ModelCategory.OperationalKPIs])
+
+
+def test_only_confident_predictions_are_returned(trained, monkeypatch):
+    assert classify_document(updates[1]) == ModelCategory.OperationalKPIs
+    monkeypatch.setattr(classifier_utils, "classifier_confidence_threshold", 1.01)
+    assert classify_document(updates[1]) is None
+
+
+def test_without_a_trained_classifier_nothing_is_predicted(monkeypatch, tmp_path):
+    monkeypatch.setattr(classifier_utils, "classifier_path", str(tmp_path / "missing.npz"))
+    monkeypatch.setattr(classifier_utils, "_classifier", None)
+    monkeypatch.setattr(classifier_utils, "_classifier_loaded", False)
+
+    assert classify_document(updates[0]) is None
+
+
+def _extract(text: str):
+    from llama_index.core import Document
+    return asyncio.run(extract_utils.extract_document([Document(text=text)]))
+
+
+def test_confident_predictions_route_the_extraction(trained):
+    # the fake metadata call always answers CapitalCall, so OperationalKPIs data shows the classifier routed it
+    document_metadata, data = _extract(updates[2])
+
+    assert document_metadata.category == ModelCategory.OperationalKPIs
+    assert isinstance(data, OperationalKPIs)
+
+
+def test_unconfident_predictions_fall_back_to_the_llm_classification(trained, monkeypatch):
+    monkeypatch.setattr(classifier_utils, "classifier_confidence_threshold", 1.01)
+
+    document_metadata, data = _extract(updates[2])
+
+    assert document_metadata.category == ModelCategory.CapitalCall
+    assert isinstance(data, CapitalCall)
@@ -0,0 +1,15 @@
+from api.utils.csv_utils import profile_csv
+
+
+def test_whole_file_is_profiled_in_one_pass(tmp_path):
+    path = tmp_path / "investments.csv"
+    rows = [f"Company {i};{i * 1.5};{'' if i % 4 else 'EUR'};2023-01-{i % 28 + 1:02d}" for i in range(1000)]
+    path.write_text("Name;Amount;Currency;Date\n" + "\n".join(rows) + "\n", encoding="latin-1")
+
+    profiles = {profile.name: profile for profile in profile_csv(str(path))}
+
+    assert list(profiles) == ["Name", "Amount", "Currency", "Date"]
+    assert profiles["Amount"].inferredType == "number"
+    assert profiles["Date"].inferredType == "date"
+    assert profiles["Currency"].nullRate == 0.75
+    assert 900 <= profiles["Name"].distinctEstimate <= 1100
@@ -0,0 +1,130 @@
+import time
+import asyncio
+import datetime
+
+from api.data_models import response_models
+from api.utils import dedup_utils, extract_utils
+from api.utils.dedup_utils import NearDuplicateIndex, plan_reextraction
+
+boilerplate = "\n".join(f"Clause {i}: the investor shall pay the called amount to the account of the fund within ten business days." for i in range(40))
+
+
+def _capital_call_text(investor: str, commitment: str = "250,000.00") -> str:
+    return f"Capital Call No. 3 of Fund I\nDear {investor},\nwe call your share of the fund on March 1, 2024.\nYour commitment: EUR {commitment}\n{boilerplate}"
+
+
+def _capital_call(investor: str, commitment: float = 250000) -> response_models.CapitalCall:
+    return response_models.CapitalCall(type=response_models.ModelCategory.CapitalCall, name=investor, fundName="Fund I", capitalCallNumber=3, date=datetime.datetime(2024, 3, 1), commitment=commitment)
+
+
+def _empty_fields(data) -> list:
+    return [name for name, value in data.model_dump().items() if value is None]
+
+
+def test_identical_documents_reuse_every_field():
+    assert plan_reextraction(_capital_call_text("Valentina Pape"), _capital_call_text("Valentina Pape"), _capital_call("Valentina Pape")) == ([], None)
+
+
+def test_only_fields_in_changed_passages_are_extracted_again():
+    fields, passages = plan_reextraction(_capital_call_text("Valentina Pape"), _capital_call_text("Jonas Weber"), _capital_call("Valentina Pape"))
+
+    # the set fields outside the changed passages are reused, the empty ones are looked for in the passages
+    assert fields == ["name", *_empty_fields(_capital_call("Valentina Pape"))]
+    assert "Dear Jonas Weber" in passages
+    assert "Clause 30" not in passages
+
+
+def test_fields_missing_from_the_earlier_text_are_extracted_from_the_whole_text():
+    old_data = _capital_call("Valentina Pape").model_copy(update={"deadline": datetime.datetime(2024, 3, 15)})
+
+    fields, passages = plan_reextraction(_capital_call_text("Valentina Pape"), _capital_call_text("Jonas Weber"), old_data)
+
+    assert {"name", "deadline"} <= set(fields)
+    assert passages is None
+
+
+def test_empty_fields_are_extracted_again_from_inserted_passages():
+    old_text = _capital_call_text("Valentina Pape")
+    new_text = old_text.replace("Your commitment", "Please pay by March 15, 2024.\nYour commitment")
+    fields, passages = plan_reextraction(old_text, new_text, _capital_call("Valentina Pape"))
+
+    assert "deadline" in fields
+    assert "name" not in fields
+    assert "March 15, 2024" in passages
+
+
+def test_documents_that_changed_too_much_are_extracted_in_full():
+    assert plan_reextraction(_capital_call_text("Valentina Pape"), "An entirely different quarterly update.\n" + boilerplate[:500], _capital_call("Valentina Pape")) is None
+
+
+def test_long_documents_are_compared_quickly(monkeypatch):
+    words = "\n".join(f"Position {i} of the portfolio was valued at {i * 7} thousand euros." for i in range(3500))
+    started = time.perf_counter()
+    fields, _ = plan_reextraction(_capital_call_text("Valentina Pape") + words, _capital_call_text("Jonas Weber") + words, _capital_call("Valentina Pape"))
+
+    assert fields == ["name", *_empty_fields(_capital_call("Valentina Pape"))]
+    assert time.perf_counter() - started < 5
+    monkeypatch.setattr(dedup_utils, "dedup_max_words", 1000)
+    assert plan_reextraction(_capital_call_text("Valentina Pape") + words, _capital_call_text("Jonas Weber") + words, _capital_call("Valentina Pape")) is None
+
+
+def test_near_duplicates_are_only_found_for_the_same_data_model_and_llm_backend(tmp_path):
+    index = NearDuplicateIndex(str(tmp_path / "near_duplicates.sqlite"), max_documents=10)
+    index.add(_capital_call_text("Valentina Pape"), response_models.CapitalCall, "fake", _capital_call("Valentina Pape"))
+
+    text, data, similarity = index.find(_capital_call_text("Jonas Weber"), response_models.CapitalCall, "fake")
+    assert text == _capital_call_text("Valentina Pape")
+    assert response_models.CapitalCall.model_validate(data) == _capital_call("Valentina Pape")
+    assert similarity >= dedup_utils.dedup_similarity_threshold
+    assert index.find(_capital_call_text("Jonas Weber"), response_models.CapitalCall, "openai") is None
+    assert index.find(_capital_call_text("Jonas Weber"), response_models.OperationalKPIs, "fake") is None
+
+
+def test_indexed_data_without_optional_values_validates_again(monkeypatch, tmp_path):
+    monkeypatch.setattr(extract_utils, "near_duplicate_index", NearDuplicateIndex(str(tmp_path / "near_duplicates.sqlite"), max_documents=10))
+    text = "Quarterly update\n" + boilerplate
+    # date defaults to None but is not Optional, so a dump including it would not validate
+    extract_utils.near_duplicate_index.add(text, response_models.OperationalKPIs, extract_utils.llm_backend, response_models.OperationalKPIs(type=response_models.ModelCategory.OperationalKPIs, ftes=12))
+
+    data = asyncio.run(extract_utils.extract_near_duplicate(text, response_models.OperationalKPIs))
+
+    assert data.ftes == 12
+    assert data.date is None
+
+
+class IncrementalProgram:
+    """records the text of the incremental prompt and finds the deadline in it"""
+
+    def __init__(self):
+        self.texts = []
+
+    async def acall(self, document_text, **kwargs):
+        self.texts.append(document_text)
+        return self.output_cls(deadline=datetime.datetime(2024, 3, 15) if "March 15" in document_text else None)
+
+
+def _index_capital_call(monkeypatch, tmp_path, program, data):
+    monkeypatch.setattr(extract_utils, "near_duplicate_index", NearDuplicateIndex(str(tmp_path / "near_duplicates.sqlite"), max_documents=10))
+    monkeypatch.setattr(extract_utils, "get_program", lambda output_cls, template: setattr(program, "output_cls", output_cls) or program)
+    extract_utils.near_duplicate_index.add(_capital_call_text("Valentina Pape"), response_models.CapitalCall, extract_utils.llm_backend, data)
+
+
+def test_values_added_by_an_inserted_passage_are_merged_into_the_earlier_data(monkeypatch, tmp_path):
+    program = IncrementalProgram()
+    _index_capital_call(monkeypatch, tmp_path, program, _capital_call("Valentina Pape"))
+    text = _capital_call_text("Valentina Pape").replace("Your commitment", "Please pay by March 15, 2024.\nYour commitment")
+
+    data = asyncio.run(extract_utils.extract_near_duplicate(text, response_models.CapitalCall))
+
+    assert data == _capital_call("Valentina Pape").model_copy(update={"deadline": datetime.datetime(2024, 3, 15)})
+    assert "Clause 30" not in program.texts[0]
+
+
+def test_re_reading_more_than_one_chunk_falls_back_to_the_full_extraction(monkeypatch, tmp_path):
+    program = IncrementalProgram()
+    # the deadline cannot be found in the earlier text, so it would be re-read from the whole text
+    _index_capital_call(monkeypatch, tmp_path, program, _capital_call("Valentina Pape").model_copy(update={"deadline": datetime.datetime(2024, 4, 1)}))
+    monkeypatch.setattr(extract_utils, "chunk_max_chars", 1000)
+
+    assert asyncio.run(extract_utils.extract_near_duplicate(_capital_call_text("Jonas Weber"), response_models.CapitalCall)) is None
+    assert not program.texts
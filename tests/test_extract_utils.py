@@ -0,0 +1,154 @@
+import os
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from api.data_models import response_models
+from api.utils import extract_utils
+from api.utils.fake_llm_utils import FakeProgram
+from api.utils.repair_utils import RepairableOutputError, repair_model
+from api.utils.schema_utils import compile_schema
+
+
+def _write(path: str, text: str) -> str:
+    with open(path, "w") as file:
+        file.write(text)
+    return path
+
+
+def test_read_file_parses_only_the_given_file(tmp_path):
+    target = _write(str(tmp_path / "target.txt"), "capital call for fund I")
+    for i in range(50):
+        _write(str(tmp_path / f"other{i}.txt"), f"unrelated document {i}")
+
+    documents, _ = asyncio.run(extract_utils.read_file(target, ".txt"))
+
+    assert {document.metadata["file_name"] for document in documents} == {"target.txt"}
+    assert "capital call for fund I" in "".join(document.text for document in documents)
+
+
+def test_read_file_serves_repeated_files_from_the_parse_cache(tmp_path):
+    target = _write(str(tmp_path / "cached.txt"), "operational update for march")
+    file_hash = extract_utils.hash_file(target)
+
+    documents, hit = asyncio.run(extract_utils.read_file(target, ".txt", file_hash=file_hash))
+    assert not hit
+    # without the file the parser would fail, so a hit proves nothing was parsed
+    os.remove(target)
+    cached_documents, hit = asyncio.run(extract_utils.read_file(target, ".txt", file_hash=file_hash))
+
+    assert hit
+    assert [document.text for document in cached_documents] == [document.text for document in documents]
+
+
+def test_extraction_results_are_memoized(monkeypatch):
+    calls = []
+    program = FakeProgram(response_models.OperationalKPIs)
+    monkeypatch.setattr(extract_utils, "get_program", lambda output_cls, template: calls.append(output_cls) or program)
+
+    first = asyncio.run(extract_utils.extract_with_cache("kpis of march, 12 ftes", response_models.OperationalKPIs))
+    second = asyncio.run(extract_utils.extract_with_cache("kpis of march, 12 ftes", response_models.OperationalKPIs))
+    asyncio.run(extract_utils.extract_with_cache("kpis of april, 13 ftes", response_models.OperationalKPIs))
+
+    assert first == second
+    assert len(calls) == 2
+
+
+class CountingProgram(FakeProgram):
+    """fake program with a fixed latency that records how many calls are in flight"""
+
+    def __init__(self, output_cls, latency_ms: float):
+        super().__init__(output_cls, latency_ms=latency_ms, jitter_ms=0, error_rate=0)
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def acall(self, **kwargs):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            return await super().acall(**kwargs)
+        finally:
+            self.in_flight -= 1
+
+
+def _run_concurrently(program, calls: int) -> float:
+    async def run():
+        start = time.perf_counter()
+        await asyncio.gather(*[extract_utils.run_program(program, document_text=str(i)) for i in range(calls)])
+        return time.perf_counter() - start
+    return asyncio.run(run())
+
+
+def test_llm_calls_run_concurrently_up_to_the_limit(monkeypatch):
+    monkeypatch.setattr(extract_utils, "llm_max_concurrency", 4)
+    monkeypatch.setattr(extract_utils, "_llm_semaphore", None)
+    program = CountingProgram(response_models.DocumentMetadata, latency_ms=200)
+
+    # throughput grows near-linearly up to the limit: 4 calls take about as long as one...
+    assert _run_concurrently(program, 4) < 0.35
+    monkeypatch.setattr(extract_utils, "_llm_semaphore", None)
+    # ...and beyond it calls queue, 12 calls take 3 rounds
+    elapsed = _run_concurrently(program, 12)
+
+    assert program.max_in_flight == 4
+    assert 0.6 <= elapsed < 0.9
+
+
+def test_programs_are_built_once_per_output_class_and_template():
+    output_cls = response_models.GeneralCompanyInfo
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        programs = list(executor.map(lambda _: extract_utils.get_program(output_cls, extract_utils.prompt_template_str), range(32)))
+
+    assert all(program is programs[0] for program in programs)
+    assert extract_utils.get_program(output_cls, extract_utils.prompt_template_str_mapping) is not programs[0]
+    extract_utils.drop_programs(output_cls)
+    assert extract_utils.get_program(output_cls, extract_utils.prompt_template_str) is not programs[0]
+
+
+def test_evicted_output_classes_take_their_repair_programs_with_them():
+    output_cls = compile_schema("Invoice", {"type": "object", "properties": {"number": {"type": "string"}, "amount": {"type": "number"}}})
+    extract_utils.get_program(output_cls, extract_utils.prompt_template_str)
+    extract_utils.get_program(repair_model(output_cls, ("amount",)), extract_utils.prompt_template_str_repair)
+    extract_utils.get_program(repair_model(output_cls, ("number", "amount")), extract_utils.prompt_template_str_incremental)
+
+    extract_utils.drop_programs(output_cls)
+
+    assert not [key for key in extract_utils._programs if key[0].__name__.startswith("Invoice")]
+
+
+def test_routed_documents_report_the_category_their_data_was_extracted_for():
+    from llama_index.core import Document
+    # the fake metadata call classifies every document as the first category, CapitalCall
+    document_metadata, data = asyncio.run(extract_utils.extract_document([Document(text="Q3 update: 14 FTEs, monthly burn 80k")], category=response_models.ModelCategory.OperationalKPIs))
+
+    assert document_metadata.category == response_models.ModelCategory.OperationalKPIs
+    assert isinstance(data, response_models.OperationalKPIs)
+
+
+def _chunk_results(monkeypatch, results: dict):
+    """makes extract_with_cache return or raise the result given for each chunk"""
+    async def extract_with_cache(chunk, data_model):
+        await asyncio.sleep(0.01 if chunk == "slow" else 0)
+        result = results[chunk]
+        if isinstance(result, BaseException):
+            raise result
+        return result
+    monkeypatch.setattr(extract_utils, "extract_with_cache", extract_with_cache)
+
+
+def test_chunks_failing_validation_are_skipped(monkeypatch):
+    kpis = response_models.OperationalKPIs(type=response_models.ModelCategory.OperationalKPIs, ftes=12)
+    error = RepairableOutputError(response_models.OperationalKPIs, {}, [{"loc": ("revenue",), "msg": "invalid", "type": "model_type"}])
+    _chunk_results(monkeypatch, {"first": kpis, "second": error})
+
+    assert asyncio.run(extract_utils.create_chunked_data_model(["first", "second"], response_models.OperationalKPIs)).ftes == 12
+
+
+def test_chunk_errors_other_than_validation_fail_the_extraction(monkeypatch):
+    kpis = response_models.OperationalKPIs(type=response_models.ModelCategory.OperationalKPIs, ftes=12)
+    _chunk_results(monkeypatch, {"first": kpis, "second": asyncio.TimeoutError(), "slow": kpis})
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(extract_utils.create_chunked_data_model(["first", "second", "slow"], response_models.OperationalKPIs))
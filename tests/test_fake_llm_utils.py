@@ -0,0 +1,59 @@
+import os
+import sys
+import time
+import asyncio
+import subprocess
+
+import pytest
+from fastapi.testclient import TestClient
+
+from api.data_models import response_models
+from api.utils.fake_llm_utils import FakeLLMError, FakeProgram, fake_instance
+from conftest import backend_directory, sample_pdf
+
+
+def _program_class(tmp_path, llm_backend: str) -> subprocess.CompletedProcess:
+    script = "from api.utils import extract_utils; from api.data_models import response_models; print(type(extract_utils.get_program(response_models.CapitalCall, extract_utils.prompt_template_str)).__name__)"
+    return subprocess.run(
+        [sys.executable, "-c", script], cwd=str(tmp_path), capture_output=True, text=True,
+        env={**os.environ, "PYTHONPATH": backend_directory, "LLM_BACKEND": llm_backend},
+    )
+
+
+def test_the_llm_backend_is_selected_through_configuration(tmp_path):
+    assert _program_class(tmp_path, "fake").stdout.strip().splitlines()[-1] == "FakeProgram"
+    unknown = _program_class(tmp_path, "gpt-unknown")
+    assert unknown.returncode != 0
+    assert "Unknown LLM_BACKEND: gpt-unknown" in unknown.stderr
+
+
+@pytest.mark.parametrize("output_cls", [response_models.DocumentMetadata, response_models.DocumentExtraction, *response_models.category_to_data_model.values(), response_models.InvestmentColumns])
+def test_fake_results_are_valid_and_deterministic(output_cls):
+    program = FakeProgram(output_cls, latency_ms=0, jitter_ms=0, error_rate=0)
+
+    first, second = program(document_text="a"), asyncio.run(program.acall(document_text="b"))
+
+    assert isinstance(first, output_cls)
+    assert first == second == fake_instance(output_cls)
+
+
+def test_fake_programs_inject_latency_and_failures():
+    slow = FakeProgram(response_models.DocumentMetadata, latency_ms=100, jitter_ms=0, error_rate=0)
+    start = time.perf_counter()
+    asyncio.run(slow.acall())
+    assert time.perf_counter() - start >= 0.1
+
+    with pytest.raises(FakeLLMError):
+        asyncio.run(FakeProgram(response_models.DocumentMetadata, latency_ms=0, jitter_ms=0, error_rate=1).acall())
+
+
+def test_extractions_with_the_fake_backend_return_the_fake_results():
+    import main
+    client = TestClient(main.app)
+
+    with open(sample_pdf, "rb") as file:
+        response = client.post("/v1/files/extract/", params={"category": "CapitalCall"}, files={"file": ("call.pdf", file, "application/pdf")})
+
+    assert response.status_code == 200
+    assert response.json()["data"] == fake_instance(response_models.CapitalCall).model_dump(mode="json")
+    assert response.json()["documentMetadata"]["category"] == "CapitalCall"
@@ -0,0 +1,128 @@
+import os
+import json
+import time
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+from fastapi.testclient import TestClient
+
+from api.data_models.response_models import JobStatus
+from api.utils import job_utils, upload_utils
+from api.utils.job_utils import JobQueue, QueueFullError, validate_callback_url
+from conftest import sample_pdf
+
+
+@pytest.mark.parametrize("callback_url", [
+    "ftp://example.com/hook",
+    "file:///etc/passwd",
+    "http://127.0.0.1:8000/hook",
+    "http://localhost/hook",
+    "http://10.0.0.5/hook",
+    "http://169.254.169.254/latest/meta-data",
+    "http://[::1]/hook",
+    "http:///hook",
+])
+def test_callbacks_to_internal_or_non_http_urls_are_rejected(callback_url):
+    with pytest.raises(ValueError):
+        validate_callback_url(callback_url)
+
+
+def test_allowed_callback_hosts_replace_the_public_address_check(monkeypatch):
+    monkeypatch.setattr(job_utils, "callback_allowed_hosts", {"127.0.0.1"})
+
+    validate_callback_url("http://127.0.0.1:8000/hook")
+    with pytest.raises(ValueError):
+        validate_callback_url("https://example.com/hook")
+
+
+def test_full_queues_reject_jobs_and_queued_jobs_are_discarded_at_shutdown():
+    discarded = []
+
+    def discard(i: int):
+        async def delete_upload():
+            discarded.append(i)
+        return delete_upload
+
+    async def run():
+        queue = JobQueue(max_depth=2, num_workers=0, retention_seconds=60)
+        await queue.start()
+        jobs = [queue.submit(asyncio.sleep, discard=discard(i)) for i in range(2)]
+        with pytest.raises(QueueFullError):
+            queue.submit(asyncio.sleep)
+        await queue.stop()
+        return jobs
+
+    jobs = asyncio.run(run())
+
+    assert discarded == [0, 1]
+    assert all(job.status == JobStatus.Failed and job.finishedAt for job in jobs)
+
+
+class CallbackHandler(BaseHTTPRequestHandler):
+    received = []
+
+    def do_POST(self):
+        self.received.append(json.loads(self.rfile.read(int(self.headers["Content-Length"]))))
+        self.send_response(204)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def _poll(client, job_id: str) -> dict:
+    for _ in range(200):
+        job = client.get(f"/v1/jobs/{job_id}").json()
+        if job["status"] not in ("Queued", "Running"):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+def test_background_extractions_are_polled_and_posted_to_the_callback(monkeypatch):
+    import main
+    server = HTTPServer(("127.0.0.1", 0), CallbackHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(job_utils, "callback_allowed_hosts", {"127.0.0.1"})
+    callback_url = f"http://127.0.0.1:{server.server_port}/hook"
+    try:
+        with TestClient(main.app) as client, open(sample_pdf, "rb") as file:
+            response = client.post("/v1/files/extract/", params={"background": True, "callback_url": callback_url}, files={"file": ("call.pdf", file, "application/pdf")})
+            assert response.status_code == 202
+            job = _poll(client, response.json()["jobId"])
+            for _ in range(100):
+                if CallbackHandler.received:
+                    break
+                time.sleep(0.05)
+    finally:
+        server.shutdown()
+
+    assert job["status"] == "Succeeded"
+    assert job["result"]["fileMetadata"]["fileName"] == "call.pdf"
+    assert CallbackHandler.received == [job]
+
+
+def test_background_extractions_with_internal_callbacks_are_rejected():
+    import main
+    with TestClient(main.app) as client, open(sample_pdf, "rb") as file:
+        response = client.post("/v1/files/extract/", params={"background": True, "callback_url": "http://127.0.0.1/hook"}, files={"file": ("call.pdf", file, "application/pdf")})
+
+    assert response.status_code == 400
+
+
+def test_full_queues_answer_429_and_remove_the_upload(monkeypatch):
+    import main
+
+    def submit(*args, **kwargs):
+        raise QueueFullError("Job queue is full (0 jobs)")
+
+    before = set(os.listdir(upload_utils.upload_directory)) if os.path.isdir(upload_utils.upload_directory) else set()
+    with TestClient(main.app) as client, open(sample_pdf, "rb") as file:
+        monkeypatch.setattr(job_utils.job_queue, "submit", submit)
+        response = client.post("/v1/files/extract/", params={"background": True}, files={"file": ("call.pdf", file, "application/pdf")})
+
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "10"
+    assert set(os.listdir(upload_utils.upload_directory)) == before
@@ -0,0 +1,64 @@
+import os
+import sys
+import subprocess
+
+from fastapi.testclient import TestClient
+
+from conftest import backend_directory
+
+
+def test_app_starts_without_importing_llm_clients(tmp_path):
+    script = "import sys, main; print(sorted({name.split('.')[0] for name in sys.modules if name.startswith(('llama_index', 'llama_parse'))}))"
+    output = subprocess.run(
+        [sys.executable, "-c", script], cwd=str(tmp_path), capture_output=True, text=True, check=True,
+        env={**os.environ, "PYTHONPATH": backend_directory},
+    ).stdout
+
+    assert output.strip().splitlines()[-1] == "[]"
+    # caches, stores and indexes create their SQLite files on first use
+    assert not (tmp_path / "app").exists()
+
+
+def test_llm_clients_are_imported_off_the_event_loop(tmp_path):
+    script = """
+import sys, time, asyncio
+from api.utils import extract_utils
+
+async def main():
+    gaps, importing = [], True
+    async def tick():
+        last = time.perf_counter()
+        while importing:
+            await asyncio.sleep(0.005)
+            now = time.perf_counter()
+            gaps.append(now - last)
+            last = now
+    ticker = asyncio.ensure_future(tick())
+    start = time.perf_counter()
+    await extract_utils.ensure_llm_clients()
+    elapsed = time.perf_counter() - start
+    importing = False
+    await ticker
+    print("llama_index.core" in sys.modules, elapsed, max(gaps, default=elapsed))
+
+asyncio.run(main())
+"""
+    output = subprocess.run(
+        [sys.executable, "-c", script], cwd=str(tmp_path), capture_output=True, text=True, check=True,
+        env={**os.environ, "PYTHONPATH": backend_directory},
+    ).stdout
+    imported, elapsed, max_gap = output.strip().splitlines()[-1].split()
+
+    assert imported == "True"
+    # the event loop kept ticking while llama_index was imported
+    assert float(max_gap) < min(0.2, float(elapsed))
+
+
+def test_docs_and_warm_up_respond():
+    import main
+    from api.utils import extract_utils
+    client = TestClient(main.app)
+
+    assert client.get("/docs").status_code == 200
+    assert client.post("/warm-up").status_code == 200
+    assert (extract_utils.response_models.CapitalCall, extract_utils.prompt_template_str) in extract_utils._programs
@@ -0,0 +1,41 @@
+from api.data_models.response_models import ColumnProfile, InvestmentColumns
+from api.utils import mapping_utils
+from api.utils.mapping_utils import SynonymStore, match_columns, normalize_header
+
+
+def _columns(*names: str):
+    return [ColumnProfile(name=name, inferredType="string", nullRate=0.0, distinctEstimate=10, sample=[]) for name in names]
+
+
+def test_headers_are_normalized():
+    assert normalize_header(" Währung (ISO) ") == "waehrungiso"
+
+
+def test_known_headers_are_mapped_locally(monkeypatch, tmp_path):
+    monkeypatch.setattr(mapping_utils, "synonym_store", SynonymStore(str(tmp_path / "synonyms.json")))
+    matches, unresolved = match_columns(_columns("Firmenname", "CCY", "Branche", "Web-Site", "Notes"), InvestmentColumns)
+
+    assert matches == {"companyName": "Firmenname", "currency": "CCY", "sector": "Branche", "website": "Web-Site"}
+    assert [column.name for column in unresolved] == ["Notes"]
+
+
+def test_confirmed_mappings_are_learned(monkeypatch, tmp_path):
+    store = SynonymStore(str(tmp_path / "synonyms.json"))
+    monkeypatch.setattr(mapping_utils, "synonym_store", store)
+    assert "type" not in match_columns(_columns("Vehikel"), InvestmentColumns)[0]
+
+    store.learn(InvestmentColumns, {"type": "Vehikel"})
+
+    assert match_columns(_columns("Vehikel"), InvestmentColumns)[0] == {"type": "Vehikel"}
+
+
+def test_synonyms_learned_by_other_workers_are_kept_and_seen(tmp_path):
+    path = str(tmp_path / "synonyms.json")
+    first, second = SynonymStore(path), SynonymStore(path)
+    first.get(InvestmentColumns)
+    second.get(InvestmentColumns)
+
+    first.learn(InvestmentColumns, {"companyName": "Beteiligung"})
+    second.learn(InvestmentColumns, {"sector": "Segment"})
+
+    assert first.get(InvestmentColumns) == second.get(InvestmentColumns) == {"beteiligung": "companyName", "segment": "sector"}
@@ -0,0 +1,61 @@
+import re
+import asyncio
+
+from fastapi.testclient import TestClient
+
+from api.data_models import response_models
+from api.utils import extract_utils
+from api.utils.fake_llm_utils import FakeProgram
+from api.utils.metrics_utils import server_timing
+from conftest import sample_pdf
+
+
+def test_repeated_stages_are_summed_in_the_server_timing_header():
+    assert server_timing([("read_file", 0.25), ("llm-cache-miss", 0.0), ("create_data_model", 0.5), ("read_file", 0.25)]) == "read_file;dur=500.0, llm-cache-miss;dur=0.0, create_data_model;dur=500.0"
+
+
+def test_extractions_report_their_stages_in_server_timing_and_metrics(monkeypatch):
+    import main
+    monkeypatch.setattr(main, "server_timing_enabled", True)
+    # the sample may already be indexed by other tests, which would skip the data model stage
+    monkeypatch.setattr(extract_utils, "dedup_enabled", False)
+    client = TestClient(main.app)
+
+    with open(sample_pdf, "rb") as file:
+        response = client.post("/v1/files/extract/", params={"category": "CapitalCall"}, files={"file": ("call.pdf", file, "application/pdf")})
+    metrics = client.get("/metrics")
+
+    assert response.status_code == 200
+    stages = dict(span.split(";dur=") for span in response.headers["Server-Timing"].split(", "))
+    assert {"read_file", "create_data_model"} <= set(stages)
+    assert all(float(duration) >= 0 for duration in stages.values())
+    assert metrics.headers["content-type"].startswith("text/plain")
+    assert re.search(r'pipeline_stage_seconds_count\{stage="read_file"\} [1-9]', metrics.text)
+    assert re.search(r'cache_requests_total\{cache="parse",result="(hit|miss)"\} [1-9]', metrics.text)
+    assert 'parse_path_total{path="local"}' in metrics.text
+
+
+class PromptedProgram(FakeProgram):
+    """fake program with a prompt template, like LLMTextCompletionProgram"""
+
+    class prompt:
+        @staticmethod
+        def format(**kwargs) -> str:
+            return f"Extract the document metadata from: {kwargs['document_text']}"
+
+
+def _estimated_tokens(client, kind: str) -> float:
+    match = re.search(rf'llm_estimated_tokens_total\{{kind="{kind}",output_cls="DocumentMetadata"\}} ([0-9.]+)', client.get("/metrics").text)
+    return float(match.group(1)) if match else 0.0
+
+
+def test_token_counts_are_exposed_as_estimates():
+    import main
+    client = TestClient(main.app)
+    before = _estimated_tokens(client, "prompt"), _estimated_tokens(client, "completion")
+    program = PromptedProgram(response_models.DocumentMetadata, latency_ms=0, jitter_ms=0, error_rate=0)
+
+    asyncio.run(extract_utils.run_program(program, document_text="capital call of fund I"))
+
+    assert _estimated_tokens(client, "prompt") > before[0]
+    assert _estimated_tokens(client, "completion") > before[1]
@@ -0,0 +1,63 @@
+import asyncio
+
+import fitz
+
+from api.utils import pdf_utils
+from conftest import sample_pdf
+
+
+def _pdf(path, pages: int, text: str = None) -> str:
+    with fitz.open() as pdf:
+        for _ in range(pages):
+            page = pdf.new_page()
+            if text:
+                page.insert_textbox(page.rect + (72, 72, -72, -72), text)
+        pdf.save(str(path))
+    return str(path)
+
+
+def test_digitally_generated_pdfs_are_read_from_their_text_layer():
+    pages = asyncio.run(pdf_utils.extract_text_layer(sample_pdf))
+
+    assert pages
+    assert "Valentina Pape" in "\n".join(pages)
+
+
+def test_pdfs_without_enough_text_fall_back(tmp_path):
+    assert asyncio.run(pdf_utils.extract_text_layer(_pdf(tmp_path / "empty.pdf", pages=2))) is None
+
+
+def test_unreadable_files_fall_back(tmp_path):
+    path = tmp_path / "broken.pdf"
+    path.write_bytes(b"%PDF-1.7 not really a pdf")
+
+    assert asyncio.run(pdf_utils.extract_text_layer(str(path))) is None
+
+
+def test_extraction_errors_fall_back(monkeypatch):
+    def fail(file_location, page_numbers):
+        raise RuntimeError("table detection failed")
+    monkeypatch.setattr(pdf_utils, "_extract_pages", fail)
+
+    assert asyncio.run(pdf_utils.extract_text_layer(sample_pdf)) is None
+
+
+def test_rejection_reasons():
+    text_page = {"chars": 1500, "badChars": 0, "imageCoverage": 0.1}
+
+    assert pdf_utils.rejection_reason([text_page, text_page]) is None
+    assert pdf_utils.rejection_reason([text_page, {"chars": 20, "badChars": 0, "imageCoverage": 0.9}]) == "scanned pages [2]"
+    assert pdf_utils.rejection_reason([{"chars": 1500, "badChars": 300, "imageCoverage": 0.0}]) == "300 unmappable characters"
+
+
+def test_large_pdfs_are_split_across_the_process_pool(monkeypatch, tmp_path):
+    monkeypatch.setattr(pdf_utils, "pdf_process_pool_min_pages", 4)
+    monkeypatch.setattr(pdf_utils, "pdf_process_pool_workers", 2)
+    path = _pdf(tmp_path / "large.pdf", pages=6, text="Quarterly report of Acme GmbH with revenue, burn and headcount. " * 10)
+    try:
+        pages = asyncio.run(pdf_utils.extract_text_layer(path))
+    finally:
+        pdf_utils.shutdown_pool()
+
+    assert len(pages) == 6
+    assert all("Acme GmbH" in page for page in pages)
@@ -0,0 +1,39 @@
+from api.data_models.response_models import CapitalCall
+from api.utils.reconcile_utils import reconcile_capital_calls
+
+
+def _capital_call(name: str, fund_name: str = "Fund I", currency: str = "EUR", **amounts) -> CapitalCall:
+    return CapitalCall(type="CapitalCall", name=name, fundName=fund_name, capitalCallNumber=1, currency=currency, **amounts)
+
+
+def test_consistent_capital_calls_have_no_discrepancies():
+    reports = reconcile_capital_calls([
+        _capital_call("Ada", equityShare=0.6, contributionToTarget=500.0, bunchFee=100.0, totalCapitalCalled=600.0),
+        _capital_call("Grace", equityShare=0.4, contributionToTarget=400.0, totalCapitalCalled=400.0),
+    ])
+
+    assert len(reports) == 1
+    assert (reports[0].investors, reports[0].totalCapitalCalled, reports[0].equityShare) == (2, 1000.0, 1.0)
+    assert reports[0].discrepancies == []
+
+
+def test_arithmetic_discrepancies_are_reported():
+    reports = reconcile_capital_calls([
+        _capital_call("Ada", equityShare=0.6, contributionToTarget=500.0, totalCapitalCalled=600.0),
+        _capital_call("Grace", equityShare=0.3, contributionToTarget=400.0),
+        _capital_call("Linus", currency="USD"),
+    ])
+
+    checks = {(discrepancy.check, discrepancy.investor) for discrepancy in reports[0].discrepancies}
+    assert checks == {("totalCapitalCalled", "Ada"), ("totalCapitalCalledMissing", "Grace"), ("totalCapitalCalledMissing", "Linus"), ("equityShareSum", None), ("currency", None)}
+
+
+def test_fund_names_and_currencies_are_compared_ignoring_case_and_whitespace():
+    reports = reconcile_capital_calls([
+        _capital_call("Ada", fund_name="Fund I ", currency="EUR", equityShare=0.5, totalCapitalCalled=0.0),
+        _capital_call("Grace", fund_name="fund  i", currency=" eur", equityShare=0.5, totalCapitalCalled=0.0),
+    ])
+
+    assert len(reports) == 1
+    assert reports[0].fundName == "Fund I"
+    assert reports[0].discrepancies == []
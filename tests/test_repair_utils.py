@@ -0,0 +1,103 @@
+import asyncio
+
+import pytest
+from pydantic import ValidationError
+
+from api.data_models.response_models import CapitalCall, DocumentExtraction, GeneralCompanyInfo
+from api.utils.extract_utils import repair_output
+from api.utils.repair_utils import RepairableOutputError, _parse_number, normalize_currency, repair_locally
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("EUR 100.000", 100000.0),
+    ("100.000", 100000.0),
+    ("1.000.000", 1000000.0),
+    ("1.000.000,50 €", 1000000.5),
+    ("$1,000,000.50", 1000000.5),
+    ("100,000", 100000.0),
+    ("1,5", 1.5),
+    ("1.5", 1.5),
+    ("0,125", 0.125),
+    ("-1.234,56", -1234.56),
+    ("1'250'000", 1250000.0),
+    ("12.5 %", 0.125),
+    ("EUR 1.5 Mio", 1500000.0),
+    ("1,5 Mio.", 1500000.0),
+    ("2.3m", 2300000.0),
+    ("250k", 250000.0),
+    ("US$ 2bn", 2000000000.0),
+    ("100 EUR", 100.0),
+    ("1.00.000", None),
+    ("5.3.2024", None),
+    ("n/a", None),
+    ("approx. 40 FTEs to 50", None),
+    ("40 FTEs", None),
+    ("between 10 and 20", None),
+])
+def test_amounts_are_parsed_or_rejected_when_ambiguous(value, expected):
+    assert _parse_number(value) == expected
+
+
+def _error(output_cls, raw) -> RepairableOutputError:
+    try:
+        output_cls.model_validate(raw)
+    except ValidationError as e:
+        return RepairableOutputError(output_cls, raw, e.errors(include_url=False, include_context=False))
+    raise AssertionError("raw output is valid")
+
+
+def test_failing_values_are_fixed_locally():
+    error = _error(CapitalCall, {"type": "CapitalCall", "name": "Ada", "commitment": "EUR 250.000", "equityShare": 25, "deadline": "soon"})
+
+    raw, repaired, remaining = repair_locally(error)
+
+    assert (raw["commitment"], raw["equityShare"]) == (250000.0, 0.25)
+    assert sorted(repaired) == [("commitment",), ("equityShare",)]
+    assert [tuple(validation_error["loc"]) for validation_error in remaining] == [("deadline",)]
+
+
+def test_enum_values_and_currencies_are_normalized():
+    error = _error(GeneralCompanyInfo, {"type": "Fund", "companyName": "Acme", "sector": "aerospace industry", "currency": "Euro"})
+
+    raw, repaired, remaining = repair_locally(error)
+
+    assert (raw["sector"], raw["currency"]) == ("Aerospace", "EUR")
+    assert not remaining
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("Euro", "EUR"), ("€", "EUR"), ("chf", "CHF"), ("Swiss Francs", "CHF"), ("Japanese Yen", "JPY"),
+    ("Pound Sterling", "GBP"), ("Canadian dollar", "CAD"), ("sek", "SEK"), ("unknown", None), ("Mixed", None), ("Euros and dollars", None),
+])
+def test_currencies_resolve_to_iso_codes_or_nothing(value, expected):
+    assert normalize_currency(value) == expected
+
+
+def test_unknown_currencies_are_left_for_the_re_ask():
+    error = _error(GeneralCompanyInfo, {"type": "Fund", "companyName": "Acme", "currency": "Mixed"})
+
+    raw, repaired, remaining = repair_locally(error)
+
+    assert raw["currency"] == "Mixed"
+    assert not repaired
+    assert [tuple(validation_error["loc"]) for validation_error in remaining] == [("currency",)]
+
+
+def test_single_pass_data_errors_are_located_under_data_and_repaired():
+    raw = {
+        "documentMetadata": {"category": "CapitalCall", "entities": [], "summary": "", "containsFinancials": True},
+        "data": {"type": "CapitalCall", "name": "Ada", "equityShare": 2, "commitment": "EUR 100.000"},
+    }
+    error = _error(DocumentExtraction, raw)
+    assert {tuple(validation_error["loc"]) for validation_error in error.errors} == {("data", "equityShare"), ("data", "commitment")}
+
+    extraction = asyncio.run(repair_output(error))
+
+    assert (extraction.data.equityShare, extraction.data.commitment) == (0.02, 100000.0)
+
+
+def test_errors_outside_the_output_fields_are_not_repaired():
+    error = RepairableOutputError(CapitalCall, {"type": "CapitalCall", "name": "Ada"}, [{"loc": ("unknown",), "msg": "invalid", "type": "value_error"}])
+
+    with pytest.raises(RepairableOutputError):
+        asyncio.run(repair_output(error))
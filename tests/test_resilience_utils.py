@@ -0,0 +1,136 @@
+import time
+import asyncio
+
+import pytest
+
+from api.data_models.response_models import DocumentMetadata
+from api.utils import resilience_utils
+from api.utils.fake_llm_utils import FakeLLMError, FakeProgram
+from api.utils.resilience_utils import CircuitBreaker, CircuitOpenError, ResiliencePolicy
+
+
+class ScriptedProgram(FakeProgram):
+    """fake program whose calls take the given latencies and fail where the script says so,
+    recording how many calls started and how many were cancelled"""
+
+    def __init__(self, latencies_ms=(0,), failures=()):
+        super().__init__(DocumentMetadata, latency_ms=0, jitter_ms=0, error_rate=0)
+        self.latencies_ms = list(latencies_ms)
+        self.failures = set(failures)
+        self.calls = 0
+        self.cancelled = 0
+
+    async def acall(self, **kwargs):
+        call = self.calls
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.latencies_ms[min(call, len(self.latencies_ms) - 1)] / 1000)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if call in self.failures:
+            raise FakeLLMError(f"Injected failure of call {call}")
+        return self._result()
+
+
+def _policy(retries=2, timeout=1.0, hedge=False, hedge_delay_seconds=0.05, failure_threshold=10, reset_seconds=30.0) -> ResiliencePolicy:
+    return ResiliencePolicy("Fake", timeout=timeout, retries=retries, backoff_seconds=0.01, hedge=hedge, hedge_delay_seconds=hedge_delay_seconds, breaker=CircuitBreaker(failure_threshold, reset_seconds))
+
+
+def test_failed_calls_are_retried_with_exponential_backoff(monkeypatch):
+    backoffs = []
+    monkeypatch.setattr(resilience_utils.random, "uniform", lambda low, high: backoffs.append(high) or 0)
+    program = ScriptedProgram(failures={0, 1})
+
+    result = asyncio.run(_policy(retries=2).call(program.acall))
+
+    assert isinstance(result, DocumentMetadata)
+    assert program.calls == 3
+    assert backoffs == [0.01, 0.02]
+
+
+def test_retries_stop_at_the_limit():
+    program = ScriptedProgram(failures=range(10))
+
+    with pytest.raises(FakeLLMError):
+        asyncio.run(_policy(retries=2).call(program.acall))
+    assert program.calls == 3
+
+
+def test_slow_calls_time_out_and_count_as_failures():
+    program = ScriptedProgram(latencies_ms=[500])
+    policy = _policy(retries=0, timeout=0.05)
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(policy.call(program.acall))
+    assert policy.breaker.failures == 1
+
+
+def test_validation_errors_are_not_retried():
+    calls = []
+
+    async def invalid_output():
+        calls.append(1)
+        raise ValueError("output failed validation")
+
+    policy = _policy(retries=2)
+    with pytest.raises(ValueError):
+        asyncio.run(policy.call(invalid_output))
+    assert len(calls) == 1
+    assert policy.breaker.failures == 0
+
+
+def test_hedged_calls_return_the_faster_result_and_cancel_the_slower():
+    program = ScriptedProgram(latencies_ms=[1000, 10])
+
+    async def run():
+        start = time.perf_counter()
+        result = await _policy(hedge=True, hedge_delay_seconds=0.05).call(program.acall)
+        elapsed = time.perf_counter() - start
+        # give the cancelled call a chance to observe its cancellation
+        await asyncio.sleep(0)
+        return result, elapsed
+
+    result, elapsed = asyncio.run(run())
+
+    assert isinstance(result, DocumentMetadata)
+    assert elapsed < 0.5
+    assert (program.calls, program.cancelled) == (2, 1)
+
+
+def test_fast_calls_are_not_hedged():
+    program = ScriptedProgram(latencies_ms=[10])
+
+    asyncio.run(_policy(hedge=True, hedge_delay_seconds=0.2).call(program.acall))
+
+    assert program.calls == 1
+
+
+def test_the_breaker_opens_after_consecutive_failures_and_half_opens_after_the_reset_time():
+    program = ScriptedProgram(failures={0, 1, 2})
+    policy = _policy(retries=0, failure_threshold=2, reset_seconds=0.1)
+
+    async def run():
+        for _ in range(2):
+            with pytest.raises(FakeLLMError):
+                await policy.call(program.acall)
+        assert policy.breaker.state == "open"
+        with pytest.raises(CircuitOpenError):
+            await policy.call(program.acall)
+        assert program.calls == 2
+
+        await asyncio.sleep(0.1)
+        assert policy.breaker.state == "half_open"
+        # a failed trial opens the breaker again at once
+        with pytest.raises(FakeLLMError):
+            await policy.call(program.acall)
+        assert policy.breaker.state == "open"
+
+        await asyncio.sleep(0.1)
+        # only one trial is let through while half-open, and its success closes the breaker
+        assert policy.breaker.allow() and not policy.breaker.allow()
+        policy.breaker.release()
+        await policy.call(program.acall)
+        assert policy.breaker.state == "closed"
+
+    asyncio.run(run())
@@ -0,0 +1,28 @@
+import pytest
+
+from api.data_models.response_models import CapitalCall, validate_many
+
+
+def test_records_are_validated_in_bulk_with_errors_by_row():
+    result = validate_many(CapitalCall, [
+        {"type": "CapitalCall", "name": "Ada", "equityShare": 0.5},
+        {"type": "CapitalCall", "name": "Grace", "equityShare": 1.5},
+        {"type": "CapitalCall", "name": "Linus", "commitment": "a lot"},
+    ])
+
+    assert result.models[0].name == "Ada"
+    assert result.models[1] is None and result.models[2] is None
+    assert [error["loc"] for error in result.errors[1]] == [("equityShare",)]
+    assert [error["loc"] for error in result.errors[2]] == [("commitment",)]
+
+
+def test_columnar_batches_are_validated_row_by_row():
+    result = validate_many(CapitalCall, {"type": ["CapitalCall"] * 2, "name": ["Ada", "Grace"], "equityShare": [0.5, 2]})
+
+    assert [model.name if model else None for model in result.models] == ["Ada", None]
+    assert list(result.errors) == [1]
+
+
+def test_columnar_batches_with_columns_of_different_lengths_are_rejected():
+    with pytest.raises(ValueError, match="same length"):
+        validate_many(CapitalCall, {"name": ["Ada", "Grace"], "equityShare": [0.5]})
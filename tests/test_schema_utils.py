@@ -0,0 +1,103 @@
+import datetime
+import multiprocessing
+
+import pytest
+from pydantic import ValidationError
+from fastapi.testclient import TestClient
+
+from api.utils import schema_utils
+from api.utils.schema_utils import SchemaError, SchemaRegistry, compile_schema
+
+invoice = {
+    "type": "object",
+    "required": ["number"],
+    "properties": {
+        "number": {"type": "string", "pattern": "^INV-[0-9]+$"},
+        "issued": {"type": "string", "format": "date"},
+        "amount": {"type": "number", "minimum": 0},
+        "status": {"enum": ["open", "paid"]},
+        "lines": {"type": "array", "items": {"$ref": "#/$defs/line"}},
+    },
+    "$defs": {"line": {"type": "object", "properties": {"description": {"type": "string"}, "quantity": {"type": ["integer", "null"]}}}},
+}
+
+
+def test_valid_schemas_compile_into_nested_models():
+    model = compile_schema("Invoice", invoice)
+
+    data = model.model_validate({"number": "INV-7", "issued": "2024-03-01", "amount": 12.5, "status": "paid", "lines": [{"description": "fee", "quantity": 2}]})
+    assert data.issued == datetime.date(2024, 3, 1)
+    assert data.lines[0].quantity == 2
+    assert model.model_validate({"number": "INV-8"}).amount is None
+    for invalid in ({"amount": 1}, {"number": "7"}, {"number": "INV-7", "amount": -1}, {"number": "INV-7", "status": "void"}):
+        with pytest.raises(ValidationError):
+            model.model_validate(invalid)
+
+
+@pytest.mark.parametrize("properties", [
+    {"status": {"enum": ["_sunder_", "open"]}},
+    {"status": {"enum": []}},
+    {"status": {"enum": "open"}},
+    {"paid": {"type": "boolean", "minimum": 0}},
+    {"number": {"type": "integer", "maxLength": 3}},
+    {"number": {"type": "string", "pattern": "[unclosed"}},
+    {"number": {"type": "uuid"}},
+    {"class": {"type": "string"}},
+    {"line": {"$ref": "#/$defs/missing"}},
+])
+def test_invalid_schemas_raise_schema_errors(properties):
+    with pytest.raises(SchemaError):
+        compile_schema("Invalid", {"type": "object", "properties": properties})
+
+
+def test_recursive_schemas_are_rejected():
+    schema = {"type": "object", "properties": {"child": {"$ref": "#/$defs/node"}}, "$defs": {"node": {"type": "object", "properties": {"child": {"$ref": "#/$defs/node"}}}}}
+
+    with pytest.raises(SchemaError, match="nested deeper"):
+        compile_schema("Tree", schema)
+
+
+def test_registry_compiles_each_schema_once_and_evicts_the_least_recently_used(tmp_path):
+    registry = SchemaRegistry(str(tmp_path / "schemas.json"), max_models=2)
+    evicted = []
+    registry.add_eviction_listener(evicted.append)
+    _, invoice_model = registry.register("Invoice", invoice)
+
+    assert registry.get("Invoice") is invoice_model
+    registry.register("First", {"type": "object", "properties": {"a": {"type": "string"}}})
+    registry.register("Second", {"type": "object", "properties": {"b": {"type": "string"}}})
+    assert evicted == [invoice_model]
+    # a registry opened on the same file sees the schemas, e.g. in another worker
+    assert SchemaRegistry(registry.path, max_models=2).get("Invoice").model_fields.keys() == invoice_model.model_fields.keys()
+    assert registry.get("Missing") is None
+
+
+def _register_repeatedly(path: str, worker: int):
+    registry = SchemaRegistry(path, max_models=2)
+    for i in range(20):
+        registry.register(f"Worker{worker}Schema{i}", {"type": "object", "properties": {"a": {"type": "string"}}})
+
+
+def test_workers_can_save_the_registry_at_the_same_time(tmp_path):
+    path = str(tmp_path / "schemas.json")
+    processes = [multiprocessing.Process(target=_register_repeatedly, args=(path, worker)) for worker in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+    assert [process.exitcode for process in processes] == [0, 0, 0, 0]
+    assert SchemaRegistry(path, max_models=2).schemas()
+
+
+def test_invalid_schemas_are_rejected_by_the_api(monkeypatch, tmp_path):
+    import main
+    monkeypatch.setattr(schema_utils.schema_registry, "path", str(tmp_path / "schemas.json"))
+    monkeypatch.setattr(schema_utils.schema_registry, "_schemas", None)
+    client = TestClient(main.app)
+
+    response = client.post("/v1/schemas/", json={"name": "Invalid", "jsonSchema": {"type": "object", "properties": {"status": {"enum": []}}}})
+    assert response.status_code == 400
+    assert client.get("/v1/schemas/Invalid").status_code == 404
+    assert client.post("/v1/schemas/", json={"name": "Invoice", "jsonSchema": invoice}).status_code == 200
+    assert client.get("/v1/schemas/Invoice").json()["jsonSchema"] == invoice
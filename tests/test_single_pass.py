@@ -0,0 +1,68 @@
+import time
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+
+from api.data_models import response_models
+from api.utils import extract_utils
+from api.utils.fake_llm_utils import FakeProgram
+from conftest import sample_pdf
+
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    """replaces the parser and the LLM programs with fakes that record their calls"""
+    calls = {"parses": 0, "llm": []}
+    text = f"Capital call {uuid.uuid4().hex} of Fund I for Valentina Pape."
+
+    async def read_file(file_location, extension, file_hash=None):
+        from llama_index.core import Document
+        calls["parses"] += 1
+        return [Document(text=text)], False
+
+    class RecordingProgram(FakeProgram):
+        async def acall(self, **kwargs):
+            calls["llm"].append(self.output_cls)
+            return await super().acall(**kwargs)
+
+    monkeypatch.setattr(extract_utils, "read_file", read_file)
+    monkeypatch.setattr(extract_utils, "get_program", lambda output_cls, template: RecordingProgram(output_cls, latency_ms=200, jitter_ms=0, error_rate=0))
+    monkeypatch.setattr(extract_utils, "dedup_enabled", False)
+    return calls
+
+
+def _extract(**params):
+    import main
+    client = TestClient(main.app)
+    with open(sample_pdf, "rb") as file:
+        start = time.perf_counter()
+        response = client.post("/v1/files/extract/", params=params, files={"file": ("call.pdf", file, "application/pdf")})
+    assert response.status_code == 200
+    return response.json(), time.perf_counter() - start
+
+
+def test_single_pass_classifies_and_extracts_one_parse_in_one_llm_call(pipeline):
+    result, _ = _extract(single_pass=True)
+
+    assert pipeline == {"parses": 1, "llm": [response_models.DocumentExtraction]}
+    # the fake single-pass call classifies the document as the first category and leaves the optional data empty
+    assert result["documentMetadata"]["category"] == "CapitalCall"
+    assert result["data"] is None
+
+
+def test_without_single_pass_the_document_is_classified_first(pipeline):
+    result, _ = _extract()
+
+    assert pipeline == {"parses": 1, "llm": [response_models.DocumentMetadata, response_models.CapitalCall]}
+    assert result["data"]["type"] == "CapitalCall"
+
+
+def test_with_a_category_metadata_and_data_are_extracted_concurrently_from_one_parse(pipeline):
+    result, elapsed = _extract(category="OperationalKPIs")
+
+    assert pipeline["parses"] == 1
+    assert sorted(cls.__name__ for cls in pipeline["llm"]) == ["DocumentMetadata", "OperationalKPIs"]
+    # two 200 ms calls in parallel, not one after the other
+    assert elapsed < 0.38
+    assert result["documentMetadata"]["category"] == "OperationalKPIs"
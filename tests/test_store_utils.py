@@ -0,0 +1,69 @@
+import datetime
+
+import pytest
+
+from api.data_models import response_models
+from api.utils.store_utils import ExtractionStore, decode_cursor
+
+
+def _response(investor: str, date: str, category=response_models.ModelCategory.CapitalCall, entities=()) -> response_models.ExtractResponse:
+    return response_models.ExtractResponse(
+        fileMetadata=response_models.FileMetadata(fileName=f"{investor}.pdf", contentType="application/pdf", extension=".pdf", size=1),
+        documentMetadata=response_models.DocumentMetadata(category=category, entities=list(entities), summary="", containsFinancials=True),
+        data=response_models.CapitalCall(type=category, name=investor, fundName="Fund I", date=datetime.datetime.fromisoformat(date)),
+    )
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ExtractionStore(str(tmp_path / "extractions.sqlite"), batch_size=10, flush_seconds=1, max_pending=100)
+
+
+def test_results_are_only_written_on_flush(store):
+    store.add(_response("Valentina Pape", "2024-03-01"), file_hash="abc")
+
+    assert store.query().items == []
+    store.flush()
+    [stored] = store.query().items
+    assert stored.fileHash == "abc"
+    assert stored.extraction.data["name"] == "Valentina Pape"
+    assert store.get(stored.id) == stored
+
+
+def test_queries_filter_on_indexed_columns_and_entities(store):
+    store.add(_response("Valentina Pape", "2024-03-01", entities=["Fund I", "Acme GmbH"]))
+    store.add(_response("Jonas Weber", "2024-06-01", entities=["Fund I"]))
+    store.add(_response("Jonas Weber", "2023-12-01", category=response_models.ModelCategory.OperationalKPIs))
+    store.flush()
+
+    assert [item.extraction.data["name"] for item in store.query(investor="jonas weber").items] == ["Jonas Weber", "Jonas Weber"]
+    assert len(store.query(entity="acme gmbh").items) == 1
+    assert len(store.query(category="OperationalKPIs").items) == 1
+    assert [item.documentDate[:7] for item in store.query(date_from=datetime.datetime(2024, 1, 1)).items] == ["2024-06", "2024-03"]
+
+
+def test_pages_follow_the_cursor_newest_first(store):
+    for month in range(1, 8):
+        store.add(_response(f"Investor {month}", f"2024-{month:02d}-01"))
+    store.flush()
+
+    names, cursor = [], None
+    while True:
+        page = store.query(limit=3, cursor=cursor)
+        names.extend(item.extraction.data["name"] for item in page.items)
+        cursor = page.nextCursor
+        if cursor is None:
+            break
+
+    assert names == [f"Investor {month}" for month in range(7, 0, -1)]
+    with pytest.raises(ValueError):
+        decode_cursor("not a cursor")
+
+
+def test_the_oldest_pending_writes_are_dropped_when_the_store_falls_behind(tmp_path):
+    store = ExtractionStore(str(tmp_path / "extractions.sqlite"), batch_size=10, flush_seconds=1, max_pending=2)
+    for month in range(1, 4):
+        store.add(_response(f"Investor {month}", f"2024-{month:02d}-01"))
+    store.flush()
+
+    assert [item.extraction.data["name"] for item in store.query().items] == ["Investor 3", "Investor 2"]
@@ -0,0 +1,33 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from api.data_models.response_models import InvestmentColumns
+from api.utils.transform_utils import transform_csv
+
+
+def test_rows_are_streamed_as_coerced_records_in_batches(tmp_path):
+    path = tmp_path / "investments.csv"
+    path.write_text("Firma,Art,Branche,Whg\nAcme,fund,aerospace,eur\nBeta,Unicorn,Space Travel,Mixed\nGamma,fund,aerospace,Euro\n", encoding="utf-8")
+    mapping = {"companyName": "Firma", "type": "Art", "sector": "Branche", "currency": "Whg", "website": "Missing"}
+
+    batches = list(transform_csv(str(path), mapping, InvestmentColumns, batch_size=1))
+    records = [json.loads(line) for batch in batches for line in batch.splitlines()]
+
+    assert len(batches) == 3
+    assert records[0] == {"row": 1, "data": {"companyName": "Acme", "currency": "EUR", "type": "Fund", "sector": "Aerospace", "businessModel": None, "website": None}}
+    assert records[1]["data"]["sector"] == "Other"
+    assert records[1]["errors"] == ["currency: invalid currency 'Mixed'", "type: invalid InvestmentType 'Unicorn'"]
+    # currencies resolve like in the extraction repair
+    assert records[2]["data"]["currency"] == "EUR"
+
+
+@pytest.mark.parametrize("mapping", ['{"companyName": ["Firma"]}', '{"founders": "Firma"}', '["Firma"]', "not json"])
+def test_invalid_mappings_are_rejected_before_streaming(mapping):
+    import main
+    client = TestClient(main.app)
+
+    response = client.post("/v1/files/transform/", params={"category": "Investment"}, data={"mapping": mapping}, files={"file": ("investments.csv", b"Firma\nAcme\n", "text/csv")})
+
+    assert response.status_code == 400
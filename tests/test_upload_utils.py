@@ -0,0 +1,86 @@
+import io
+import os
+import time
+import asyncio
+import hashlib
+import threading
+
+import pytest
+from fastapi import HTTPException, UploadFile
+
+from api.utils import upload_utils
+
+
+class GeneratedFile(io.RawIOBase):
+    """file of the given size whose content is generated on read, so the test never holds it in memory"""
+
+    def __init__(self, size: int):
+        self.remaining = size
+
+    def readable(self) -> bool:
+        return True
+
+    def read(self, size: int = -1) -> bytes:
+        size = self.remaining if size < 0 else min(size, self.remaining)
+        self.remaining -= size
+        return b"\x25" * size
+
+
+def _rss_bytes() -> int:
+    with open("/proc/self/statm") as file:
+        return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def _peak_rss_growth(size: int) -> int:
+    """uploads a generated file of the given size and returns how far RSS rose above its starting point"""
+    baseline, peak, done = _rss_bytes(), [0], threading.Event()
+
+    def sample():
+        while not done.is_set():
+            peak[0] = max(peak[0], _rss_bytes())
+            time.sleep(0.002)
+
+    sampler = threading.Thread(target=sample)
+    sampler.start()
+    try:
+        file_location, _ = asyncio.run(upload_utils.save_uploaded_file(UploadFile(GeneratedFile(size), filename="large.pdf"), max_bytes=size))
+    finally:
+        done.set()
+        sampler.join()
+    assert os.path.getsize(file_location) == size
+    asyncio.run(upload_utils.delete_file(file_location))
+    return peak[0] - baseline
+
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/statm"), reason="reads RSS from /proc")
+def test_upload_memory_stays_bounded_regardless_of_file_size():
+    small = _peak_rss_growth(16 * 1024 * 1024)
+    large = _peak_rss_growth(256 * 1024 * 1024)
+
+    # uploads are streamed in UPLOAD_CHUNK_SIZE chunks, so a 16x larger file costs no extra memory
+    assert large < 32 * 1024 * 1024
+    assert large < small + 16 * 1024 * 1024
+
+
+def test_uploads_are_hashed_and_never_clobber_each_other():
+    first, first_hash = asyncio.run(upload_utils.save_uploaded_file(UploadFile(io.BytesIO(b"first"), filename="call.pdf")))
+    second, second_hash = asyncio.run(upload_utils.save_uploaded_file(UploadFile(io.BytesIO(b"second"), filename="call.pdf")))
+
+    assert first != second
+    assert os.path.basename(first) == os.path.basename(second) == "call.pdf"
+    with open(first, "rb") as file:
+        assert file.read() == b"first"
+    assert first_hash == hashlib.sha256(b"first").hexdigest()
+    assert second_hash == hashlib.sha256(b"second").hexdigest()
+    for file_location in (first, second):
+        asyncio.run(upload_utils.delete_file(file_location))
+        assert not os.path.exists(os.path.dirname(file_location))
+
+
+def test_uploads_over_the_limit_are_rejected_and_removed():
+    before = set(os.listdir(upload_utils.upload_directory)) if os.path.isdir(upload_utils.upload_directory) else set()
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(upload_utils.save_uploaded_file(UploadFile(GeneratedFile(3 * 1024 * 1024), filename="big.csv"), max_bytes=1024 * 1024))
+
+    assert error.value.status_code == 413
+    assert set(os.listdir(upload_utils.upload_directory)) == before